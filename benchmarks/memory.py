@@ -0,0 +1,31 @@
+"""
+Measure the memory used by large numbers of DlinkDCSCamera objects.
+
+Usage: python3 -m benchmarks.memory [COUNT]
+"""
+
+import sys
+import tracemalloc
+
+from dlinkdcs import DlinkDCSCamera
+
+
+def measure(count, logins=4):
+    """Return the number of bytes allocated per camera object."""
+    tracemalloc.start()
+    _before = tracemalloc.take_snapshot()
+    _cameras = [
+        DlinkDCSCamera('10.%d.%d.%d' % (i >> 16 & 255, i >> 8 & 255, i & 255),
+                       'admin', 'password%d' % (i % logins))
+        for i in range(count)
+    ]
+    _after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    _size = sum(s.size_diff for s in _after.compare_to(_before, 'filename'))
+    del _cameras
+    return _size / count
+
+
+if __name__ == '__main__':
+    _count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    print('%d cameras: %.1f bytes per camera' % (_count, measure(_count)))
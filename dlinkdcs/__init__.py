@@ -1 +1,5 @@
-from .dlinkdcs import DlinkDCSCamera
+from .dlinkdcs import DlinkDCSCamera, DlinkDCSUnsupportedError
+from .fleet import DlinkDCSFleet
+from .ftp import DlinkDCSUploadReceiver
+from .response import EntryList
+from .smtp import DlinkDCSEmailReceiver
@@ -0,0 +1,165 @@
+"""
+Audio level metering for calibrating DLINK DCS IP Camera sound detection.
+
+The camera audio stream is read in chunks and metered in fixed size blocks
+with NumPy. Levels are accumulated into a fixed 1 dB histogram, so memory
+stays constant however long a stream is metered, and a sound detection
+threshold is recommended from the noise floor.
+
+Requires numpy.
+"""
+
+import threading
+import time
+
+import numpy
+
+
+AUDIO_PCM16 = 'pcm16'
+AUDIO_ULAW = 'ulaw'
+
+# sound detection threshold range accepted by the camera
+MIN_DECIBELS = 50
+MAX_DECIBELS = 90
+
+HISTOGRAM_BINS = 121
+
+
+def _ulaw_table():
+    """Return the 256 entry G.711 u-law to 16 bit PCM table."""
+    _codes = ~numpy.arange(256, dtype=numpy.int32) & 0xff
+    _exponent = (_codes >> 4) & 0x07
+    _mantissa = _codes & 0x0f
+    _magnitude = ((_mantissa << 3) + 0x84 << _exponent) - 0x84
+    return numpy.where(_codes & 0x80, -_magnitude, _magnitude).astype(numpy.int16)
+
+
+_ULAW = _ulaw_table()
+
+
+def block_levels(samples, block_size, full_scale_db=100.0):
+    """
+    Return the level in dB of each whole block of samples.
+
+    samples -- 1-D array of 16 bit samples
+    block_size -- number of samples per block
+    full_scale_db -- level in dB of a full scale signal, used to calibrate
+                     the meter against the camera scale (default 100)
+    """
+    _blocks = samples[:len(samples) - len(samples) % block_size]
+    _blocks = _blocks.reshape(-1, block_size).astype(numpy.float32)
+    _rms = numpy.sqrt(numpy.mean(numpy.square(_blocks), axis=1))
+    return full_scale_db + 20 * numpy.log10(numpy.maximum(_rms, 1.0) / 32768.0)
+
+
+def recommend_threshold(histogram, percentile=99.0, margin=5):
+    """
+    Return a sound detection threshold in dB above the noise floor.
+
+    histogram -- counts of block levels in 1 dB bins
+    percentile -- percentile of the levels treated as the noise floor
+                  (default 99)
+    margin -- dB added to the noise floor (default 5)
+    """
+    _total = histogram.sum()
+    if _total == 0:
+        return MAX_DECIBELS
+    _floor = int(numpy.searchsorted(numpy.cumsum(histogram), _total * percentile / 100))
+    return int(min(max(_floor + margin, MIN_DECIBELS), MAX_DECIBELS))
+
+
+class AudioMeter(object):
+    """Meter the audio stream of an IP Camera."""
+
+    def __init__(self, camera, encoding=AUDIO_PCM16, sample_rate=8000,
+                 block_seconds=0.125, full_scale_db=100.0, chunk_size=4096):
+        """
+        Initialize the meter.
+
+        camera -- DlinkDCSCamera to meter
+        encoding -- AUDIO_PCM16 or AUDIO_ULAW stream encoding
+        sample_rate -- stream samples per second (default 8000)
+        block_seconds -- length of each metered block (default 0.125)
+        full_scale_db -- level in dB of a full scale signal (default 100)
+        chunk_size -- number of bytes read at a time (default 4096)
+        """
+        self.camera = camera
+        self.encoding = encoding
+        self.block_size = int(sample_rate * block_seconds)
+        self.full_scale_db = full_scale_db
+        self.chunk_size = chunk_size
+        self.histogram = numpy.zeros(HISTOGRAM_BINS, dtype=numpy.int64)
+        self.level = None
+        self._stop = threading.Event()
+
+    def _samples(self, data):
+        if self.encoding == AUDIO_ULAW:
+            return _ULAW[numpy.frombuffer(data, dtype=numpy.uint8)]
+        return numpy.frombuffer(data, dtype='<i2')
+
+    def feed(self, data):
+        """
+        Meter a chunk of encoded audio and return the number of bytes
+        consumed, which is always a whole number of blocks.
+        """
+        _block_bytes = self.block_size * (1 if self.encoding == AUDIO_ULAW else 2)
+        _length = len(data) - len(data) % _block_bytes
+        if _length == 0:
+            return 0
+        _levels = block_levels(self._samples(memoryview(data)[:_length]),
+                               self.block_size, self.full_scale_db)
+        _bins = numpy.clip(_levels.astype(numpy.int64), 0, HISTOGRAM_BINS - 1)
+        self.histogram += numpy.bincount(_bins, minlength=HISTOGRAM_BINS)
+        self.level = float(_levels[-1])
+        return _length
+
+    def run(self, duration=None):
+        """
+        Read and meter the camera audio stream until stop() is called.
+
+        duration -- seconds to meter (default until stopped)
+        """
+        self._stop.clear()
+        _end = None if duration is None else time.monotonic() + duration
+        _pending = bytearray()
+        r = self.camera.send_request('audio.cgi', stream=True)
+        with r:
+            for _chunk in r.iter_content(self.chunk_size):
+                _pending += _chunk
+                del _pending[:self.feed(_pending)]
+                if self._stop.is_set() or (_end is not None and time.monotonic() >= _end):
+                    break
+
+    def stop(self):
+        """Stop a running meter."""
+        self._stop.set()
+
+    def recommend(self, percentile=99.0, margin=5):
+        """Return the recommended sound detection threshold in dB."""
+        return recommend_threshold(self.histogram, percentile, margin)
+
+    def apply(self, percentile=99.0, margin=5):
+        """Set the recommended sound detection threshold on the camera."""
+        return self.camera.set_sound_detection_sensitivity(
+            self.recommend(percentile, margin))
+
+
+def calibrate_fleet(fleet, duration, apply=False, **kwargs):
+    """
+    Meter every camera of a DlinkDCSFleet for duration seconds and yield a
+    FleetResult with the AudioMeter as each camera finishes.
+
+    The fleet workers must be at least the number of cameras for all
+    streams to be metered at the same time.
+
+    apply -- set the recommended threshold on each camera (default False)
+    kwargs -- additional arguments passed to AudioMeter
+    """
+    def _calibrate(camera):
+        _meter = AudioMeter(camera, **kwargs)
+        _meter.run(duration)
+        if apply:
+            _meter.apply()
+        return _meter
+
+    return fleet.map(_calibrate)
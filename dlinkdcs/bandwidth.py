@@ -0,0 +1,312 @@
+"""
+Site uplink bandwidth balancing for DLINK DCS IP Cameras.
+
+The upload traffic of each camera is estimated from its settings: the
+JPEG frame size from the video resolution reported by get_image() or
+get_stream_info(), the rate of the FTP image upload and the clip size and
+length limits of the FTP video upload of get_upload(). When the estimated
+total is over the uplink budget, the upload rates are lowered one step at
+a time, always taking the step that saves the most bandwidth for the
+priority of its camera. Cameras are raised back towards the settings the
+balancer first saw once the budget allows. These are kept in the
+preferred dict of the balancer, so a new balancer only ever lowers the
+current settings unless preferred is saved and restored between runs, as
+the balance command does with its --state file. Only the changed
+upload.cgi settings are sent, in one request per camera.
+
+The cameras have no setter for the stream profile, so live streams are
+not balanced, and the estimates are of the traffic while a camera is
+uploading, e.g. during motion for FTP_MODE_DETECTION.
+"""
+
+import collections
+import heapq
+import re
+
+from .endpoints import BY_NAME
+from .fleet import DlinkDCSFleet
+
+
+# bytes per pixel of a typical JPEG frame
+BYTES_PER_PIXEL = 0.15
+
+# frame rate of the recorded video clips
+VIDEO_FRAMES_PER_SECOND = 15
+
+# resolution assumed when the camera reports none
+DEFAULT_RESOLUTION = (640, 480)
+
+# image upload rates in images per second, from the highest the camera
+# supports (3 per second) to one image a minute
+IMAGE_RATES = (3, 2, 1, 1 / 2, 1 / 3, 1 / 5, 1 / 10, 1 / 30, 1 / 60)
+
+# video clip size limits in KBytes, from the largest the camera supports
+VIDEO_SIZES = (3072, 2048, 1024, 512, 256, 128)
+
+CameraPlan = collections.namedtuple(
+    'CameraPlan', ['camera', 'priority', 'before', 'after', 'changes'])
+
+BandwidthPlan = collections.namedtuple(
+    'BandwidthPlan', ['budget', 'before', 'after', 'fits', 'cameras', 'errors'])
+
+_RESOLUTION = re.compile(r'(\d+)\s*[xX*]\s*(\d+)')
+
+_PARAMS = {_param.key: _param for _name in ('set_upload_image_settings',
+                                            'set_upload_video_settings')
+           for _param in BY_NAME[_name].params}
+
+
+def _int(value, default):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def frame_bytes(image, stream_info=None):
+    """
+    Estimate the size in bytes of a JPEG frame of a camera.
+
+    image -- response of get_image()
+    stream_info -- response of get_stream_info(), used when the image
+                   settings have no resolution (default None)
+    """
+    _match = _RESOLUTION.search(image.get('VideoResolution', ''))
+    if _match is not None:
+        _width, _height = int(_match.group(1)), int(_match.group(2))
+    else:
+        # the largest resolution the camera streams
+        _sizes = _RESOLUTION.findall((stream_info or {}).get('resolutions', ''))
+        _width, _height = max(((int(_w), int(_h)) for _w, _h in _sizes),
+                              key=lambda _size: _size[0] * _size[1],
+                              default=DEFAULT_RESOLUTION)
+    return _width * _height * BYTES_PER_PIXEL
+
+
+def image_rate(upload):
+    """Return the images per second of the get_upload() settings, 0 if off."""
+    if upload.get('FTPScheduleEnable') != '1':
+        return 0
+    if upload.get('FTPScheduleVideoFrequencyMode', '0') == '0':
+        _fps = _int(upload.get('FTPScheduleFramePerSecond'), -1)
+        # auto uploads as fast as the camera can
+        return IMAGE_RATES[0] if _fps < 1 else _fps
+    return 1 / max(1, _int(upload.get('FTPScheduleSecondPerFrame'), 1))
+
+
+def video_size(upload):
+    """Return the clip size limit in KBytes of the get_upload() settings, 0 if off."""
+    if upload.get('FTPScheduleEnableVideo') != '1':
+        return 0
+    return _int(upload.get('FTPScheduleVideoLimitSize'), 2048)
+
+
+def video_bytes_per_second(size, seconds, frame):
+    """
+    Estimate the bytes per second uploaded by the video clips.
+
+    size -- clip size limit in KBytes
+    seconds -- clip length limit in seconds
+    frame -- bytes of a JPEG frame
+    """
+    if not size:
+        return 0
+    return min(size * 1024, frame * VIDEO_FRAMES_PER_SECOND * seconds) / seconds
+
+
+def _video_seconds(upload):
+    return max(1, _int(upload.get('FTPScheduleVideoLimitTime'), 10))
+
+
+def upload_bytes_per_second(upload, frame):
+    """
+    Estimate the bytes per second uploaded by a camera.
+
+    upload -- response of get_upload()
+    frame -- bytes of a JPEG frame e.g. from frame_bytes()
+    """
+    return (image_rate(upload) * frame +
+            video_bytes_per_second(video_size(upload), _video_seconds(upload), frame))
+
+
+def _image_settings(rate):
+    if rate >= 1:
+        return {'FTPScheduleVideoFrequencyMode': 0, 'FTPScheduleFramePerSecond': rate}
+    return {'FTPScheduleVideoFrequencyMode': 1,
+            'FTPScheduleSecondPerFrame': round(1 / rate)}
+
+
+class _Ladder(object):
+    """Settings of one kind of upload, from the preferred to the lowest."""
+
+    __slots__ = ('values', 'rates', 'level')
+
+    def __init__(self, values, rate):
+        self.values = []
+        self.rates = []
+        for _value in values:
+            _rate = rate(_value)
+            # a step that saves nothing is skipped
+            if not self.rates or _rate < self.rates[-1]:
+                self.values.append(_value)
+                self.rates.append(_rate)
+        self.level = 0
+
+    def saving(self):
+        """Bytes per second saved by the next step down, None at the bottom."""
+        if self.level + 1 >= len(self.rates):
+            return None
+        return self.rates[self.level] - self.rates[self.level + 1]
+
+
+class DlinkDCSBandwidthBalancer(object):
+    """Fit the upload traffic of a site's cameras into an uplink budget."""
+
+    def __init__(self, cameras, budget, workers=16):
+        """
+        Initialize the balancer.
+
+        cameras -- iterable of DlinkDCSCamera, or a dict of DlinkDCSCamera
+                   and priority, higher keeping more bandwidth (default 1)
+        budget -- bytes per second of the uplink available to uploads
+        workers -- cameras contacted at the same time (default 16)
+        """
+        if not isinstance(cameras, dict):
+            cameras = dict.fromkeys(cameras, 1)
+        if any(_priority <= 0 for _priority in cameras.values()):
+            raise ValueError('priorities must be positive')
+        self.priorities = cameras
+        self.budget = budget
+        self.workers = workers
+        # upload settings first seen on each camera, raised back to
+        self.preferred = {}
+
+    def survey(self):
+        """
+        Read the settings of every camera and return a dict of each
+        DlinkDCSCamera and its (upload, frame_bytes), and a dict of the
+        cameras that failed and their exception.
+        """
+        def _read(camera):
+            _upload = camera.get_upload()
+            _stream_info = None
+            _image = camera.get_image()
+            if not _RESOLUTION.search(_image.get('VideoResolution', '')):
+                _stream_info = camera.get_stream_info()
+            return _upload, frame_bytes(_image, _stream_info)
+
+        _surveyed = {}
+        _errors = {}
+        _fleet = DlinkDCSFleet(self.priorities, self.workers)
+        for _result in _fleet.map(_read, skip_unsupported=False):
+            if _result.error is None:
+                _surveyed[_result.camera] = _result.result
+            else:
+                _errors[_result.camera] = _result.error
+        return _surveyed, _errors
+
+    def forget(self, camera=None):
+        """
+        Forget the preferred upload settings, so the current settings are
+        used from the next survey.
+
+        camera -- DlinkDCSCamera to forget (default all)
+        """
+        if camera is None:
+            self.preferred.clear()
+        else:
+            self.preferred.pop(camera, None)
+
+    def plan(self, surveyed=None, errors=None):
+        """
+        Return a BandwidthPlan of the settings fitting the budget.
+
+        surveyed -- cameras read by survey() (default survey them now)
+        errors -- cameras that failed the survey (default none)
+        """
+        if surveyed is None:
+            surveyed, errors = self.survey()
+        _ladders = {}
+        for _camera, (_upload, _frame) in surveyed.items():
+            _current = (image_rate(_upload), video_size(_upload))
+            _image, _size = self.preferred.get(_camera, _current)
+            # uploads turned on since they were first seen start from now
+            _image = _image or _current[0]
+            _size = _size or _current[1]
+            self.preferred[_camera] = (_image, _size)
+            _seconds = _video_seconds(_upload)
+            # uploads turned off stay off
+            _image = _image if _current[0] else 0
+            _size = _size if _current[1] else 0
+            _ladders[_camera] = (
+                _Ladder([_image] + [_r for _r in IMAGE_RATES if 0 < _r < _image],
+                        lambda _rate: _rate * _frame),
+                _Ladder([_size] + [_s for _s in VIDEO_SIZES if 0 < _s < _size],
+                        lambda _limit: video_bytes_per_second(_limit, _seconds, _frame)))
+
+        _total = sum(_l.rates[0] for _pair in _ladders.values() for _l in _pair)
+        _heap = []
+        for _camera, _pair in _ladders.items():
+            for _ladder in _pair:
+                if _ladder.saving() is not None:
+                    _priority = self.priorities[_camera]
+                    _heap.append((-_ladder.saving() / _priority, len(_heap), _priority,
+                                  _ladder))
+        heapq.heapify(_heap)
+        _sequence = len(_heap)
+        while _total > self.budget and _heap:
+            _, _, _priority, _ladder = heapq.heappop(_heap)
+            _total -= _ladder.saving()
+            _ladder.level += 1
+            if _ladder.saving() is not None:
+                heapq.heappush(_heap, (-_ladder.saving() / _priority, _sequence,
+                                       _priority, _ladder))
+                _sequence += 1
+
+        _plans = {}
+        for _camera, (_upload, _frame) in surveyed.items():
+            _image, _video = _ladders[_camera]
+            _changes = {}
+            if _image.level:
+                _changes.update(_image_settings(_image.values[_image.level]))
+            elif _image.values[0] and _image.values[0] != image_rate(_upload):
+                _changes.update(_image_settings(_image.values[0]))
+            if _video.values[_video.level] != video_size(_upload):
+                _changes['FTPScheduleVideoLimitSize'] = _video.values[_video.level]
+            _changes = {_key: _PARAMS[_key].encode(_value)
+                        for _key, _value in _changes.items()}
+            _plans[_camera] = CameraPlan(
+                _camera, self.priorities[_camera],
+                upload_bytes_per_second(_upload, _frame),
+                _image.rates[_image.level] + _video.rates[_video.level],
+                {_key: _value for _key, _value in _changes.items()
+                 if str(_value) != _upload.get(_key)})
+        return BandwidthPlan(self.budget, sum(_p.before for _p in _plans.values()),
+                             _total, _total <= self.budget, _plans, dict(errors or {}))
+
+    def apply(self, plan):
+        """
+        Send the changed settings of a BandwidthPlan, one request per
+        camera. Returns a dict of the cameras that failed and their
+        exception.
+        """
+        _changed = {_camera: _plan.changes for _camera, _plan in plan.cameras.items()
+                    if _plan.changes}
+
+        def _send(camera):
+            _params = dict(_changed[camera])
+            _params['ConfigReboot'] = 'no'
+            camera.send_command('upload.cgi', _params)
+
+        _errors = {}
+        _fleet = DlinkDCSFleet(_changed, self.workers)
+        for _result in _fleet.map(_send, skip_unsupported=False):
+            if _result.error is not None:
+                _errors[_result.camera] = _result.error
+        return _errors
+
+    def run(self):
+        """Survey, plan and apply, returning the BandwidthPlan applied."""
+        _plan = self.plan()
+        _plan.errors.update(self.apply(_plan))
+        return _plan
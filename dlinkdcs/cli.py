@@ -0,0 +1,352 @@
+"""
+Command line interface for DLINK DCS IP Cameras.
+
+Run a getter or setter against one camera or an inventory of many cameras
+concurrently, streaming one JSON result per line as each camera finishes.
+
+    python3 -m dlinkdcs --host 192.168.1.101 --password secret call get_common_info
+    python3 -m dlinkdcs --inventory cameras.cfg --workers 32 backup
+    python3 -m dlinkdcs --inventory cameras.cfg gateway --listen 8080
+    python3 -m dlinkdcs --inventory cameras.cfg --trace trace.json backup
+    python3 -m dlinkdcs --inventory cameras.cfg balance --budget 20000 --state bw.json
+
+The inventory file has one section per camera, with shared settings in the
+DEFAULT section:
+
+    [DEFAULT]
+    user=admin
+    password=Pa55_Word
+
+    [frontdoor]
+    host=192.168.1.101
+    port=80
+    timeout=5
+
+Method arguments are passed as text and converted to the type of each
+argument, e.g. 'true' or '1' for a flag, so passwords and bitmasks keep
+their leading zeros.
+"""
+
+import argparse
+import json
+import os
+import sys
+
+from configparser import ConfigParser
+
+from .bandwidth import DlinkDCSBandwidthBalancer
+from .dlinkdcs import DlinkDCSCamera
+from .endpoints import BY_NAME
+from .fleet import DlinkDCSFleet
+from .gateway import DlinkDCSGateway
+from .rollout import COMPLETED, DlinkDCSRollout
+from .tracing import Tracer
+
+
+# getters saved by the backup command
+BACKUP_GETTERS = (
+    'get_common_info', 'get_date_time', 'get_day_night', 'get_email',
+    'get_image', 'get_motion_detection', 'get_network', 'get_sound_detection',
+    'get_upload', 'get_user',
+)
+
+# camera methods besides the endpoints that can be called or applied
+HELPER_METHODS = (
+    'capabilities', 'supports', 'get_ptz_preset_entries', 'get_user_entries',
+    'enable_email_image', 'disable_email_image',
+    'enable_email_video', 'disable_email_video',
+    'enable_motion_detection', 'disable_motion_detection',
+    'enable_sound_detection', 'disable_sound_detection',
+    'enable_upload_image', 'disable_upload_image',
+    'enable_upload_video', 'disable_upload_video',
+)
+
+
+def load_inventory(filename, timeout=None):
+    """
+    Return a {name: DlinkDCSCamera} dict of the cameras in an inventory file.
+
+    filename -- inventory file
+    timeout -- seconds to wait for each camera, unless its section sets
+               timeout (default wait forever)
+    """
+    _config = ConfigParser()
+    with open(filename) as _file:
+        _config.read_file(_file)
+    _cameras = {}
+    for _name in _config.sections():
+        _section = _config[_name]
+        _cameras[_name] = DlinkDCSCamera(
+            _section.get('host', _name), _section.get('user', 'admin'),
+            _section.get('password', ''), _section.getint('port', 80),
+            _section.getfloat('timeout', timeout))
+    return _cameras
+
+
+def parse_arguments(values):
+    """
+    Split command line method arguments into (args, kwargs). Values are
+    kept as text, the endpoints convert them to the type of each argument.
+    """
+    _args = []
+    _kwargs = {}
+    for _value in values:
+        _key, _sep, _arg = _value.partition('=')
+        if _sep and _key.isidentifier():
+            _kwargs[_key] = _arg
+        else:
+            _args.append(_value)
+    return _args, _kwargs
+
+
+class _Output(object):
+    """Write one JSON object per line, flushing each line."""
+
+    def __init__(self, stream, names):
+        self.stream = stream
+        self.names = names
+        self.errors = 0
+
+    def write(self, camera, method, result=None, error=None):
+        if error is not None:
+            self.errors += 1
+        _line = {
+            'camera': self.names.get(camera, camera.host),
+            'method': method,
+            'result': result,
+            'error': None if error is None else str(error),
+        }
+        self.stream.write(json.dumps(_line, default=repr) + '\n')
+        self.stream.flush()
+
+
+def check_method(method):
+    """Exit if method is not an endpoint or one of the HELPER_METHODS."""
+    if method not in BY_NAME and method not in HELPER_METHODS:
+        raise SystemExit('unknown method %s' % method)
+
+
+def command_call(fleet, output, args):
+    check_method(args.method)
+    _args, _kwargs = parse_arguments(args.arguments)
+    for _result in fleet.run(args.method, *_args, **_kwargs):
+        output.write(_result.camera, args.method, _result.result, _result.error)
+
+
+def command_backup(fleet, output, args):
+    def _backup(camera):
+        _backup = {}
+        for _getter in BACKUP_GETTERS:
+            if _getter == 'get_sound_detection' and not camera.supports(
+                    DlinkDCSCamera.CAPABILITY_SOUND_DETECTION):
+                continue
+            _backup[_getter] = getattr(camera, _getter)()
+        return _backup
+
+    for _result in fleet.map(_backup):
+        output.write(_result.camera, 'backup', _result.result, _result.error)
+
+
+def command_apply(fleet, output, args):
+    with open(args.file) as _file:
+        _calls = json.load(_file)
+    for _call in _calls:
+        check_method(_call['method'])
+
+    def _apply(camera):
+        return [getattr(camera, _call['method'])(
+            *_call.get('args', []), **_call.get('kwargs', {})) for _call in _calls]
+
+    for _result in fleet.map(_apply):
+        output.write(_result.camera, 'apply', _result.result, _result.error)
+
+
+def command_rollout(fleet, output, args):
+    with open(args.file) as _file:
+        _calls = json.load(_file)
+
+    def _progress(progress):
+        output.write(_rollout.cameras[progress.camera], 'rollout', progress._asdict(),
+                     progress.error)
+
+    _rollout = DlinkDCSRollout(
+        fleet, _calls, args.state, canary=args.canary, growth=args.growth,
+        max_wave=args.max_wave, workers=fleet.workers,
+        max_error_rate=args.max_error_rate, on_progress=_progress)
+    if _rollout.run() != COMPLETED:
+        output.errors += 1
+
+
+def command_watch(fleet, output, args):
+    for _method in args.methods:
+        _endpoint = BY_NAME.get(_method)
+        if _endpoint is None or _endpoint.setter:
+            raise SystemExit('%s is not a getter' % _method)
+    for _result in fleet.watch(args.methods, args.interval):
+        if _result.error is not None:
+            output.write(_result.camera, 'watch', None, _result.error)
+            continue
+        for _change in _result.result:
+            output.write(_result.camera, _change.endpoint, _change.changes)
+
+
+def command_gateway(fleet, output, args):
+    _cameras = {_name: _camera for _camera, _name in output.names.items()}
+    _gateway = DlinkDCSGateway(_cameras, args.bind, args.listen, args.ttl)
+    try:
+        _gateway.serve_forever()
+    finally:
+        _gateway.stop()
+
+
+def command_balance(fleet, output, args):
+    _cameras = {_name: _camera for _camera, _name in output.names.items()}
+    _priorities = dict.fromkeys(fleet, 1)
+    for _value in args.priority:
+        _name, _, _weight = _value.partition('=')
+        if _name not in _cameras:
+            raise SystemExit('unknown camera %s' % _name)
+        try:
+            _priorities[_cameras[_name]] = float(_weight)
+        except ValueError:
+            raise SystemExit('bad priority %s, expected CAMERA=WEIGHT' % _value)
+        if _priorities[_cameras[_name]] <= 0:
+            raise SystemExit('priority of %s must be positive' % _name)
+    # kbit/s to bytes per second
+    _balancer = DlinkDCSBandwidthBalancer(_priorities, args.budget * 125, fleet.workers)
+    if args.state and os.path.exists(args.state):
+        # settings first seen by earlier runs, raised back to when the budget allows
+        with open(args.state) as _file:
+            for _name, _preferred in json.load(_file).items():
+                if _name in _cameras:
+                    _balancer.preferred[_cameras[_name]] = tuple(_preferred)
+    _plan = _balancer.plan()
+    _errors = dict(_plan.errors)
+    if not args.dry_run:
+        _errors.update(_balancer.apply(_plan))
+        if args.state:
+            with open(args.state + '.tmp', 'w') as _file:
+                json.dump({output.names[_camera]: _preferred
+                           for _camera, _preferred in _balancer.preferred.items()},
+                          _file, indent=1)
+            os.replace(args.state + '.tmp', args.state)
+    for _camera, _error in _plan.errors.items():
+        output.write(_camera, 'balance', None, _error)
+    for _camera, _camera_plan in _plan.cameras.items():
+        output.write(_camera, 'balance', {
+            'priority': _camera_plan.priority,
+            'before': round(_camera_plan.before / 125),
+            'after': round(_camera_plan.after / 125),
+            'changes': _camera_plan.changes}, _errors.get(_camera))
+    if not _plan.fits:
+        sys.stderr.write('estimated %d kbit/s is over the budget\n' % (_plan.after / 125))
+        output.errors += 1
+
+
+def build_parser():
+    _parser = argparse.ArgumentParser(
+        prog='dlinkdcs', description='Control DLINK DCS IP Cameras.')
+    _parser.add_argument('--host', help='camera host')
+    _parser.add_argument('--port', type=int, default=80, help='camera port (default 80)')
+    _parser.add_argument('--user', default='admin', help='camera user (default admin)')
+    _parser.add_argument('--password', default='', help='camera password')
+    _parser.add_argument('--inventory', help='inventory file of cameras')
+    _parser.add_argument('--timeout', type=float, default=10,
+                         help='seconds to wait for each camera request (default 10)')
+    _parser.add_argument('--workers', type=int, default=16,
+                         help='cameras contacted at the same time (default 16)')
+    _parser.add_argument('--trace', metavar='FILE',
+                         help='write a Chrome trace of the camera requests to FILE')
+    _parser.add_argument('--trace-threshold', type=float, metavar='SECONDS',
+                         help='trace only requests slower than SECONDS')
+    _commands = _parser.add_subparsers(dest='command', required=True)
+
+    _call = _commands.add_parser('call', help='run a getter or setter')
+    _call.add_argument('method', help='camera method e.g. get_common_info')
+    _call.add_argument('arguments', nargs='*',
+                       help='method arguments, as VALUE or NAME=VALUE')
+    _call.set_defaults(func=command_call)
+
+    _backup = _commands.add_parser('backup', help='save the camera settings')
+    _backup.set_defaults(func=command_backup)
+
+    _apply = _commands.add_parser(
+        'apply', help='run a JSON list of {"method", "args", "kwargs"} calls')
+    _apply.add_argument('file', help='JSON file of calls')
+    _apply.set_defaults(func=command_apply)
+
+    _rollout = _commands.add_parser(
+        'rollout', help='apply a JSON list of setter calls in verified waves')
+    _rollout.add_argument('file', help='JSON file of calls')
+    _rollout.add_argument('--state', help='state file used to resume the rollout')
+    _rollout.add_argument('--canary', type=int, default=1,
+                          help='cameras in the first wave (default 1)')
+    _rollout.add_argument('--growth', type=float, default=2,
+                          help='factor each wave grows by (default 2)')
+    _rollout.add_argument('--max-wave', type=int, default=50,
+                          help='largest number of cameras in a wave (default 50)')
+    _rollout.add_argument('--max-error-rate', type=float, default=0.1,
+                          help='failed fraction of a wave rolling back the change '
+                               '(default 0.1)')
+    _rollout.set_defaults(func=command_rollout)
+
+    _watch = _commands.add_parser('watch', help='report changed settings')
+    _watch.add_argument('methods', nargs='+', help='getters to watch')
+    _watch.add_argument('--interval', type=float, default=30,
+                        help='seconds between polls (default 30)')
+    _watch.set_defaults(func=command_watch)
+
+    _gateway = _commands.add_parser(
+        'gateway', help='serve the cameras to many clients through a caching proxy')
+    _gateway.add_argument('--bind', default='127.0.0.1',
+                          help='local address to listen on (default 127.0.0.1)')
+    _gateway.add_argument('--listen', type=int, default=8080,
+                          help='port to listen on (default 8080)')
+    _gateway.add_argument('--ttl', type=float, default=5,
+                          help='seconds cached responses are served (default 5)')
+    _gateway.set_defaults(func=command_gateway)
+
+    _balance = _commands.add_parser(
+        'balance', help='fit the camera uploads into an uplink bandwidth budget')
+    _balance.add_argument('--budget', type=float, required=True,
+                          help='uplink kbit/s available to the camera uploads')
+    _balance.add_argument('--priority', action='append', default=[],
+                          metavar='CAMERA=WEIGHT',
+                          help='priority of a camera, higher keeping more bandwidth '
+                               '(default 1)')
+    _balance.add_argument('--state',
+                          help='file keeping the upload settings first seen on each '
+                               'camera, which are restored when the budget allows; '
+                               'without it cameras are only ever lowered')
+    _balance.add_argument('--dry-run', action='store_true',
+                          help='report the changes without sending them')
+    _balance.set_defaults(func=command_balance)
+    return _parser
+
+
+def main(argv=None, stream=None):
+    """Run the command line interface and return the exit status."""
+    _args = build_parser().parse_args(argv)
+    if _args.inventory:
+        _cameras = load_inventory(_args.inventory, _args.timeout)
+    elif _args.host:
+        _cameras = {_args.host: DlinkDCSCamera(
+            _args.host, _args.user, _args.password, _args.port, _args.timeout)}
+    else:
+        raise SystemExit('either --host or --inventory is required')
+    _names = {_camera: _name for _name, _camera in _cameras.items()}
+    _output = _Output(stream or sys.stdout, _names)
+    _fleet = DlinkDCSFleet(_cameras.values(), _args.workers)
+    _tracer = None
+    if _args.trace:
+        _tracer = Tracer(_args.trace, _args.trace_threshold)
+        _tracer.start()
+    try:
+        _args.func(_fleet, _output, _args)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        _fleet.close()
+        if _tracer is not None:
+            _tracer.stop()
+    return 1 if _output.errors else 0
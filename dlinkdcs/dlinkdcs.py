@@ -6,13 +6,76 @@ Tested with DLINK DCS 5025L.
 
 import requests
 import logging
+import time
+import weakref
 
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+from .endpoints import BY_NAME, ENDPOINTS, STALE, DlinkDCSBatch
+from .response import EntryList, iter_entries, iter_pairs
+from .watch import ConfigWatcher, wait_interval
+
+
+_LOGGER = logging.getLogger("DlinkDCSCamera.send_command")
+
+
+class DlinkDCSUnsupportedError(Exception):
+    """Raised when a command is not supported by the IP camera model."""
+
+
+class _Credentials(object):
+    """Login shared by all cameras using the same user and password."""
+
+    __slots__ = ('user', 'password', 'auth', '__weakref__')
+
+    _shared = weakref.WeakValueDictionary()
+
+    def __init__(self, user, password):
+        self.user = user
+        self.password = password
+        self.auth = (user, password)
+
+    @classmethod
+    def get(cls, user, password):
+        """Get the shared credentials for the user and password."""
+        _credentials = cls._shared.get((user, password))
+        if _credentials is None:
+            _credentials = cls(user, password)
+            cls._shared[(user, password)] = _credentials
+        return _credentials
+
+
+class _ResponseCache(object):
+    """Parsed getter responses of one camera, kept for a number of seconds."""
+
+    __slots__ = ('ttl', 'responses')
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self.responses = {}
+
+    def get(self, cmd):
+        _entry = self.responses.get(cmd)
+        if _entry is None:
+            return None
+        _expires, _response = _entry
+        if _expires is not None and _expires < time.monotonic():
+            self.responses.pop(cmd, None)
+            return None
+        return dict(_response)
+
+    def put(self, cmd, response):
+        _expires = None if self.ttl is None else time.monotonic() + self.ttl
+        self.responses[cmd] = (_expires, dict(response))
+
 
 class DlinkDCSCamera(object):
     """DLINK DCS IP Camera Control."""
 
+    __slots__ = ('_host', '_port', '_credentials', '_base_url', '_capabilities',
+                 '_session', '_cache', 'timeout')
+
     DAY_NIGHT_AUTO = '0'
     DAY_NIGHT_MANUAL = '1'
     DAY_NIGHT_ALWAYS_DAY = '2'
@@ -66,595 +129,410 @@ class DlinkDCSCamera(object):
     EMAIL_MOTION_MULTIFRAME_SECONDS_HALF = 0
     EMAIL_MOTION_MULTIFRAME_SECONDS_ONE = 1
 
-    def __init__(self, host, user, password, port=80):
-        """Initialize with the IP camera connection settings."""
-        self.host = host
-        self.port = port
-        self.user = user
-        self.password = password
+    CAPABILITY_PTZ = 'ptz'
+    CAPABILITY_PTZ_PRESETS = 'ptz_presets'
+    CAPABILITY_PTZ_MOVE = 'ptz_move'
+    CAPABILITY_PTZ_PRESET_MOVE = 'ptz_preset_move'
+    CAPABILITY_SOUND_DETECTION = 'sound_detection'
+
+    # optional features and the read only CGI probed for each of them; the
+    # PTZ command CGIs are not probed, a request to them moves the camera
+    CAPABILITY_PROBES = {
+        CAPABILITY_PTZ: 'config/ptz_move.cgi',
+        CAPABILITY_PTZ_PRESETS: 'config/ptz_preset_list.cgi',
+        CAPABILITY_PTZ_MOVE: 'config/ptz_move.cgi',
+        CAPABILITY_PTZ_PRESET_MOVE: 'config/ptz_preset_list.cgi',
+        CAPABILITY_SOUND_DETECTION: 'sdbdetection.cgi',
+    }
+
+    # CGIs failing fast once their feature is known to be unsupported
+    CAPABILITY_COMMANDS = {
+        'config/ptz_move.cgi': CAPABILITY_PTZ,
+        'config/ptz_preset_list.cgi': CAPABILITY_PTZ_PRESETS,
+        'cgi/ptdc.cgi': CAPABILITY_PTZ_MOVE,
+        'pantiltcontrol.cgi': CAPABILITY_PTZ_PRESET_MOVE,
+        'sdbdetection.cgi': CAPABILITY_SOUND_DETECTION,
+    }
+
+    # probe responses meaning the CGI does not exist on the camera
+    CAPABILITY_MISSING_STATUS = (404, 410, 501)
+
+    # keys of the PTZ preset list that are not part of a preset entry
+    PTZ_PRESET_HEADER_KEYS = ('presets', 'home')
+
+    # probed capabilities shared by all cameras of the same model/firmware
+    _capability_cache = {}
+
+    # called as hook(camera, cmd, params, response, started, elapsed) after
+    # each send_command(), with the start time and seconds the request took
+    command_hooks = []
+
+    # tracing.Tracer recording the phases of each send_command(), if any
+    tracer = None
+
+    def __init__(self, host, user, password, port=80, timeout=None):
+        """
+        Initialize with the IP camera connection settings.
+
+        timeout -- seconds to wait for the camera to respond, None to wait
+                   forever (default None)
+        """
+        self.timeout = timeout
+        self._host = host
+        self._port = port
+        self._credentials = _Credentials.get(user, password)
+        self._base_url = 'http://%s:%d/' % (host, port)
+        self._capabilities = None
+        self._session = None
+        self._cache = None
+
+    @classmethod
+    def open(cls, host, user, password, port=80, timeout=None, prefetch=(), ttl=60,
+             workers=8):
+        """
+        Connect to the IP camera and return a DlinkDCSCamera with its
+        getter responses cached.
+
+        The connection and login are checked with one request, then the
+        prefetch getters are sent at the same time so their first call
+        returns from the cache without contacting the camera.
+
+        prefetch -- names of getters to fetch e.g. ['get_common_info',
+                    'get_stream_info'] (default none)
+        ttl -- seconds a getter response is cached, None to cache until
+               invalidated (default 60)
+        workers -- getters sent at the same time (default 8)
+        """
+        _camera = cls(host, user, password, port, timeout)
+        _camera.cache_responses(ttl)
+        try:
+            r = _camera.send_request('cgiversion.cgi')
+            r.raise_for_status()
+        except Exception:
+            _camera.close()
+            raise
+        _camera._cache.put('cgiversion.cgi',
+                           _camera.unmarshal_response(r.content.decode('utf-8')))
+        if prefetch:
+            _camera.prefetch(prefetch, workers)
+        return _camera
+
+    @property
+    def host(self):
+        """IP camera host name or address."""
+        return self._host
+
+    @host.setter
+    def host(self, host):
+        self._host = host
+        self._base_url = 'http://%s:%d/' % (host, self._port)
+
+    @property
+    def port(self):
+        """IP camera HTTP port."""
+        return self._port
+
+    @port.setter
+    def port(self, port):
+        self._port = port
+        self._base_url = 'http://%s:%d/' % (self._host, port)
+
+    @property
+    def user(self):
+        """IP camera login user."""
+        return self._credentials.user
+
+    @user.setter
+    def user(self, user):
+        self._credentials = _Credentials.get(user, self._credentials.password)
+
+    @property
+    def password(self):
+        """IP camera login password."""
+        return self._credentials.password
+
+    @password.setter
+    def password(self, password):
+        self._credentials = _Credentials.get(self._credentials.user, password)
+
+    def capabilities(self, refresh=False, timeout=5):
+        """
+        Get the optional features supported by the IP Camera.
+
+        The camera is probed once per model and firmware version and the
+        result is shared with every other camera of the same model. A
+        feature is unsupported only when its CGI does not exist; a feature
+        whose probe failed, e.g. timed out, is None and is probed again on
+        the next call, and nothing is shared until every probe succeeded or
+        for cameras not reporting their model and firmware. Once known,
+        commands for unsupported features raise DlinkDCSUnsupportedError
+        without contacting the camera.
+
+        refresh -- probe the camera again, ignoring any memoized result
+        timeout -- seconds to wait for each probe (default 5)
+        """
+        if (self._capabilities is not None and not refresh and
+                None not in self._capabilities.values()):
+            return dict(self._capabilities)
+        _info = self.get_common_info()
+        _key = (_info.get('model'), _info.get('version'), _info.get('build'))
+        _shared = all(_key)
+        _capabilities = None
+        if _shared and not refresh:
+            _capabilities = self._capability_cache.get(_key)
+        if _capabilities is None:
+            _probed = {}
+            for _cmd in self.CAPABILITY_PROBES.values():
+                if _cmd not in _probed:
+                    _probed[_cmd] = self._probe(_cmd, timeout)
+            _capabilities = {_feature: _probed[_cmd]
+                             for _feature, _cmd in self.CAPABILITY_PROBES.items()}
+            if _shared and None not in _capabilities.values():
+                self._capability_cache[_key] = _capabilities
+        self._capabilities = _capabilities
+        return dict(_capabilities)
+
+    def supports(self, feature):
+        """
+        Check if the IP Camera supports an optional feature.
+
+        Returns True if the capabilities have not been probed yet or the
+        probe of the feature failed.
+
+        feature -- one of the CAPABILITY_* values
+        """
+        if self._capabilities is None:
+            return True
+        return self._capabilities.get(feature) is not False
+
+    def _probe(self, cmd, timeout):
+        """
+        Check if a CGI exists on the IP camera, returning None if the probe
+        gave no definite answer.
+        """
+        try:
+            r = self.session.get(self._base_url + cmd, auth=self._credentials.auth,
+                                 timeout=timeout)
+        except requests.RequestException as e:
+            _LOGGER.debug('probe of %s failed: %s', cmd, e)
+            return None
+        if r.status_code in self.CAPABILITY_MISSING_STATUS:
+            return False
+        return True if r.status_code == 200 else None
+
+    def _check_supported(self, cmd):
+        """Fail fast if the command belongs to an unsupported feature."""
+        if self._capabilities is None:
+            return
+        _feature = self.CAPABILITY_COMMANDS.get(cmd)
+        if _feature is not None and self._capabilities.get(_feature) is False:
+            raise DlinkDCSUnsupportedError(
+                '%s is not supported by this camera' % _feature)
+
+    @property
+    def session(self):
+        """HTTP session keeping the IP camera connection open between commands."""
+        if self._session is None:
+            self._session = requests.Session()
+        return self._session
+
+    def close(self):
+        """Close the IP camera connection."""
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+    def send_request(self, cmd, params={}, **kwargs):
+        """
+        Send a request to the IP camera and return the requests Response.
+
+        kwargs -- additional arguments passed to requests e.g. stream, timeout
+        """
+        self._check_supported(cmd)
+        kwargs.setdefault('timeout', self.timeout)
+        r = self.session.get(self._base_url + cmd, auth=self._credentials.auth,
+                             params=params, **kwargs)
+        _LOGGER.debug(r.request.url)
+        return r
 
     def send_command(self, cmd, params={}):
         """Send a control command to the IP camera."""
-        _url = 'http://%s:%d/%s' % (self.host, self.port, cmd)
-        r = requests.get(_url, auth=(self.user, self.password), params=params)
-        log = logging.getLogger("DlinkDCSCamera.send_command")
-        log.debug(r.request.url)
-        return self.unmarshal_response(r.content.decode('utf-8'))
+        _cache = self._cache
+        if _cache is not None:
+            if params:
+                # the cached responses the setter changes are out of date
+                for _stale in STALE.get(cmd, (cmd,)):
+                    _cache.responses.pop(_stale, None)
+            else:
+                _response = _cache.get(cmd)
+                if _response is not None:
+                    return _response
+        if self.tracer is None:
+            return self._send_command(cmd, params)
+        return self.tracer.send_command(self, cmd, params)
+
+    def _send_command(self, cmd, params):
+        """Send a command and parse the response, calling the command hooks."""
+        if not self.command_hooks:
+            r = self.send_request(cmd, params)
+        else:
+            _started = time.time()
+            _start = time.perf_counter()
+            r = self.send_request(cmd, params)
+            _elapsed = time.perf_counter() - _start
+            for _hook in self.command_hooks:
+                _hook(self, cmd, params, r, _started, _elapsed)
+        return self._parse_command(cmd, params, r)
+
+    def _parse_command(self, cmd, params, r):
+        """Parse a command response, caching it if a getter succeeded."""
+        _response = self.unmarshal_response(r.content.decode('utf-8'))
+        if self._cache is not None and not params and r.status_code == 200:
+            self._cache.put(cmd, _response)
+        return _response
+
+    def cache_responses(self, ttl=60):
+        """
+        Cache the successful responses of the getters, returning the cached
+        response until it is older than ttl seconds or a setter changes it.
+        Replaces any cached responses.
+
+        ttl -- seconds a response is cached, None to cache until
+               invalidated, 0 to stop caching (default 60)
+        """
+        self._cache = None if ttl == 0 else _ResponseCache(ttl)
+
+    def invalidate(self, cmd=None):
+        """
+        Drop cached getter responses.
+
+        cmd -- CGI of the response to drop (default all)
+        """
+        if self._cache is None:
+            return
+        if cmd is None:
+            self._cache.responses.clear()
+        else:
+            self._cache.responses.pop(cmd, None)
+
+    def prefetch(self, getters, workers=8):
+        """
+        Send getters at the same time and cache their responses, enabling
+        the cache if needed. Returns a dict of the getters that failed and
+        their exception.
+
+        getters -- names of getters e.g. ['get_motion_detection']
+        workers -- getters sent at the same time (default 8)
+        """
+        getters = list(getters)
+        for _name in getters:
+            _endpoint = BY_NAME.get(_name)
+            if _endpoint is None or _endpoint.setter:
+                raise ValueError('%s is not a getter' % _name)
+        if self._cache is None:
+            self.cache_responses()
+
+        def _fetch(name):
+            try:
+                getattr(self, name)()
+            except (requests.RequestException, DlinkDCSUnsupportedError) as e:
+                _LOGGER.debug('prefetch %s failed: %s', name, e)
+                return name, e
+            return name, None
+
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(getters)))) as _pool:
+            return {_name: _error for _name, _error in _pool.map(_fetch, getters)
+                    if _error is not None}
+
+    def send_command_iter(self, cmd, params={}, chunk_size=512):
+        """
+        Send a control command and yield the response (key, value) pairs.
+
+        The response is read in chunks and every pair is yielded as it
+        arrives, including repeated keys.
+
+        chunk_size -- number of bytes to read at a time (default 512)
+        """
+        r = self.send_request(cmd, params, stream=True)
+        with r:
+            _lines = r.iter_lines(chunk_size=chunk_size)
+            for _pair in iter_pairs(_line.decode('utf-8') for _line in _lines):
+                yield _pair
 
     def unmarshal_response(self, response):
         """Unmarshal the multiline key value pair response."""
-        _obj = {}
-        for line in response.splitlines():
-            # ignore blank lines and xml <result> block
-            if line != '' and not line.startswith('<'):
-                _keyvalue = line.strip().split("=")
-                _obj[_keyvalue[0]] = _keyvalue[1]
-        return _obj
+        return dict(iter_pairs(response.splitlines()))
 
     def time_to_string(self, time):
         """Conert a datetime into the HH:MM:SS string format."""
         return datetime.strftime(time, '%H:%M:%S')
 
     # GETTERS
+    #
+    # get_cgi_version(), get_common_info() and the other getters sending a
+    # CGI without parameters are generated from endpoints.ENDPOINTS.
 
-    def get_cgi_version(self):
-        """Get IP Camera CGI version."""
-        return self.send_command('cgiversion.cgi')
-
-    def get_common_info(self):
-        """Get IP Camera Information."""
-        return self.send_command('common/info.cgi')
-
-    def get_date_time(self):
-        """Get IP Camera Data Time settings."""
-        return self.send_command('datetime.cgi')
-
-    def get_day_night(self):
-        """Get the IP Camera Day Night Mode settings."""
-        return self.send_command('daynight.cgi')
-
-    def get_email(self):
-        """Get the IP Camera Email notification settings."""
-        return self.send_command('email.cgi')
+    def get_snapshot(self):
+        """Get a JPEG snapshot image from the IP Camera."""
+        return self.send_request('image/jpeg.cgi').content
 
-    def get_iimage(self):
-        """Get the IP Camera Image information."""
-        return self.send_command('iimage.cgi')
-
-    def get_image(self):
-        """Get the IP Camera Image information."""
-        return self.send_command('image.cgi')
-
-    def get_inetwork(self):
-        """Get the IP Camera Network information."""
-        return self.send_command('inetwork.cgi')
-
-    def get_isystem(self):
-        """Get the IP Camera System information."""
-        return self.send_command('isystem.cgi')
-
-    def get_iwireless(self):
-        """Get the IP Camera Wireless information."""
-        return self.send_command('iwireless.cgi')
-
-    def get_motion_detection(self):
-        """Get the IP Camera Motion Detection settings."""
-        return self.send_command('motion.cgi')
+    def iter_ptz_presets(self):
+        """
+        Yield the IP Camera Pan Tilt Zoom Presets as they are received.
 
-    def get_network(self):
-        """Get the IP Camera Network settings."""
-        return self.send_command('network.cgi')
+        Each preset is yielded as a dict. The list wide 'presets' and 'home'
+        values are yielded as (key, value) tuples.
+        """
+        _pairs = self.send_command_iter('config/ptz_preset_list.cgi')
+        return iter_entries(_pairs, header_keys=self.PTZ_PRESET_HEADER_KEYS)
 
-    def get_ptz(self):
-        """Get the IP Camera Network Pan Tilt Zoom."""
-        return self.send_command('config/ptz_move.cgi')
+    def iter_user_list(self):
+        """Yield each IP Camera user as a dict as it is received."""
+        return iter_entries(self.send_command_iter('userlist.cgi'), 'UserName')
 
-    def get_ptz_presets(self):
-        """Get the IP Camera Network Pan Tilt Zoom Preset List"""
-        return self.send_command('config/ptz_preset_list.cgi')
+    def get_ptz_preset_entries(self):
+        """
+        Get the IP Camera Pan Tilt Zoom Presets as an EntryList.
 
-    def get_sound_detection(self):
-        """Get the IP Camera Sound Detection settings."""
-        return self.send_command('sdbdetection.cgi')
+        The 'presets' and 'home' values are available in the list header.
+        """
+        _pairs = self.send_command_iter('config/ptz_preset_list.cgi')
+        return EntryList.from_pairs(_pairs, header_keys=self.PTZ_PRESET_HEADER_KEYS)
 
-    def get_stream_info(self):
-        """Get the IP Camera Video stream info."""
-        return self.send_command('config/stream_info.cgi')
+    def get_user_entries(self):
+        """Get the IP Camera users as an EntryList with one entry per user."""
+        return EntryList.from_pairs(self.send_command_iter('userlist.cgi'), 'UserName')
 
-    def get_upload(self):
-        """Get the IP Camera FTP Upload settings."""
-        return self.send_command('upload.cgi')
+    def watch(self, endpoints, interval=30, initial=True, stop=None):
+        """
+        Poll getters and yield a ConfigChange each time a response changes.
 
-    def get_user(self):
-        """Get the IP Camera user setttings."""
-        return self.send_command('user.cgi')
+        Responses are hashed before they are parsed, so unchanged responses
+        are not parsed or compared.
 
-    def get_user_list(self):
-        """Get the list of IP Camera users."""
-        return self.send_command('userlist.cgi')
+        endpoints -- getter names e.g. ['get_motion_detection', 'get_upload']
+        interval -- seconds between polls (default 30)
+        initial -- yield the first response of each getter (default True)
+        stop -- threading.Event ending the watch when set (default never)
+        """
+        _watcher = ConfigWatcher(endpoints, initial)
+        while True:
+            _started = time.monotonic()
+            for _change in _watcher.poll(self):
+                yield _change
+            if wait_interval(interval, _started, stop):
+                return
 
     # SETTERS
+    #
+    # set_day_night(), set_ptz() and the other setters are generated from
+    # endpoints.ENDPOINTS, validating their arguments before sending.
 
-    def set_day_night(self, mode):
-        """
-        Set the IP Camera Day Night Mode.
-
-        mode -- one of DAY_NIGHT_AUTO, DAY_NIGHT_MANUAL, DAY_NIGHT_ALWAYS_DAY,
-                DAY_NIGHT_ALWAYS_NIGHT, or DAY_NIGHT_SCHEDULE.
-        """
-        _params = {
-            'DayNightMode': int(mode),
-            'ConfigReboot': 'no',
-        }
-        return self.send_command('daynight.cgi', _params)
-
-    def set_day_night_sensor(self, light_sensor_control):
-        """
-        Set the IP Camera Day Night light lensor control.
-
-        light_sensor_control -- one of DAY_NIGHT_LIGHT_SENSOR_LOW,
-                                DAY_NIGHT_LIGHT_SENSOR_MEDIUM
-                                DAY_NIGHT_LIGHT_SENSOR_HIGH
-        """
-        _params = {
-            'LightSensorControl': light_sensor_control,
-            'ConfigReboot': 'no',
-        }
-        return self.send_command('daynight.cgi', _params)
-
-    def set_day_night_schedule(self,
-                               sun_start, sun_end, mon_start, mon_end,
-                               tue_start, tue_end, wed_start, wed_end,
-                               thu_start, thu_end, fri_start, fri_end,
-                               sat_start, sat_end):
-        """
-        Set the IP Camera Day Night Schedule.
-
-        Scheduled times are used when the Day Night Mode is set to
-        DAY_NIGHT_SCHEDULE. Daily Start and End times must be in a 'HH:MM'
-        format.
-        """
-        _params = {
-            'IRLedScheduleSunStart': sun_start,
-            'IRLedScheduleSunEnd': sun_end,
-            'IRLedScheduleMonStart': mon_start,
-            'IRLedScheduleMonEnd': mon_end,
-            'IRLedScheduleTueStart': tue_start,
-            'IRLedScheduleTueEnd': tue_end,
-            'IRLedScheduleWedStart': wed_start,
-            'IRLedScheduleWedEnd': wed_end,
-            'IRLedScheduleThuStart': thu_start,
-            'IRLedScheduleThuEnd': thu_end,
-            'IRLedScheduleFriStart': fri_start,
-            'IRLedScheduleFriEnd': fri_end,
-            'IRLedScheduleSatStart': sat_start,
-            'IRLedScheduleSatEnd': sat_end,
-            'ConfigReboot': 'no',
-        }
-        return self.send_command('daynight.cgi', _params)
-
-    def set_email_account(self, host, user, password, sender, receiver, tls, port=25):
-        """
-        Set the IP Camera Email Notification Account.
-
-        host -- email server host address
-        user -- email account user
-        password -- email account password
-        sender -- from email address of sender
-        receiver -- to email address of receiver
-        tls -- one of EMAIL_TLS_NONE, EMAIL_TLS_SSLTLS, EMAIL_TLS_STARTTLS
-        port -- email server port (default = 25)
-        """
-        _params = {
-            'EmailSMTPServerAddress': host,
-            'EmailSMTPPortNumber': int(port),
-            'EmailTLSAuthentication': int(tls),
-            'EmailUserName': user,
-            'EmailPassword': password,
-            'EmailReceiverAddress': receiver,
-            'EmailSenderAddress': sender,
-            'ConfigReboot': 'no',
-        }
-        return self.send_command('email.cgi', _params)
-
-    def set_email_image(self, enable):
-        """Enable or Disable IP Camera Email Images."""
-        _params = {
-            'EmailScheduleEnable': ('1' if enable else '0'),
-            'ConfigReboot': 'no',
-        }
-        return self.send_command('email.cgi', _params)
-
-    def set_email_image_mode(self, mode,
-                             motion_mode=0,
-                             motion_frame_interval=1):
-        """
-        Set the IP Camera Email Image Mode.
-
-        mode -- one of EMAIL_MODE_ALWAYS, EMAIL_MODE_SCHEDULE, EMAIL_MODE_MOTION
-        motion_mode -- EMAIL_MOTION_MODE_IMMIDIATE or EMAIL_MOTION_MODE_MULTIFRAME
-        motion_frame_interval -- set image interval if motion_mode is multi-frame.
-                                 One of EMAIL_MOTION_MULTIFRAME_SECONDS_HALF or
-                                 EMAIL_MOTION_MULTIFRAME_SECONDS_ONE
-        """
-        _params = {
-            'EmailScheduleMode': int(mode),
-            'EmailMotionMode': int(motion_mode),
-            'EmailMotionFrameInterval': int(motion_frame_interval),
-            'ConfigReboot': 'no',
-        }
-        return self.send_command('email.cgi', _params)
-
-    def set_email_image_schedule(self, schedule_days,
-                                 schedule_start, schedule_stop,
-                                 interval=300):
-        """
-        Set the IP Camera Email Schedule for Images.
-
-        Effective when Email Image mode is EMAIL_MODE_SCHEDULE
-
-        schedule_days -- value representing scheduled days (1..127)
-                         e.g. schedule_days = MONDAY + WEDNESDAY + FRIDAY
-        schedule_start -- daily start time in the format 'HH:MM:SS'
-        schedule_stop -- daily stop time in the format 'HH:MM:SS'
-        interval -- number of seconds between emails (default 300 seconds)
-        """
-        _params = {
-            'EmailScheduleDay': int(schedule_days),
-            'EmailScheduleTimeStart': schedule_start,
-            'EmailScheduleTimeStop': schedule_stop,
-            'EmailScheduleInterval': int(interval),
-            'ConfigReboot': 'no',
-        }
-        return self.send_command('email.cgi', _params)
-
-    def set_email_video(self, enable):
-        """Enable or Disable IP Camera Email Videos."""
-        _params = {
-            'EmailScheduleEnableVideo': ('1' if enable else '0'),
-            'ConfigReboot': 'no',
-        }
-        return self.send_command('email.cgi', _params)
-
-    def set_email_video_mode(self, mode):
-        """
-        Set the IP Camera Email Videos Mode.
-
-        mode -- one of EMAIL_MODE_ALWAYS, EMAIL_MODE_SCHEDULE, EMAIL_MODE_MOTION
-        """
-        _params = {
-            'EmailScheduleModeVideo': int(mode),
-            'ConfigReboot': 'no',
-        }
-        return self.send_command('email.cgi', _params)
-
-    def set_email_video_schedule(self, schedule_days,
-                                 schedule_start, schedule_stop,
-                                 interval=300):
-        """
-        Set the IP Camera Email Schedule for Videos.
-
-        Effective when Email Image mode is EMAIL_MODE_SCHEDULE
-
-        schedule_days -- value representing scheduled days (1..127)
-                         e.g. schedule_days = MONDAY + WEDNESDAY + FRIDAY
-        schedule_start -- daily start time in the format 'HH:MM:SS'
-        schedule_stop -- daily stop time in the format 'HH:MM:SS'
-        interval -- number of seconds between emails (default 300 seconds)
-        """
-        _params = {
-            'EmailScheduleDayVideo': int(schedule_days),
-            'EmailScheduleTimeStartVideo': schedule_start,
-            'EmailScheduleTimeStopVideo': schedule_stop,
-            'EmailScheduleIntervalVideo': int(interval),
-            'ConfigReboot': 'no',
-        }
-        return self.send_command('email.cgi', _params)
-
-    def set_motion_detection(self, enable):
-        """Enable or Disable IP Camera Motion Detection."""
-        _params = {
-            'MotionDetectionEnable': ('1' if enable else '0'),
-            'ConfigReboot': 'no',
-        }
-        return self.send_command('motion.cgi', _params)
-
-    def set_motion_detection_sensitivity(self, sensitivity):
-        """Set the IP Camera Motion Detection Sensitivity."""
-        _params = {
-            'MotionDetectionSensitivity': str(sensitivity),
-            'ConfigReboot': 'no',
-        }
-        return self.send_command('motion.cgi', _params)
-
-    def set_motion_detection_blockset(self, blockset):
-        """
-        Set the IP Camera Motion Detection Blockset mask.
-
-        blockset -- a 5x5 bitmask of enabled motion capture cells e.g.
-                    1111100000111110000011111
-        """
-        _params = {
-            'MotionDetectionBlockSet': blockset,
-            'ConfigReboot': 'no',
-        }
-        return self.send_command('motion.cgi', _params)
-
-    def set_motion_detection_mode(self, mode):
-        """
-        Set the IP Camera Motion Detection mode.
-
-        mode -- one of MOTION_DETECTION_ALWAYS or MOTION_DETECTION_SCHEDULE
-        """
-        _params = {
-            'MotionDetectionScheduleMode': int(mode),
-            'ConfigReboot': 'no',
-        }
-        return self.send_command('motion.cgi', _params)
-
-    def set_motion_detection_schedule(self, schedule_days,
-                                      schedule_start, schedule_stop):
-        """
-        Set the IP Camera Motion Detection Schedule.
-
-        Effective when Motion Detection mode is MOTION_DETECTION_SCHEDULE
-
-        schedule_days -- value representing scheduled days (1..127)
-                         e.g. schedule_days = MONDAY + WEDNESDAY + FRIDAY
-        schedule_start -- daily start time in the format 'HH:MM:SS'
-        schedule_stop -- daily stop time in the format 'HH:MM:SS'
-        """
-        _params = {
-            'MotionDetectionScheduleDay': int(schedule_days),
-            'MotionDetectionScheduleTimeStart': schedule_start,
-            'MotionDetectionScheduleTimeStop': schedule_stop,
-            'ConfigReboot': 'no',
-        }
-        return self.send_command('motion.cgi', _params)
-
-
-    def set_ptz(self, pan=167, tilt=25, zoom=0):
-        """
-        Set the IP Camera Pan Tilt Zoom location.
-
-        pan -- 0 to 336 (default: 167)
-        tile -- 0 to 106 (default: 25)
-        zoom --
-        """
-        _params = {
-            'p': int(pan),
-            't': int(tilt),
-            'z': int(zoom),
-        }
-        return self.send_command('config/ptz_move.cgi', _params)
-
-    def set_ptz_move(self, x, y):
-        """Move the IP Camera Pan Tilt Zoom location."""
-        _params = {
-            'command': 'set_relative_pos',
-            'posX': int(x),
-            'posY': int(y),
-        }
-        return self.send_command('cgi/ptdc.cgi', _params)
-
-    def set_ptz_move_preset(self, preset):
-        """Move the IP Camera to a Preset Pan Tilt Zoom location."""
-        _params = {
-            'PanTiltPresetPositionMove': preset,
-        }
-        return self.send_command('pantiltcontrol.cgi', _params)
-
-    def set_sound_detection(self, enable):
-        """Enable or Disable the IP Camera Sound Detection."""
-        _params = {
-            'SoundDetectionEnable': ('1' if enable else '0'),
-            'ConfigReboot': 'no',
-        }
-        return self.send_command('sdbdetection.cgi', _params)
-
-    def set_sound_detection_sensitivity(self, decibels):
-        """
-        Set the IP Camera Sound Detection sensitivity.
-
-        decibels - the number of decibels required to trigger sound detection,
-                   in the range 50..90
-        """
-        _params = {
-            'SoundDetectionDB': str(decibels),
-            'ConfigReboot': 'no',
-        }
-        return self.send_command('sdbdetection.cgi', _params)
-
-    def set_sound_detection_mode(self, mode):
-        """
-        Set the IP Camera Sound Detection mode.
-
-        mode -- one of SOUND_DETECTION_ALWAYS or SOUND_DETECTION_SCHEDULE
-        """
-        _params = {
-            'SoundDetectionScheduleMode': int(mode),
-            'ConfigReboot': 'no',
-        }
-        return self.send_command('sdbdetection.cgi', _params)
-
-    def set_sound_detection_schedule(self, schedule_days,
-                                     schedule_start, schedule_stop):
-        """
-        Set the IP Camera Sound Detection Schedule.
-
-        Effective when Sound Detection mode is SOUND_DETECTION_SCHEDULE
-
-        schedule_days -- value representing scheduled days (1..127)
-                         e.g. schedule_days = MONDAY + WEDNESDAY + FRIDAY
-        schedule_start -- daily start time in the format 'HH:MM:SS'
-        schedule_stop -- daily stop time in the format 'HH:MM:SS'
-        """
-        _params = {
-            'SoundDetectionScheduleDay': int(schedule_days),
-            'SoundDetectionScheduleTimeStart': schedule_start,
-            'SoundDetectionScheduleTimeStop': schedule_stop,
-            'ConfigReboot': 'no',
-        }
-        return self.send_command('sdbdetection.cgi', _params)
-
-    def set_upload_server(self, host, user, password, path='/',
-                          passive=True, port=21):
-        """
-        Set the IP Camera FTP upload server settings.
-
-        host -- FTP server hostname
-        user -- FTP server user
-        psasword -- FTP server password
-        path -- FTP server upload path (default '/')
-        passive -- Passive mode (deafault True)
-        port -- FTP server port (default 21)
-        """
-        _params = {
-            'FTPHostAddress': host,
-            'FTPUserName': user,
-            'FTPPassword': password,
-            'FTPDirectoryPath': path,
-            'FTPPortNumber': int(port),
-            'FTPPassiveMode': ('1' if passive else '0'),
-            'ConfigReboot': 'no',
-        }
-        return self.send_command('upload.cgi', _params)
-
-    def set_upload_image(self, enable):
-        """Enable or Disable Image upload."""
-        _params = {
-            'FTPScheduleEnable': ('1' if enable else '0'),
-            'ConfigReboot': 'no',
-        }
-        return self.send_command('upload.cgi', _params)
-
-    def set_upload_image_mode(self, mode):
-        """
-        Set the IP Camera image upload mode.
-
-        mode -- one of FTP_MODE_ALWAYS, FTP_MODE_SCHEDULE, FTP_MODE_DETECTION
-        """
-        _params = {
-            'FTPScheduleMode': int(mode),
-            'ConfigReboot': 'no',
-        }
-        return self.send_command('upload.cgi', _params)
-
-    def set_upload_image_settings(self,
-                                  filename='image',
-                                  filename_mode=1,
-                                  max_file_sequence_number=1024,
-                                  create_subfolder_minutes=0,
-                                  frequency_mode=0,
-                                  frames_per_second=-1,
-                                  seconds_per_frame=1):
-        """
-        Set the IP Camera upload image settings.
-
-        filename -- base file name
-        filename_mode -- UPLOAD_FILE_MODE_OVERWRITE, UPLOAD_FILE_MODE_DATETIME
-                         or UPLOAD_FILE_MODE_SEQUENCE
-        max_file_sequence_number -- maxamum sequence number if mode is
-                                    UPLOAD_FILE_MODE_SEQUENCE
-        create_subfolder_minutes -- create date/time subfolders
-        frequency_mode -- FRAMES_PER_SECONDS or SECONDS_PER_FRAME
-        frames_per_second -- frames (images) per second (1..3), use -1 for Auto
-        seconds_per_frame -- seconds between frames
-        """
-        _params = {
-            'FTPScheduleVideoFrequencyMode': int(frequency_mode),
-            'FTPScheduleFramePerSecond': int(frames_per_second),
-            'FTPScheduleSecondPerFrame': int(seconds_per_frame),
-            'FTPScheduleBaseFileName': filename,
-            'FTPScheduleFileMode': int(filename_mode),
-            'FTPScheduleMaxFileSequenceNumber': int(max_file_sequence_number),
-            'FTPCreateFolderInterval': int(create_subfolder_minutes),
-            'ConfigReboot': 'no',
-        }
-        return self.send_command('upload.cgi', _params)
-
-    def set_upload_image_schedule(self,
-                                  schedule_days=0,
-                                  schedule_start='00:00:00',
-                                  schedule_stop='00:00:00'):
-        """
-        Set the IP Camera upload image schedule.
-
-        These settings are used if mode is FTP_MODE_SCHEDULE
-
-        schedule_days -- value representing scheduled days (1..127)
-                         e.g. schedule_days = MONDAY + WEDNESDAY + FRIDAY
-        schedule_start -- daily start time in the format 'HH:MM:SS'
-        schedule_stop -- daily end time in the format 'HH:MM:SS'
-        """
-        _params = {
-            'FTPScheduleDay': schedule_days,
-            'FTPScheduleTimeStart': schedule_start,
-            'FTPScheduleTimeStop': schedule_stop,
-            'ConfigReboot': 'no',
-        }
-        return self.send_command('upload.cgi', _params)
-
-    def set_upload_video(self, enable):
-        """Enable or Disable Video upload."""
-        _params = {
-            'FTPScheduleEnableVideo': ('1' if enable else '0'),
-            'ConfigReboot': 'no',
-        }
-        return self.send_command('upload.cgi', _params)
-
-    def set_upload_video_settings(self, filename='video',
-                                  file_limit_size=2048,
-                                  file_limit_time=10):
-        """
-        Set the IP Camera upload video file settings.
-
-        filename -- base file name
-        file_limit_size -- video file size KBytes
-                           (default is 2048, max is 3072 KBytes)
-        file_limit_time -- video file lenght in seconds
-                           (default is 10, max is 15 seconds)
-        """
-        _params = {
-            'FTPScheduleBaseFileNameVideo': filename,
-            'FTPScheduleVideoLimitSize': int(file_limit_size),
-            'FTPScheduleVideoLimitTime': int(file_limit_time),
-            'ConfigReboot': 'no',
-        }
-        return self.send_command('upload.cgi', _params)
-
-    def set_upload_video_mode(self, mode):
-        """
-        Set the IP Camera upload video mode.
-
-        mode -- one of FTP_MODE_ALWAYS, FTP_MODE_SCHEDULE, FTP_MODE_DETECTION
-        """
-        _params = {
-            'FTPScheduleModeVideo': mode,
-            'ConfigReboot': 'no',
-        }
-        return self.send_command('upload.cgi', _params)
-
-    def set_upload_video_schedule(self, schedule_days=0,
-                                  schedule_start='00:00:00',
-                                  schedule_stop='00:00:00'):
-        """
-        Set the IP Camera upload video schedule.
-
-        These settings are used if mode is FTP_MODE_SCHEDULE
-
-        schedule_days -- value representing scheduled days (1..127)
-                         e.g. schedule_days = MONDAY + WEDNESDAY + FRIDAY
-        schedule_start -- daily start time in the format 'HH:MM:SS'
-        schedule_stop -- daily end time in the format 'HH:MM:SS'
-        """
-        _params = {
-            'FTPScheduleDayVideo': schedule_days,
-            'FTPScheduleTimeStartVideo': schedule_start,
-            'FTPScheduleTimeStopVideo': schedule_stop,
-            'ConfigReboot': 'no',
-        }
-        return self.send_command('upload.cgi', _params)
+    def batch(self):
+        """
+        Return a DlinkDCSBatch merging setter calls into one request per CGI.
+        """
+        return DlinkDCSBatch(self)
 
     # HELPERS
 
@@ -705,3 +583,38 @@ class DlinkDCSCamera(object):
     def enable_upload_video(self):
         """Enable video upload."""
         return self.set_upload_video(True)
+
+    def push_email_to(self, receiver, receiver_address='camera@localhost'):
+        """
+        Configure the IP Camera to send email to a DlinkDCSEmailReceiver.
+
+        A login for this camera is registered with the receiver and the
+        camera email account is set to the receiver address, without TLS.
+
+        receiver -- DlinkDCSEmailReceiver to send email to
+        receiver_address -- to email address (default 'camera@localhost')
+        """
+        _user, _password = receiver.register(self)
+        _sender = receiver.sender_address(_user)
+        return self.set_email_account(receiver.public_host, _user, _password,
+                                      _sender, receiver_address,
+                                      self.EMAIL_TLS_NONE, receiver.port)
+
+    def push_uploads_to(self, receiver, path='/', passive=True):
+        """
+        Configure the IP Camera to upload to a DlinkDCSUploadReceiver.
+
+        A login for this camera is registered with the receiver and the
+        camera FTP upload server is set to the receiver address.
+
+        receiver -- DlinkDCSUploadReceiver to upload to
+        path -- FTP upload path (default '/')
+        passive -- Passive mode (default True)
+        """
+        _user, _password = receiver.register(self)
+        return self.set_upload_server(receiver.public_host, _user, _password,
+                                      path, passive, receiver.port)
+
+
+for _endpoint in ENDPOINTS:
+    _endpoint.install(DlinkDCSCamera)
@@ -0,0 +1,616 @@
+"""
+Declarative table of the DLINK DCS IP Camera CGI endpoints.
+
+Every getter and setter of DlinkDCSCamera is generated from an Endpoint in
+ENDPOINTS. Each setter argument is described by a Param giving the CGI key,
+how the value is encoded and the values the camera accepts, so bad values
+raise ValueError before any request is sent. Each method also gets an
+asyncio variant named <method>_async, and setters can be merged into one
+request per CGI with DlinkDCSBatch.
+"""
+
+import asyncio
+import inspect
+import re
+
+
+REQUIRED = inspect.Parameter.empty
+
+# 'HH:MM' and 'HH:MM:SS' times accepted by the camera schedules, with
+# 24:00 as the end of the day
+_HOUR = r'(?:[01]?\d|2[0-3])'
+_HH_MM = r'(?:%s:[0-5]\d|24:00)' % _HOUR
+_HH_MM_SS = r'(?:%s:[0-5]\d:[0-5]\d|24:00:00)' % _HOUR
+
+# 5x5 bitmask of motion detection cells
+_BLOCKSET = r'[01]{25}'
+
+
+def integer(value):
+    """Encode a number."""
+    return int(value)
+
+
+def flag(value):
+    """Encode a boolean, or its text e.g. 'true' or '0', as '1' or '0'."""
+    if isinstance(value, str):
+        _value = value.strip().lower()
+        if _value in ('1', 'true', 'yes', 'on'):
+            return '1'
+        if _value in ('0', 'false', 'no', 'off'):
+            return '0'
+        raise ValueError(value)
+    return '1' if value else '0'
+
+
+def text(value):
+    """Pass a value through unchanged."""
+    return value
+
+
+class Param(object):
+    """An argument of a setter and the CGI key it is sent as."""
+
+    __slots__ = ('name', 'key', 'encoder', 'default', 'minimum', 'maximum',
+                 'choices', 'pattern')
+
+    def __init__(self, name, key, encoder=text, default=REQUIRED,
+                 minimum=None, maximum=None, choices=None, pattern=None):
+        """
+        Initialize the parameter.
+
+        name -- method argument name
+        key -- CGI parameter name
+        encoder -- integer, flag or text (default text)
+        default -- default value, REQUIRED if the argument must be given
+        minimum -- smallest accepted value of an integer
+        maximum -- largest accepted value of an integer
+        choices -- accepted values of an integer
+        pattern -- regular expression a text value must match
+        """
+        self.name = name
+        self.key = key
+        self.encoder = encoder
+        self.default = default
+        self.minimum = minimum
+        self.maximum = maximum
+        self.choices = None if choices is None else frozenset(choices)
+        self.pattern = None if pattern is None else re.compile(pattern)
+
+    def encode(self, value):
+        """Validate a value and return it encoded for the CGI."""
+        try:
+            _value = self.encoder(value)
+        except (TypeError, ValueError):
+            raise ValueError('%s must be a %s, got %r' % (
+                self.name, 'boolean' if self.encoder is flag else 'number', value))
+        if self.choices is not None and _value not in self.choices:
+            raise ValueError('%s must be one of %s, got %r' % (
+                self.name, ', '.join(str(_c) for _c in sorted(self.choices)), value))
+        if ((self.minimum is not None and _value < self.minimum) or
+                (self.maximum is not None and _value > self.maximum)):
+            raise ValueError('%s must be in the range %s..%s, got %r' % (
+                self.name, '' if self.minimum is None else self.minimum,
+                '' if self.maximum is None else self.maximum, value))
+        if self.pattern is not None and not self.pattern.fullmatch(str(_value)):
+            raise ValueError('%s must match %s, got %r' % (
+                self.name, self.pattern.pattern, value))
+        return _value
+
+
+class Endpoint(object):
+    """A getter or setter method and the CGI it sends."""
+
+    def __init__(self, name, cgi, doc, params=(), fixed=None, reboot=True,
+                 stale=None):
+        """
+        Initialize the endpoint.
+
+        name -- DlinkDCSCamera method name
+        cgi -- CGI path
+        doc -- method docstring
+        params -- setter arguments as Params, empty for a getter
+        fixed -- additional CGI parameters sent with every request
+        reboot -- send 'ConfigReboot': 'no' with a setter (default True)
+        stale -- getter CGIs whose cached responses a setter makes out of
+                 date (default the setter CGI)
+        """
+        self.name = name
+        self.cgi = cgi
+        self.doc = doc
+        self.params = tuple(params)
+        self.fixed = dict(fixed or {})
+        self.stale = tuple(stale or (cgi,)) if self.params else ()
+        if self.params and reboot:
+            self.fixed['ConfigReboot'] = 'no'
+        self._params = {_param.name: _param for _param in self.params}
+        self.signature = inspect.Signature(
+            [inspect.Parameter('self', inspect.Parameter.POSITIONAL_OR_KEYWORD)] +
+            [inspect.Parameter(_param.name, inspect.Parameter.POSITIONAL_OR_KEYWORD,
+                               default=_param.default) for _param in self.params])
+
+    @property
+    def setter(self):
+        """True if the endpoint changes the camera settings."""
+        return bool(self.params)
+
+    def encode(self, args=(), kwargs={}):
+        """
+        Bind method arguments and return the validated CGI parameters.
+
+        Raises TypeError for bad arguments, as a call to a method with the
+        same signature would, and ValueError for values out of range.
+        """
+        if len(args) > len(self.params):
+            raise TypeError('%s() takes %d positional arguments but %d were given'
+                            % (self.name, len(self.params) + 1, len(args) + 1))
+        _values = {_param.name: _value for _param, _value in zip(self.params, args)}
+        for _name, _value in kwargs.items():
+            if _name not in self._params:
+                raise TypeError("%s() got an unexpected keyword argument '%s'"
+                                % (self.name, _name))
+            if _name in _values:
+                raise TypeError("%s() got multiple values for argument '%s'"
+                                % (self.name, _name))
+            _values[_name] = _value
+        _encoded = {}
+        for _param in self.params:
+            _value = _values.get(_param.name, _param.default)
+            if _value is REQUIRED:
+                raise TypeError("%s() missing required argument: '%s'"
+                                % (self.name, _param.name))
+            try:
+                _encoded[_param.key] = _param.encode(_value)
+            except ValueError as e:
+                raise ValueError('%s() %s' % (self.name, e))
+        _encoded.update(self.fixed)
+        return _encoded
+
+    def _describe(self, method, name, doc, signature):
+        method.__name__ = name
+        method.__doc__ = doc
+        method.__signature__ = signature
+        return method
+
+    def method(self):
+        """Return the DlinkDCSCamera method sending the endpoint."""
+        _cgi = self.cgi
+        if not self.setter:
+            def _method(camera):
+                return camera.send_command(_cgi)
+        else:
+            _encode = self.encode
+
+            def _method(camera, *args, **kwargs):
+                return camera.send_command(_cgi, _encode(args, kwargs))
+        return self._describe(_method, self.name, self.doc, self.signature)
+
+    def async_method(self):
+        """
+        Return the asyncio variant of the method.
+
+        Arguments are validated before the request is run in a thread.
+        """
+        _cgi = self.cgi
+        _encode = self.encode
+
+        async def _method(camera, *args, **kwargs):
+            _params = _encode(args, kwargs) if self.setter else {}
+            return await asyncio.to_thread(camera.send_command, _cgi, _params)
+        return self._describe(_method, self.name + '_async',
+                              'Asyncio variant of %s().' % self.name, self.signature)
+
+    def install(self, cls):
+        """Add the method and its asyncio variant to a class."""
+        for _method in (self.method(), self.async_method()):
+            _method.__qualname__ = '%s.%s' % (cls.__name__, _method.__name__)
+            setattr(cls, _method.__name__, _method)
+
+
+def _days(name, key, default=REQUIRED):
+    return Param(name, key, integer, default, minimum=0, maximum=127)
+
+
+def _time(name, key, default=REQUIRED):
+    return Param(name, key, text, default, pattern=_HH_MM_SS)
+
+
+def _mode(name, key, choices, default=REQUIRED):
+    return Param(name, key, integer, default, choices=choices)
+
+
+ENDPOINTS = (
+
+    # GETTERS
+
+    Endpoint('get_cgi_version', 'cgiversion.cgi', """Get IP Camera CGI version."""),
+    Endpoint('get_common_info', 'common/info.cgi', """Get IP Camera Information."""),
+    Endpoint('get_date_time', 'datetime.cgi', """Get IP Camera Data Time settings."""),
+    Endpoint('get_day_night', 'daynight.cgi',
+             """Get the IP Camera Day Night Mode settings."""),
+    Endpoint('get_email', 'email.cgi',
+             """Get the IP Camera Email notification settings."""),
+    Endpoint('get_iimage', 'iimage.cgi', """Get the IP Camera Image information."""),
+    Endpoint('get_image', 'image.cgi', """Get the IP Camera Image information."""),
+    Endpoint('get_inetwork', 'inetwork.cgi',
+             """Get the IP Camera Network information."""),
+    Endpoint('get_isystem', 'isystem.cgi', """Get the IP Camera System information."""),
+    Endpoint('get_iwireless', 'iwireless.cgi',
+             """Get the IP Camera Wireless information."""),
+    Endpoint('get_motion_detection', 'motion.cgi',
+             """Get the IP Camera Motion Detection settings."""),
+    Endpoint('get_network', 'network.cgi', """Get the IP Camera Network settings."""),
+    Endpoint('get_ptz', 'config/ptz_move.cgi',
+             """Get the IP Camera Network Pan Tilt Zoom."""),
+    Endpoint('get_ptz_presets', 'config/ptz_preset_list.cgi',
+             """Get the IP Camera Network Pan Tilt Zoom Preset List"""),
+    Endpoint('get_sound_detection', 'sdbdetection.cgi',
+             """Get the IP Camera Sound Detection settings."""),
+    Endpoint('get_stream_info', 'config/stream_info.cgi',
+             """Get the IP Camera Video stream info."""),
+    Endpoint('get_upload', 'upload.cgi', """Get the IP Camera FTP Upload settings."""),
+    Endpoint('get_user', 'user.cgi', """Get the IP Camera user setttings."""),
+    Endpoint('get_user_list', 'userlist.cgi', """Get the list of IP Camera users."""),
+
+    # SETTERS
+
+    Endpoint('set_day_night', 'daynight.cgi', """
+        Set the IP Camera Day Night Mode.
+
+        mode -- one of DAY_NIGHT_AUTO, DAY_NIGHT_MANUAL, DAY_NIGHT_ALWAYS_DAY,
+                DAY_NIGHT_ALWAYS_NIGHT, or DAY_NIGHT_SCHEDULE.
+        """, [
+        _mode('mode', 'DayNightMode', range(5)),
+    ]),
+    Endpoint('set_day_night_sensor', 'daynight.cgi', """
+        Set the IP Camera Day Night light lensor control.
+
+        light_sensor_control -- one of DAY_NIGHT_LIGHT_SENSOR_LOW,
+                                DAY_NIGHT_LIGHT_SENSOR_MEDIUM
+                                DAY_NIGHT_LIGHT_SENSOR_HIGH
+        """, [
+        _mode('light_sensor_control', 'LightSensorControl', (1, 3, 5)),
+    ]),
+    Endpoint('set_day_night_schedule', 'daynight.cgi', """
+        Set the IP Camera Day Night Schedule.
+
+        Scheduled times are used when the Day Night Mode is set to
+        DAY_NIGHT_SCHEDULE. Daily Start and End times must be in a 'HH:MM'
+        format.
+        """, [
+        Param('%s_%s' % (_day.lower(), _end.lower()),
+              'IRLedSchedule%s%s' % (_day, _end), pattern=_HH_MM)
+        for _day in ('Sun', 'Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat')
+        for _end in ('Start', 'End')
+    ]),
+    Endpoint('set_email_account', 'email.cgi', """
+        Set the IP Camera Email Notification Account.
+
+        host -- email server host address
+        user -- email account user
+        password -- email account password
+        sender -- from email address of sender
+        receiver -- to email address of receiver
+        tls -- one of EMAIL_TLS_NONE, EMAIL_TLS_SSLTLS, EMAIL_TLS_STARTTLS
+        port -- email server port (default = 25)
+        """, [
+        Param('host', 'EmailSMTPServerAddress'),
+        Param('user', 'EmailUserName'),
+        Param('password', 'EmailPassword'),
+        Param('sender', 'EmailSenderAddress'),
+        Param('receiver', 'EmailReceiverAddress'),
+        _mode('tls', 'EmailTLSAuthentication', range(3)),
+        Param('port', 'EmailSMTPPortNumber', integer, 25, minimum=1, maximum=65535),
+    ]),
+    Endpoint('set_email_image', 'email.cgi',
+             """Enable or Disable IP Camera Email Images.""", [
+                 Param('enable', 'EmailScheduleEnable', flag),
+             ]),
+    Endpoint('set_email_image_mode', 'email.cgi', """
+        Set the IP Camera Email Image Mode.
+
+        mode -- one of EMAIL_MODE_ALWAYS, EMAIL_MODE_SCHEDULE, EMAIL_MODE_MOTION
+        motion_mode -- EMAIL_MOTION_MODE_IMMIDIATE or EMAIL_MOTION_MODE_MULTIFRAME
+        motion_frame_interval -- set image interval if motion_mode is multi-frame.
+                                 One of EMAIL_MOTION_MULTIFRAME_SECONDS_HALF or
+                                 EMAIL_MOTION_MULTIFRAME_SECONDS_ONE
+        """, [
+        _mode('mode', 'EmailScheduleMode', range(3)),
+        _mode('motion_mode', 'EmailMotionMode', range(2), 0),
+        _mode('motion_frame_interval', 'EmailMotionFrameInterval', range(2), 1),
+    ]),
+    Endpoint('set_email_image_schedule', 'email.cgi', """
+        Set the IP Camera Email Schedule for Images.
+
+        Effective when Email Image mode is EMAIL_MODE_SCHEDULE
+
+        schedule_days -- value representing scheduled days (1..127)
+                         e.g. schedule_days = MONDAY + WEDNESDAY + FRIDAY
+        schedule_start -- daily start time in the format 'HH:MM:SS'
+        schedule_stop -- daily stop time in the format 'HH:MM:SS'
+        interval -- number of seconds between emails (default 300 seconds)
+        """, [
+        _days('schedule_days', 'EmailScheduleDay'),
+        _time('schedule_start', 'EmailScheduleTimeStart'),
+        _time('schedule_stop', 'EmailScheduleTimeStop'),
+        Param('interval', 'EmailScheduleInterval', integer, 300, minimum=0),
+    ]),
+    Endpoint('set_email_video', 'email.cgi',
+             """Enable or Disable IP Camera Email Videos.""", [
+                 Param('enable', 'EmailScheduleEnableVideo', flag),
+             ]),
+    Endpoint('set_email_video_mode', 'email.cgi', """
+        Set the IP Camera Email Videos Mode.
+
+        mode -- one of EMAIL_MODE_ALWAYS, EMAIL_MODE_SCHEDULE, EMAIL_MODE_MOTION
+        """, [
+        _mode('mode', 'EmailScheduleModeVideo', range(3)),
+    ]),
+    Endpoint('set_email_video_schedule', 'email.cgi', """
+        Set the IP Camera Email Schedule for Videos.
+
+        Effective when Email Image mode is EMAIL_MODE_SCHEDULE
+
+        schedule_days -- value representing scheduled days (1..127)
+                         e.g. schedule_days = MONDAY + WEDNESDAY + FRIDAY
+        schedule_start -- daily start time in the format 'HH:MM:SS'
+        schedule_stop -- daily stop time in the format 'HH:MM:SS'
+        interval -- number of seconds between emails (default 300 seconds)
+        """, [
+        _days('schedule_days', 'EmailScheduleDayVideo'),
+        _time('schedule_start', 'EmailScheduleTimeStartVideo'),
+        _time('schedule_stop', 'EmailScheduleTimeStopVideo'),
+        Param('interval', 'EmailScheduleIntervalVideo', integer, 300, minimum=0),
+    ]),
+    Endpoint('set_motion_detection', 'motion.cgi',
+             """Enable or Disable IP Camera Motion Detection.""", [
+                 Param('enable', 'MotionDetectionEnable', flag),
+             ]),
+    Endpoint('set_motion_detection_sensitivity', 'motion.cgi',
+             """Set the IP Camera Motion Detection Sensitivity.""", [
+                 Param('sensitivity', 'MotionDetectionSensitivity', integer,
+                       minimum=0, maximum=100),
+             ]),
+    Endpoint('set_motion_detection_blockset', 'motion.cgi', """
+        Set the IP Camera Motion Detection Blockset mask.
+
+        blockset -- a 5x5 bitmask of enabled motion capture cells e.g.
+                    1111100000111110000011111
+        """, [
+        Param('blockset', 'MotionDetectionBlockSet', pattern=_BLOCKSET),
+    ]),
+    Endpoint('set_motion_detection_mode', 'motion.cgi', """
+        Set the IP Camera Motion Detection mode.
+
+        mode -- one of MOTION_DETECTION_ALWAYS or MOTION_DETECTION_SCHEDULE
+        """, [
+        _mode('mode', 'MotionDetectionScheduleMode', range(2)),
+    ]),
+    Endpoint('set_motion_detection_schedule', 'motion.cgi', """
+        Set the IP Camera Motion Detection Schedule.
+
+        Effective when Motion Detection mode is MOTION_DETECTION_SCHEDULE
+
+        schedule_days -- value representing scheduled days (1..127)
+                         e.g. schedule_days = MONDAY + WEDNESDAY + FRIDAY
+        schedule_start -- daily start time in the format 'HH:MM:SS'
+        schedule_stop -- daily stop time in the format 'HH:MM:SS'
+        """, [
+        _days('schedule_days', 'MotionDetectionScheduleDay'),
+        _time('schedule_start', 'MotionDetectionScheduleTimeStart'),
+        _time('schedule_stop', 'MotionDetectionScheduleTimeStop'),
+    ]),
+    Endpoint('set_ptz', 'config/ptz_move.cgi', """
+        Set the IP Camera Pan Tilt Zoom location.
+
+        pan -- 0 to 336 (default: 167)
+        tile -- 0 to 106 (default: 25)
+        zoom --
+        """, [
+        Param('pan', 'p', integer, 167, minimum=0, maximum=336),
+        Param('tilt', 't', integer, 25, minimum=0, maximum=106),
+        Param('zoom', 'z', integer, 0),
+    ], reboot=False),
+    Endpoint('set_ptz_move', 'cgi/ptdc.cgi',
+             """Move the IP Camera Pan Tilt Zoom location.""", [
+                 Param('x', 'posX', integer),
+                 Param('y', 'posY', integer),
+             ], fixed={'command': 'set_relative_pos'}, reboot=False,
+             stale=['config/ptz_move.cgi']),
+    Endpoint('set_ptz_move_preset', 'pantiltcontrol.cgi',
+             """Move the IP Camera to a Preset Pan Tilt Zoom location.""", [
+                 Param('preset', 'PanTiltPresetPositionMove'),
+             ], reboot=False, stale=['config/ptz_move.cgi']),
+    Endpoint('set_sound_detection', 'sdbdetection.cgi',
+             """Enable or Disable the IP Camera Sound Detection.""", [
+                 Param('enable', 'SoundDetectionEnable', flag),
+             ]),
+    Endpoint('set_sound_detection_sensitivity', 'sdbdetection.cgi', """
+        Set the IP Camera Sound Detection sensitivity.
+
+        decibels - the number of decibels required to trigger sound detection,
+                   in the range 50..90
+        """, [
+        Param('decibels', 'SoundDetectionDB', integer, minimum=50, maximum=90),
+    ]),
+    Endpoint('set_sound_detection_mode', 'sdbdetection.cgi', """
+        Set the IP Camera Sound Detection mode.
+
+        mode -- one of SOUND_DETECTION_ALWAYS or SOUND_DETECTION_SCHEDULE
+        """, [
+        _mode('mode', 'SoundDetectionScheduleMode', range(2)),
+    ]),
+    Endpoint('set_sound_detection_schedule', 'sdbdetection.cgi', """
+        Set the IP Camera Sound Detection Schedule.
+
+        Effective when Sound Detection mode is SOUND_DETECTION_SCHEDULE
+
+        schedule_days -- value representing scheduled days (1..127)
+                         e.g. schedule_days = MONDAY + WEDNESDAY + FRIDAY
+        schedule_start -- daily start time in the format 'HH:MM:SS'
+        schedule_stop -- daily stop time in the format 'HH:MM:SS'
+        """, [
+        _days('schedule_days', 'SoundDetectionScheduleDay'),
+        _time('schedule_start', 'SoundDetectionScheduleTimeStart'),
+        _time('schedule_stop', 'SoundDetectionScheduleTimeStop'),
+    ]),
+    Endpoint('set_upload_server', 'upload.cgi', """
+        Set the IP Camera FTP upload server settings.
+
+        host -- FTP server hostname
+        user -- FTP server user
+        psasword -- FTP server password
+        path -- FTP server upload path (default '/')
+        passive -- Passive mode (deafault True)
+        port -- FTP server port (default 21)
+        """, [
+        Param('host', 'FTPHostAddress'),
+        Param('user', 'FTPUserName'),
+        Param('password', 'FTPPassword'),
+        Param('path', 'FTPDirectoryPath', text, '/'),
+        Param('passive', 'FTPPassiveMode', flag, True),
+        Param('port', 'FTPPortNumber', integer, 21, minimum=1, maximum=65535),
+    ]),
+    Endpoint('set_upload_image', 'upload.cgi', """Enable or Disable Image upload.""", [
+        Param('enable', 'FTPScheduleEnable', flag),
+    ]),
+    Endpoint('set_upload_image_mode', 'upload.cgi', """
+        Set the IP Camera image upload mode.
+
+        mode -- one of FTP_MODE_ALWAYS, FTP_MODE_SCHEDULE, FTP_MODE_DETECTION
+        """, [
+        _mode('mode', 'FTPScheduleMode', range(3)),
+    ]),
+    Endpoint('set_upload_image_settings', 'upload.cgi', """
+        Set the IP Camera upload image settings.
+
+        filename -- base file name
+        filename_mode -- UPLOAD_FILE_MODE_OVERWRITE, UPLOAD_FILE_MODE_DATETIME
+                         or UPLOAD_FILE_MODE_SEQUENCE
+        max_file_sequence_number -- maxamum sequence number if mode is
+                                    UPLOAD_FILE_MODE_SEQUENCE
+        create_subfolder_minutes -- create date/time subfolders
+        frequency_mode -- FRAMES_PER_SECONDS or SECONDS_PER_FRAME
+        frames_per_second -- frames (images) per second (1..3), use -1 for Auto
+        seconds_per_frame -- seconds between frames
+        """, [
+        Param('filename', 'FTPScheduleBaseFileName', text, 'image'),
+        _mode('filename_mode', 'FTPScheduleFileMode', (0, 1, 3), 1),
+        Param('max_file_sequence_number', 'FTPScheduleMaxFileSequenceNumber',
+              integer, 1024, minimum=1),
+        Param('create_subfolder_minutes', 'FTPCreateFolderInterval', integer, 0,
+              minimum=0),
+        _mode('frequency_mode', 'FTPScheduleVideoFrequencyMode', range(2), 0),
+        _mode('frames_per_second', 'FTPScheduleFramePerSecond', (-1, 1, 2, 3), -1),
+        Param('seconds_per_frame', 'FTPScheduleSecondPerFrame', integer, 1,
+              minimum=1),
+    ]),
+    Endpoint('set_upload_image_schedule', 'upload.cgi', """
+        Set the IP Camera upload image schedule.
+
+        These settings are used if mode is FTP_MODE_SCHEDULE
+
+        schedule_days -- value representing scheduled days (1..127)
+                         e.g. schedule_days = MONDAY + WEDNESDAY + FRIDAY
+        schedule_start -- daily start time in the format 'HH:MM:SS'
+        schedule_stop -- daily end time in the format 'HH:MM:SS'
+        """, [
+        _days('schedule_days', 'FTPScheduleDay', 0),
+        _time('schedule_start', 'FTPScheduleTimeStart', '00:00:00'),
+        _time('schedule_stop', 'FTPScheduleTimeStop', '00:00:00'),
+    ]),
+    Endpoint('set_upload_video', 'upload.cgi', """Enable or Disable Video upload.""", [
+        Param('enable', 'FTPScheduleEnableVideo', flag),
+    ]),
+    Endpoint('set_upload_video_settings', 'upload.cgi', """
+        Set the IP Camera upload video file settings.
+
+        filename -- base file name
+        file_limit_size -- video file size KBytes
+                           (default is 2048, max is 3072 KBytes)
+        file_limit_time -- video file lenght in seconds
+                           (default is 10, max is 15 seconds)
+        """, [
+        Param('filename', 'FTPScheduleBaseFileNameVideo', text, 'video'),
+        Param('file_limit_size', 'FTPScheduleVideoLimitSize', integer, 2048,
+              minimum=1, maximum=3072),
+        Param('file_limit_time', 'FTPScheduleVideoLimitTime', integer, 10,
+              minimum=1, maximum=15),
+    ]),
+    Endpoint('set_upload_video_mode', 'upload.cgi', """
+        Set the IP Camera upload video mode.
+
+        mode -- one of FTP_MODE_ALWAYS, FTP_MODE_SCHEDULE, FTP_MODE_DETECTION
+        """, [
+        _mode('mode', 'FTPScheduleModeVideo', range(3)),
+    ]),
+    Endpoint('set_upload_video_schedule', 'upload.cgi', """
+        Set the IP Camera upload video schedule.
+
+        These settings are used if mode is FTP_MODE_SCHEDULE
+
+        schedule_days -- value representing scheduled days (1..127)
+                         e.g. schedule_days = MONDAY + WEDNESDAY + FRIDAY
+        schedule_start -- daily start time in the format 'HH:MM:SS'
+        schedule_stop -- daily end time in the format 'HH:MM:SS'
+        """, [
+        _days('schedule_days', 'FTPScheduleDayVideo', 0),
+        _time('schedule_start', 'FTPScheduleTimeStartVideo', '00:00:00'),
+        _time('schedule_stop', 'FTPScheduleTimeStopVideo', '00:00:00'),
+    ]),
+)
+
+# endpoints by method name
+BY_NAME = {_endpoint.name: _endpoint for _endpoint in ENDPOINTS}
+
+# getter CGIs made out of date by each setter CGI
+STALE = {}
+for _endpoint in ENDPOINTS:
+    STALE.setdefault(_endpoint.cgi, set()).update(_endpoint.stale)
+
+
+class DlinkDCSBatch(object):
+    """
+    Setter calls on one IP Camera merged into one request per CGI.
+
+    The batch has the same setter methods as DlinkDCSCamera. Each call is
+    validated and queued, and send() sends the queued settings, also called
+    when a with block exits without an exception.
+
+        with camera.batch() as batch:
+            batch.set_motion_detection(True)
+            batch.set_motion_detection_sensitivity(80)
+    """
+
+    def __init__(self, camera):
+        self.camera = camera
+        self._pending = {}
+
+    def __getattr__(self, name):
+        _endpoint = BY_NAME.get(name)
+        if _endpoint is None or not _endpoint.setter:
+            raise AttributeError(name)
+
+        def _queue(*args, **kwargs):
+            _params = _endpoint.encode(args, kwargs)
+            self._pending.setdefault(_endpoint.cgi, {}).update(_params)
+        _queue.__name__ = name
+        _queue.__doc__ = _endpoint.doc
+        return _queue
+
+    def pending(self):
+        """Return the queued {cgi: params} requests."""
+        return {_cgi: dict(_params) for _cgi, _params in self._pending.items()}
+
+    def send(self):
+        """Send the queued settings and return the {cgi: response} dict."""
+        _pending, self._pending = self._pending, {}
+        return {_cgi: self.camera.send_command(_cgi, _params)
+                for _cgi, _params in _pending.items()}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.send()
@@ -0,0 +1,232 @@
+"""
+Run DLINK DCS IP Camera commands across a fleet of cameras.
+"""
+
+import collections
+import email.utils
+import logging
+import statistics
+import time
+
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from .dlinkdcs import DlinkDCSUnsupportedError
+from .watch import ConfigWatcher, wait_interval
+
+
+_LOGGER = logging.getLogger("DlinkDCSFleet")
+
+FleetResult = collections.namedtuple('FleetResult', ['camera', 'result', 'error'])
+
+CapturedFrame = collections.namedtuple(
+    'CapturedFrame', ['camera', 'image', 'captured_at', 'camera_time', 'error'])
+
+
+class DlinkDCSFleet(object):
+    """A group of IP Cameras controlled together."""
+
+    def __init__(self, cameras=(), workers=16):
+        """
+        Initialize with the fleet cameras.
+
+        cameras -- iterable of DlinkDCSCamera
+        workers -- maximum number of cameras contacted at the same time
+                   (default 16)
+        """
+        self.cameras = list(cameras)
+        self.workers = workers
+        self._rtt = {}
+        self._clock_offset = {}
+        self._warm_up_errors = {}
+
+    def __iter__(self):
+        return iter(self.cameras)
+
+    def __len__(self):
+        return len(self.cameras)
+
+    def add(self, camera):
+        """Add a camera to the fleet."""
+        self.cameras.append(camera)
+
+    def remove(self, camera):
+        """Remove a camera from the fleet."""
+        self.cameras.remove(camera)
+        self._rtt.pop(camera, None)
+        self._clock_offset.pop(camera, None)
+        self._warm_up_errors.pop(camera, None)
+
+    def close(self):
+        """Close the connections of all cameras."""
+        for _camera in self.cameras:
+            _camera.close()
+
+    def map(self, func, skip_unsupported=True):
+        """
+        Call func(camera) for every camera and yield a FleetResult as each
+        camera finishes.
+
+        func -- function called with each camera
+        skip_unsupported -- do not yield results for cameras that do not
+                            support the command (default True)
+        """
+        with ThreadPoolExecutor(max_workers=self.workers) as _executor:
+            _futures = {_executor.submit(func, _camera): _camera
+                        for _camera in self.cameras}
+            for _future in as_completed(_futures):
+                _camera = _futures[_future]
+                try:
+                    yield FleetResult(_camera, _future.result(), None)
+                except DlinkDCSUnsupportedError as e:
+                    if not skip_unsupported:
+                        yield FleetResult(_camera, None, e)
+                except Exception as e:
+                    yield FleetResult(_camera, None, e)
+
+    def run(self, method, *args, **kwargs):
+        """
+        Call a DlinkDCSCamera method on every camera and yield a FleetResult
+        as each camera finishes.
+
+        method -- name of the camera method e.g. 'get_common_info'
+        """
+        return self.map(lambda camera: getattr(camera, method)(*args, **kwargs))
+
+    def watch(self, endpoints, interval=30, initial=True, stop=None):
+        """
+        Poll getters on every camera and yield a FleetResult with the list of
+        ConfigChanges of each camera whose responses changed, e.g. settings
+        changed through the camera web UI.
+
+        endpoints -- getter names e.g. ['get_motion_detection', 'get_upload']
+        interval -- seconds between polls (default 30)
+        initial -- report the first response of each getter (default True)
+        stop -- threading.Event ending the watch when set (default never)
+        """
+        _watcher = ConfigWatcher(endpoints, initial)
+        while True:
+            _started = time.monotonic()
+            for _result in self.map(_watcher.poll):
+                if _result.error is not None or _result.result:
+                    yield _result
+            if wait_interval(interval, _started, stop):
+                return
+
+    def rtt(self, camera):
+        """Return the measured round trip time of a camera in seconds."""
+        return self._rtt.get(camera)
+
+    def clock_offset(self, camera):
+        """
+        Return the camera clock offset from the local clock in seconds.
+
+        The offset is measured by warm_up() from the moment the second of
+        the camera HTTP Date header changes, to about the round trip time.
+        """
+        return self._clock_offset.get(camera, 0.0)
+
+    def warm_up_error(self, camera):
+        """Return the exception of the last failed warm up of a camera, or None."""
+        return self._warm_up_errors.get(camera)
+
+    def _measure_clock(self, camera, rtt, timeout):
+        """Return the clock offset of a camera, or None without a Date header."""
+        _previous = None
+        _deadline = time.perf_counter() + timeout
+        while True:
+            _sent = time.time()
+            _date = camera.send_request('datetime.cgi').headers.get('Date')
+            if not _date:
+                return None
+            _second = email.utils.parsedate_to_datetime(_date).timestamp()
+            # local time the camera answered at
+            _answered = _sent + rtt / 2
+            if _previous is not None and _second != _previous[0]:
+                # the camera second started between the two answers
+                return _second - (_previous[1] + _answered) / 2
+            if time.perf_counter() > _deadline:
+                # somewhere in the second of the last answer
+                return _second + 0.5 - _answered
+            _previous = (_second, _answered)
+
+    def warm_up(self, samples=3, cameras=None, clock_timeout=1.5):
+        """
+        Open the connection to cameras and measure their round trip time
+        and clock offset. Returns a dict of the cameras that failed and
+        their exception.
+
+        samples -- number of requests used to measure the round trip time
+                   (default 3)
+        cameras -- cameras to warm up (default all)
+        clock_timeout -- seconds to wait for the camera clock to start a
+                         new second (default 1.5)
+        """
+        def _measure(camera):
+            _times = []
+            for _ in range(samples):
+                _start = time.perf_counter()
+                # the body is read so the connection can be reused
+                _body = camera.send_request('cgiversion.cgi').content
+                _times.append(time.perf_counter() - _start)
+            _rtt = statistics.median(_times)
+            self._rtt[camera] = _rtt
+            _offset = self._measure_clock(camera, _rtt, clock_timeout)
+            if _offset is not None:
+                self._clock_offset[camera] = _offset
+            return _rtt
+
+        _fleet = self if cameras is None else DlinkDCSFleet(cameras, self.workers)
+        _errors = {}
+        for _result in _fleet.map(_measure, skip_unsupported=False):
+            if _result.error is None:
+                self._warm_up_errors.pop(_result.camera, None)
+            else:
+                _errors[_result.camera] = _result.error
+                self._warm_up_errors[_result.camera] = _result.error
+                _LOGGER.warning('%s warm up failed: %s', _result.camera.host,
+                                _result.error)
+        return _errors
+
+    def capture_all(self, delay=0.1):
+        """
+        Capture a snapshot from every camera at the same moment.
+
+        Each request is sent early by half the camera round trip time so all
+        requests reach the cameras together. Returns a list of CapturedFrame
+        with the estimated capture time on the local clock and on the camera
+        clock. Cameras not measured yet are warmed up first; cameras whose
+        warm up failed are captured without a round trip time until warm_up()
+        succeeds. At most workers cameras are captured together, the others
+        as soon as a worker is free.
+
+        delay -- seconds from now to the capture moment, added to the largest
+                 round trip time (default 0.1)
+        """
+        _missing = [_camera for _camera in self.cameras
+                    if _camera not in self._rtt and _camera not in self._warm_up_errors]
+        if _missing:
+            self.warm_up(cameras=_missing)
+        _rtts = [self._rtt.get(_camera, 0.0) for _camera in self.cameras]
+        _target = time.perf_counter() + delay + max(_rtts, default=0.0)
+        _offset = time.time() - time.perf_counter()
+
+        def _capture(camera):
+            _send = _target - self._rtt.get(camera, 0.0) / 2
+            while True:
+                _wait = _send - time.perf_counter()
+                if _wait <= 0:
+                    break
+                # short steps, as a long sleep may overshoot
+                time.sleep(min(_wait, 0.001))
+            _sent = time.perf_counter()
+            try:
+                _image = camera.get_snapshot()
+            except Exception as e:
+                return CapturedFrame(camera, None, None, None, e)
+            _captured = _sent + self._rtt.get(camera, 0.0) / 2 + _offset
+            return CapturedFrame(camera, _image, _captured,
+                                 _captured + self.clock_offset(camera), None)
+
+        with ThreadPoolExecutor(max_workers=max(min(len(self.cameras), self.workers),
+                                                1)) as _executor:
+            return list(_executor.map(_capture, self.cameras))
@@ -0,0 +1,319 @@
+"""
+Local FTP server receiving DLINK DCS IP Camera uploads.
+
+Cameras are configured to upload images and videos to the receiver with
+DlinkDCSCamera.push_uploads_to(). Each camera is given its own FTP login so
+every upload can be mapped back to the camera that sent it. Uploads are
+streamed to disk and/or a callback in chunks and are never held in memory.
+"""
+
+import asyncio
+import collections
+import ipaddress
+import logging
+import os
+import posixpath
+import socket
+
+from .receiver import CameraReceiver, _open, _peer_host
+
+
+_LOGGER = logging.getLogger("DlinkDCSUploadReceiver")
+
+Upload = collections.namedtuple('Upload', ['camera', 'path', 'size', 'filename'])
+
+
+async def _ipv4_address(host):
+    """Return the IPv4 address of a host name or address, or None."""
+    if host.startswith('::ffff:'):
+        host = host[7:]
+    try:
+        return str(ipaddress.IPv4Address(host))
+    except ValueError:
+        pass
+    try:
+        _infos = await asyncio.get_running_loop().getaddrinfo(
+            host, None, family=socket.AF_INET, type=socket.SOCK_STREAM)
+    except OSError:
+        return None
+    return _infos[0][4][0] if _infos else None
+
+
+class DlinkDCSUploadReceiver(CameraReceiver):
+    """Asyncio FTP server for IP Camera image and video uploads."""
+
+    def __init__(self, host='0.0.0.0', port=2121, public_host=None,
+                 directory=None, on_data=None, on_upload=None,
+                 chunk_size=65536):
+        """
+        Initialize the upload receiver.
+
+        host -- local address to listen on (default all interfaces)
+        port -- FTP control port (default 2121)
+        public_host -- address the cameras use to reach the receiver
+                       (default host)
+        directory -- save uploads below directory/<camera host>/
+        on_data -- called as on_data(camera, path, chunk) for each chunk
+                   received, and with chunk None when the upload completes
+        on_upload -- called as on_upload(upload) with an Upload tuple for
+                     each completed upload
+        chunk_size -- number of bytes to read at a time (default 65536)
+        """
+        super(DlinkDCSUploadReceiver, self).__init__(host, port, public_host)
+        self.directory = directory
+        self.on_data = on_data
+        self.on_upload = on_upload
+        self.chunk_size = chunk_size
+
+    async def _session(self, reader, writer):
+        await _FTPSession(self, reader, writer).run()
+
+    async def _receive(self, camera, path, reader, append=False):
+        """Stream an upload from the data connection to disk and callbacks."""
+        _file = None
+        _filename = None
+        if self.directory is not None:
+            _filename = os.path.join(self.directory, str(camera.host), path.lstrip('/'))
+            _file = await asyncio.to_thread(_open, _filename, 'ab' if append else 'wb')
+        _size = 0
+        try:
+            while True:
+                _chunk = await reader.read(self.chunk_size)
+                if not _chunk:
+                    break
+                _size += len(_chunk)
+                if _file is not None:
+                    # disk writes would block every other camera's session
+                    await asyncio.to_thread(_file.write, _chunk)
+                if self.on_data is not None:
+                    self.on_data(camera, path, _chunk)
+        finally:
+            if _file is not None:
+                await asyncio.to_thread(_file.close)
+        if self.on_data is not None:
+            self.on_data(camera, path, None)
+        _upload = Upload(camera, path, _size, _filename)
+        _LOGGER.debug('%s uploaded %s (%d bytes)', camera.host, path, _size)
+        if self.on_upload is not None:
+            self.on_upload(_upload)
+        return _upload
+
+
+class _FTPSession(object):
+    """A single camera FTP control connection."""
+
+    def __init__(self, receiver, reader, writer):
+        self.receiver = receiver
+        self.reader = reader
+        self.writer = writer
+        self.user = None
+        self.camera = None
+        self.cwd = '/'
+        self.rename_from = None
+        self.passive = None
+        self.active_address = None
+
+    async def reply(self, message):
+        self.writer.write(message.encode('utf-8') + b'\r\n')
+        await self.writer.drain()
+
+    async def run(self):
+        await self.reply('220 DLINK DCS upload receiver ready')
+        try:
+            while True:
+                _line = await self.reader.readline()
+                if not _line:
+                    break
+                _cmd, _, _arg = _line.decode('utf-8', 'replace').strip().partition(' ')
+                _cmd = _cmd.upper()
+                if _cmd == 'QUIT':
+                    await self.reply('221 Goodbye')
+                    break
+                _handler = getattr(self, 'ftp_' + _cmd.lower(), None)
+                if _handler is None:
+                    await self.reply('502 Command not implemented')
+                elif self.camera is None and _cmd not in self.ANONYMOUS:
+                    await self.reply('530 Not logged in')
+                else:
+                    await _handler(_arg)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.close_passive()
+            self.writer.close()
+
+    ANONYMOUS = ('USER', 'PASS', 'SYST', 'FEAT', 'NOOP', 'OPTS')
+
+    def path(self, arg):
+        return posixpath.normpath(posixpath.join(self.cwd, arg or '.'))
+
+    def close_passive(self):
+        if self.passive is not None:
+            self.passive[0].close()
+            self.passive = None
+
+    async def ftp_user(self, arg):
+        self.user = arg
+        self.camera = None
+        await self.reply('331 Password required')
+
+    async def ftp_pass(self, arg):
+        self.camera = self.receiver._authenticate(self.user, arg)
+        if self.camera is None:
+            await self.reply('530 Login incorrect')
+        else:
+            await self.reply('230 Logged in')
+
+    async def ftp_syst(self, arg):
+        await self.reply('215 UNIX Type: L8')
+
+    async def ftp_feat(self, arg):
+        await self.reply('211-Features:\r\n EPSV\r\n PASV\r\n211 End')
+
+    async def ftp_noop(self, arg):
+        await self.reply('200 OK')
+
+    async def ftp_opts(self, arg):
+        await self.reply('200 OK')
+
+    async def ftp_type(self, arg):
+        await self.reply('200 Type set')
+
+    async def ftp_mode(self, arg):
+        await self.reply('200 Mode set')
+
+    async def ftp_stru(self, arg):
+        await self.reply('200 Structure set')
+
+    async def ftp_pwd(self, arg):
+        await self.reply('257 "%s"' % self.cwd)
+
+    async def ftp_cwd(self, arg):
+        self.cwd = self.path(arg)
+        await self.reply('250 OK')
+
+    async def ftp_cdup(self, arg):
+        await self.ftp_cwd('..')
+
+    async def ftp_mkd(self, arg):
+        await self.reply('257 "%s" created' % self.path(arg))
+
+    async def ftp_size(self, arg):
+        await self.reply('550 No such file')
+
+    async def ftp_dele(self, arg):
+        await self.reply('250 OK')
+
+    async def ftp_rnfr(self, arg):
+        self.rename_from = self.path(arg)
+        await self.reply('350 Ready for destination')
+
+    async def ftp_rnto(self, arg):
+        _directory = self.receiver.directory
+        if self.rename_from is not None and _directory is not None:
+            _root = os.path.join(_directory, str(self.camera.host))
+            try:
+                await asyncio.to_thread(
+                    os.replace, os.path.join(_root, self.rename_from.lstrip('/')),
+                    os.path.join(_root, self.path(arg).lstrip('/')))
+            except OSError:
+                await self.reply('550 Rename failed')
+                return
+        self.rename_from = None
+        await self.reply('250 Renamed')
+
+    async def ftp_pasv(self, arg):
+        _host = self.receiver.public_host
+        if _host in ('', '0.0.0.0', '::'):
+            _host = self.writer.get_extra_info('sockname')[0]
+        _address = await _ipv4_address(_host)
+        if _address is None:
+            # the PASV reply only holds an IPv4 address
+            await self.reply('425 No IPv4 address for %s, use EPSV' % _host)
+            return
+        _port = await self.open_passive()
+        await self.reply('227 Entering Passive Mode (%s,%d,%d)' % (
+            _address.replace('.', ','), _port >> 8, _port & 255))
+
+    async def ftp_epsv(self, arg):
+        _port = await self.open_passive()
+        await self.reply('229 Entering Extended Passive Mode (|||%d|)' % _port)
+
+    async def ftp_port(self, arg):
+        try:
+            _numbers = [int(_part) for _part in arg.split(',')]
+        except ValueError:
+            _numbers = []
+        if len(_numbers) != 6 or not all(0 <= _n <= 255 for _n in _numbers):
+            await self.reply('501 Invalid PORT')
+            return
+        _host = '.'.join(str(_n) for _n in _numbers[:4])
+        _port = _numbers[4] << 8 | _numbers[5]
+        # connecting anywhere else would let a client bounce connections
+        # through the receiver
+        if _host != _peer_host(self.writer) or _port == 0:
+            await self.reply('501 PORT must be the address of the client')
+            return
+        self.close_passive()
+        self.active_address = (_host, _port)
+        await self.reply('200 PORT command successful')
+
+    async def ftp_stor(self, arg):
+        await self.store(arg, append=False)
+
+    async def ftp_appe(self, arg):
+        await self.store(arg, append=True)
+
+    async def open_passive(self):
+        self.close_passive()
+        _connected = asyncio.get_running_loop().create_future()
+
+        _client = _peer_host(self.writer)
+
+        def _accept(reader, writer):
+            # only the client of the control connection may send the data
+            if _peer_host(writer) != _client:
+                _LOGGER.warning('refused data connection from %s for %s',
+                                _peer_host(writer), _client)
+                writer.close()
+            elif not _connected.done():
+                _connected.set_result((reader, writer))
+            else:
+                writer.close()
+
+        _host = self.writer.get_extra_info('sockname')[0]
+        _server = await asyncio.start_server(_accept, _host, 0)
+        self.passive = (_server, _connected)
+        return _server.sockets[0].getsockname()[1]
+
+    async def data_connection(self):
+        if self.passive is not None:
+            _server, _connected = self.passive
+            try:
+                return await asyncio.wait_for(_connected, 30)
+            finally:
+                self.close_passive()
+        if self.active_address is not None:
+            _address, self.active_address = self.active_address, None
+            return await asyncio.open_connection(*_address)
+        return None
+
+    async def store(self, arg, append):
+        _path = self.path(arg)
+        await self.reply('150 Opening data connection')
+        try:
+            _connection = await self.data_connection()
+        except (OSError, asyncio.TimeoutError):
+            _connection = None
+        if _connection is None:
+            await self.reply('425 Cannot open data connection')
+            return
+        _reader, _writer = _connection
+        try:
+            await self.receiver._receive(self.camera, _path, _reader, append)
+        except OSError:
+            await self.reply('451 Local error writing file')
+            return
+        finally:
+            _writer.close()
+        await self.reply('226 Transfer complete')
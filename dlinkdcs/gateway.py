@@ -0,0 +1,362 @@
+"""
+Local HTTP gateway fronting DLINK DCS IP Cameras for many clients.
+
+Every camera is exposed under its name with the same CGI paths as the
+camera itself, e.g. http://localhost:8080/frontdoor/motion.cgi. Requests
+of the getter CGIs without parameters are served from a shared cache,
+refreshed by a single upstream request however many clients ask at the
+same time; other CGIs are passed through. Requests with parameters change
+settings; they are sent one at a time per camera and clear the cached
+responses they make out of date. The MJPEG video stream of a camera is
+read once and fanned out to every client watching it.
+
+The gateway does not authenticate clients and listens on localhost by
+default.
+"""
+
+import collections
+import http.server
+import logging
+import queue
+import threading
+import time
+import urllib.parse
+
+from collections.abc import Mapping
+
+from .dlinkdcs import DlinkDCSUnsupportedError
+from .endpoints import ENDPOINTS, STALE
+from .timelapse import camera_id
+
+
+_LOGGER = logging.getLogger("DlinkDCSGateway")
+
+MJPEG_CGI = 'video/mjpg.cgi'
+
+CachedResponse = collections.namedtuple(
+    'CachedResponse', ['status', 'content_type', 'body'])
+
+# CGIs whose responses are cached, so unknown paths do not grow the cache
+CACHED_CGIS = frozenset(_e.cgi for _e in ENDPOINTS if not _e.setter)
+
+
+class _CacheEntry(object):
+    """Cached response of one CGI and the lock of its refresh."""
+
+    __slots__ = ('lock', 'response', 'expires')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.response = None
+        self.expires = 0.0
+
+
+class _Stream(object):
+    """One upstream MJPEG stream fanned out to subscriber queues."""
+
+    def __init__(self, gateway, name, camera):
+        self.gateway = gateway
+        self.name = name
+        self.camera = camera
+        self.content_type = None
+        self.subscribers = set()
+        self.ready = threading.Event()
+        self.status = None
+        self.error = None
+
+    def subscribe(self):
+        _queue = queue.Queue(self.gateway.stream_buffer)
+        self.subscribers.add(_queue)
+        return _queue
+
+    def _publish(self, part, frame=True):
+        for _queue in list(self.subscribers):
+            while True:
+                try:
+                    _queue.put_nowait(part)
+                    break
+                except queue.Full:
+                    if not frame and part is not None:
+                        # a raw chunk cannot be skipped without corrupting
+                        # the stream, end the slow subscriber after the
+                        # chunks it has already written
+                        _LOGGER.warning('%s stream client too slow, closing',
+                                        self.name)
+                        self.subscribers.discard(_queue)
+                        self._end(_queue)
+                        break
+                    # slow subscriber, drop its oldest frame
+                    try:
+                        _queue.get_nowait()
+                    except queue.Empty:
+                        pass
+
+    @staticmethod
+    def _end(subscriber):
+        """End a subscriber queue, dropping every part it has not read."""
+        while True:
+            try:
+                subscriber.get_nowait()
+            except queue.Empty:
+                break
+        subscriber.put_nowait(None)
+
+    def run(self):
+        try:
+            r = self.camera.send_request(MJPEG_CGI, stream=True,
+                                         timeout=self.gateway._timeout(self.camera))
+            with r:
+                if r.status_code != 200:
+                    self.status = r.status_code
+                    raise ConnectionError('upstream status %d' % r.status_code)
+                self.content_type = r.headers.get('Content-Type', 'video/x-motion-jpeg')
+                _boundary = self.content_type.partition('boundary=')[2].strip().strip('"')
+                _delimiter = b'--' + _boundary.encode('latin-1') if _boundary else None
+                self.ready.set()
+                _pending = b''
+                for _chunk in r.iter_content(self.gateway.chunk_size):
+                    if not self.gateway._keep_streaming(self):
+                        break
+                    if _delimiter is None:
+                        self._publish(_chunk, frame=False)
+                        continue
+                    # publish whole parts so subscribers always start on a frame
+                    _pending += _chunk
+                    _end = _pending.find(_delimiter, 1)
+                    while _end > 0:
+                        self._publish(_pending[:_end])
+                        _pending = _pending[_end:]
+                        _end = _pending.find(_delimiter, 1)
+        except Exception as e:
+            _LOGGER.warning('%s stream failed: %s', self.name, e)
+            self.error = e
+        finally:
+            self.gateway._stream_ended(self)
+            self.ready.set()
+            self._publish(None)
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    """HTTP request handler of the gateway."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        _LOGGER.debug('%s %s', self.address_string(), format % args)
+
+    def _send(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        _gateway = self.server.gateway
+        _url = urllib.parse.urlsplit(self.path)
+        _name, _, _cgi = urllib.parse.unquote(_url.path).lstrip('/').partition('/')
+        _pairs = urllib.parse.parse_qsl(_url.query, keep_blank_values=True)
+        _params = dict(_pairs)
+        if len(_params) != len(_pairs):
+            # the cameras take one value per key, which one is ambiguous
+            self._send(400, 'text/plain', b'repeated query parameter')
+            return
+        if _cgi == MJPEG_CGI and not _params and _name in _gateway.cameras:
+            self._stream(_gateway, _name)
+        else:
+            self._send(*_gateway.request(_name, _cgi, _params))
+
+    def _stream(self, gateway, name):
+        _stream, _queue = gateway.subscribe(name)
+        try:
+            if _stream.error is not None:
+                self._send(_stream.status or 502, 'text/plain',
+                           str(_stream.error).encode('utf-8'))
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', _stream.content_type)
+            self.send_header('Cache-Control', 'no-cache')
+            self.send_header('Connection', 'close')
+            self.end_headers()
+            self.close_connection = True
+            while True:
+                try:
+                    _part = _queue.get(timeout=gateway.stall_timeout)
+                except queue.Empty:
+                    _LOGGER.warning('%s stream stalled, closing client', name)
+                    break
+                if _part is None:
+                    break
+                self.wfile.write(_part)
+        except OSError:
+            pass
+        finally:
+            gateway.unsubscribe(_stream, _queue)
+
+
+class DlinkDCSGateway(object):
+    """Caching HTTP proxy sharing IP Cameras between many clients."""
+
+    def __init__(self, cameras, host='127.0.0.1', port=8080, ttl=5.0,
+                 stream_buffer=8, chunk_size=16384, stall_timeout=30, timeout=10):
+        """
+        Initialize the gateway.
+
+        cameras -- {name: DlinkDCSCamera} dict, or iterable of DlinkDCSCamera
+                   named by camera_id()
+        host -- local address to listen on (default localhost)
+        port -- port to listen on, 0 for any free port (default 8080)
+        ttl -- seconds a cached response is served (default 5)
+        stream_buffer -- MJPEG frames queued per client before the oldest
+                         frame is dropped (default 8)
+        chunk_size -- number of bytes of the MJPEG stream read at a time
+                      (default 16384)
+        stall_timeout -- seconds without an MJPEG frame after which a
+                         client stream is closed (default 30)
+        timeout -- seconds an upstream request may take, for cameras without
+                   a timeout of their own, as clients of the same CGI wait
+                   for it (default 10)
+        """
+        if not isinstance(cameras, Mapping):
+            cameras = {camera_id(_camera): _camera for _camera in cameras}
+        self.cameras = dict(cameras)
+        self.host = host
+        self.port = port
+        self.ttl = ttl
+        self.stream_buffer = stream_buffer
+        self.chunk_size = chunk_size
+        self.stall_timeout = stall_timeout
+        self.timeout = timeout
+        self._cache = {}
+        self._cache_lock = threading.Lock()
+        self._write_locks = {_name: threading.Lock() for _name in self.cameras}
+        self._streams = {}
+        self._streams_lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    def _entry(self, name, cgi):
+        with self._cache_lock:
+            _entry = self._cache.get((name, cgi))
+            if _entry is None:
+                _entry = self._cache[(name, cgi)] = _CacheEntry()
+            return _entry
+
+    def _timeout(self, camera):
+        return self.timeout if camera.timeout is None else camera.timeout
+
+    def _fetch(self, camera, cgi, params=None):
+        try:
+            r = camera.send_request(cgi, params or {}, timeout=self._timeout(camera))
+        except DlinkDCSUnsupportedError as e:
+            return CachedResponse(404, 'text/plain', str(e).encode('utf-8'))
+        except Exception as e:
+            _LOGGER.warning('%s %s failed: %s', camera.host, cgi, e)
+            return CachedResponse(502, 'text/plain', str(e).encode('utf-8'))
+        return CachedResponse(r.status_code, r.headers.get('Content-Type', 'text/plain'),
+                              r.content)
+
+    def request(self, name, cgi, params=None):
+        """
+        Return the CachedResponse of a camera CGI.
+
+        Getter requests without parameters are served from the cache, other
+        CGIs are passed through. Requests with parameters are sent to the
+        camera one at a time and clear the cached responses they change.
+
+        name -- camera name
+        cgi -- CGI path e.g. 'motion.cgi'
+        params -- CGI parameters
+        """
+        _camera = self.cameras.get(name)
+        if _camera is None or not cgi:
+            return CachedResponse(404, 'text/plain', b'unknown camera or CGI')
+        if params:
+            with self._write_locks[name]:
+                _response = self._fetch(_camera, cgi, params)
+                for _stale in STALE.get(cgi, (cgi,)):
+                    if _stale in CACHED_CGIS:
+                        _entry = self._entry(name, _stale)
+                        # after any refresh in progress, which may be stale
+                        with _entry.lock:
+                            _entry.response = None
+            return _response
+        if cgi not in CACHED_CGIS:
+            return self._fetch(_camera, cgi)
+        _entry = self._entry(name, cgi)
+        _response = _entry.response
+        if _response is not None and _entry.expires > time.monotonic():
+            return _response
+        # concurrent requests for the same CGI wait for a single refresh
+        with _entry.lock:
+            if _entry.response is not None and _entry.expires > time.monotonic():
+                return _entry.response
+            _response = self._fetch(_camera, cgi)
+            if _response.status == 200:
+                _entry.response = _response
+                _entry.expires = time.monotonic() + self.ttl
+        return _response
+
+    def invalidate(self, name=None, cgi=None):
+        """Clear cached responses of a camera and/or CGI, by default all."""
+        with self._cache_lock:
+            for (_name, _cgi), _entry in self._cache.items():
+                if name in (None, _name) and cgi in (None, _cgi):
+                    _entry.response = None
+
+    def subscribe(self, name):
+        """
+        Subscribe to the MJPEG stream of a camera, starting the upstream
+        stream if needed, and return the (stream, queue) of frames. A None
+        frame ends the stream.
+        """
+        with self._streams_lock:
+            _stream = self._streams.get(name)
+            if _stream is None:
+                _stream = self._streams[name] = _Stream(self, name, self.cameras[name])
+                threading.Thread(target=_stream.run, daemon=True).start()
+            _queue = _stream.subscribe()
+        _stream.ready.wait()
+        return _stream, _queue
+
+    def unsubscribe(self, stream, frames):
+        """Unsubscribe a frame queue, ending the stream after the last one."""
+        with self._streams_lock:
+            stream.subscribers.discard(frames)
+
+    def _keep_streaming(self, stream):
+        """Return False, removing the stream, once it has no subscribers."""
+        with self._streams_lock:
+            if stream.subscribers:
+                return True
+            if self._streams.get(stream.name) is stream:
+                del self._streams[stream.name]
+            return False
+
+    def _stream_ended(self, stream):
+        with self._streams_lock:
+            if self._streams.get(stream.name) is stream:
+                del self._streams[stream.name]
+
+    def start(self):
+        """Start serving in a background thread."""
+        self._server = http.server.ThreadingHTTPServer((self.host, self.port), _Handler)
+        self._server.daemon_threads = True
+        self._server.gateway = self
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+
+    def serve_forever(self):
+        """Start the gateway if needed and serve until stop() is called."""
+        if self._server is None:
+            self.start()
+        self._thread.join()
+
+    def stop(self):
+        """Stop the gateway."""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+            self._thread = None
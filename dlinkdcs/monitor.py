@@ -0,0 +1,221 @@
+"""
+Health monitoring of large fleets of DLINK DCS IP Cameras.
+
+Cameras are polled from a single scheduler thread using a heap of due
+times, with a bounded pool of worker threads making the requests. Poll
+intervals are jittered, slow cameras are polled less often and offline
+cameras back off, so no thread or sleep is needed per camera.
+"""
+
+import collections
+import heapq
+import itertools
+import logging
+import random
+import threading
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+
+
+_LOGGER = logging.getLogger("DlinkDCSHealthMonitor")
+
+EVENT_ONLINE = 'online'
+EVENT_OFFLINE = 'offline'
+EVENT_IP_CHANGED = 'ip_changed'
+EVENT_SIGNAL_DROPPED = 'signal_dropped'
+
+HealthEvent = collections.namedtuple(
+    'HealthEvent', ['camera', 'type', 'old', 'new', 'time'])
+
+
+class _CameraHealth(object):
+    """Last known health of a camera."""
+
+    __slots__ = ('online', 'ip', 'signal', 'signals', 'latency', 'failures')
+
+    def __init__(self, signal_window):
+        self.online = None
+        self.ip = None
+        self.signal = None
+        # recent signal strengths the signal is compared against
+        self.signals = collections.deque(maxlen=signal_window)
+        self.latency = None
+        self.failures = 0
+
+
+class DlinkDCSHealthMonitor(object):
+    """Poll lightweight health endpoints of many cameras and report changes."""
+
+    def __init__(self, cameras, interval=60, jitter=0.1, max_interval=900,
+                 slow_latency=1.0, workers=32, timeout=10, on_event=None,
+                 signal_key='SignalStrength', signal_drop=20, signal_window=5):
+        """
+        Initialize the monitor.
+
+        cameras -- iterable of DlinkDCSCamera
+        interval -- seconds between polls of a healthy camera (default 60)
+        jitter -- random fraction added to or removed from each interval
+                  (default 0.1)
+        max_interval -- longest interval for slow or offline cameras
+                        (default 900)
+        slow_latency -- poll latency in seconds above which the interval is
+                        stretched in proportion (default 1.0)
+        workers -- number of cameras polled at the same time (default 32)
+        timeout -- seconds to wait for each request (default 10)
+        on_event -- called as on_event(event) with a HealthEvent for each
+                    change
+        signal_key -- get_iwireless key holding the signal strength
+                      (default 'SignalStrength')
+        signal_drop -- signal strength drop reported as an event (default 20)
+        signal_window -- number of polls the signal strength is compared
+                         with, so slow drops are reported too (default 5)
+        """
+        self.interval = interval
+        self.jitter = jitter
+        self.max_interval = max_interval
+        self.slow_latency = slow_latency
+        self.workers = workers
+        self.timeout = timeout
+        self.on_event = on_event
+        self.signal_key = signal_key
+        self.signal_drop = signal_drop
+        self.signal_window = signal_window
+        self._health = {}
+        self._heap = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = None
+        for _camera in cameras:
+            self.add(_camera)
+
+    def add(self, camera):
+        """Add a camera, polling it at a random time within the interval."""
+        with self._condition:
+            if camera in self._health:
+                return
+            self._health[camera] = _CameraHealth(self.signal_window)
+            self._schedule(camera, random.uniform(0, self.interval))
+
+    def remove(self, camera):
+        """Stop monitoring a camera."""
+        with self._condition:
+            self._health.pop(camera, None)
+
+    def health(self, camera):
+        """Return the (online, ip, signal, latency) last seen for a camera."""
+        _health = self._health[camera]
+        return _health.online, _health.ip, _health.signal, _health.latency
+
+    def _schedule(self, camera, delay):
+        # entries of a removed camera are skipped by their _CameraHealth,
+        # so a camera added again is not polled twice as often
+        _due = time.monotonic() + delay
+        heapq.heappush(self._heap, (_due, next(self._sequence), camera,
+                                    self._health[camera]))
+        self._condition.notify()
+
+    def next_interval(self, health):
+        """Return the jittered seconds until the next poll of a camera."""
+        _interval = self.interval
+        if health.failures:
+            _interval *= 2 ** min(health.failures, 10)
+        elif health.latency is not None and health.latency > self.slow_latency:
+            _interval *= health.latency / self.slow_latency
+        _interval = min(_interval, self.max_interval)
+        return _interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def poll(self, camera):
+        """Poll a camera once and return the list of HealthEvents."""
+        _health = self._health.get(camera)
+        if _health is None:
+            return []
+        _events = []
+        _now = time.time()
+
+        def _event(event_type, old, new):
+            _events.append(HealthEvent(camera, event_type, old, new, _now))
+
+        _start = time.monotonic()
+        try:
+            _info = camera.send_request('common/info.cgi', timeout=self.timeout)
+            _info.raise_for_status()
+            _network = camera.unmarshal_response(camera.send_request(
+                'inetwork.cgi', timeout=self.timeout).content.decode('utf-8'))
+            _wireless = camera.unmarshal_response(camera.send_request(
+                'iwireless.cgi', timeout=self.timeout).content.decode('utf-8'))
+        except Exception as e:
+            _LOGGER.debug('%s poll failed: %s', camera.host, e)
+            _health.failures += 1
+            if _health.online is not False:
+                _event(EVENT_OFFLINE, _health.online, False)
+            _health.online = False
+            return _events
+        _latency = (time.monotonic() - _start) / 3
+        _health.latency = _latency if _health.latency is None else (
+            0.7 * _health.latency + 0.3 * _latency)
+        _health.failures = 0
+        if _health.online is not True:
+            _event(EVENT_ONLINE, _health.online, True)
+        _health.online = True
+        _ip = _network.get('IPAddress')
+        if _health.ip is not None and _ip != _health.ip:
+            _event(EVENT_IP_CHANGED, _health.ip, _ip)
+        _health.ip = _ip
+        try:
+            _signal = int(_wireless.get(self.signal_key))
+        except (TypeError, ValueError):
+            _signal = None
+        if _signal is not None:
+            _highest = max(_health.signals, default=None)
+            if _highest is not None and _signal <= _highest - self.signal_drop:
+                _event(EVENT_SIGNAL_DROPPED, _highest, _signal)
+                # reported once, not again on every poll at the new level
+                _health.signals.clear()
+            _health.signals.append(_signal)
+        _health.signal = _signal
+        return _events
+
+    def _poll(self, camera, health):
+        try:
+            _events = self.poll(camera)
+            if self.on_event is not None:
+                for _event in _events:
+                    self.on_event(_event)
+        except Exception:
+            _LOGGER.exception('%s health event handler failed', camera.host)
+        with self._condition:
+            if self._health.get(camera) is health:
+                self._schedule(camera, self.next_interval(health))
+
+    def run(self):
+        """Poll the cameras until stop() is called."""
+        self._stop.clear()
+        with ThreadPoolExecutor(max_workers=self.workers) as _executor:
+            while not self._stop.is_set():
+                with self._condition:
+                    _wait = None
+                    if self._heap:
+                        _wait = self._heap[0][0] - time.monotonic()
+                    if _wait is None or _wait > 0:
+                        self._condition.wait(_wait)
+                        continue
+                    _, _, _camera, _health = heapq.heappop(self._heap)
+                    if self._health.get(_camera) is not _health:
+                        continue
+                _executor.submit(self._poll, _camera, _health)
+
+    def start(self):
+        """Run the monitor in a background thread."""
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the monitor."""
+        self._stop.set()
+        with self._condition:
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,88 @@
+"""
+Common base for local servers receiving data pushed by IP Cameras.
+"""
+
+import abc
+import asyncio
+import os
+import secrets
+
+
+def _open(filename, mode):
+    """Open a file, creating its directory, to be run in a thread."""
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    return open(filename, mode)
+
+
+def _peer_host(writer):
+    """Return the IPv4 or IPv6 address of the other end of a connection."""
+    _host = writer.get_extra_info('peername')[0]
+    # IPv4 clients of a dual stack socket
+    return _host[7:] if _host.startswith('::ffff:') else _host
+
+
+class CameraReceiver(abc.ABC):
+    """Asyncio server with one login per registered IP Camera."""
+
+    def __init__(self, host, port, public_host=None):
+        """
+        Initialize the receiver.
+
+        host -- local address to listen on
+        port -- port to listen on, 0 for any free port
+        public_host -- address the cameras use to reach the receiver
+                       (default host)
+        """
+        self.host = host
+        self.port = port
+        self.public_host = public_host or host
+        self._logins = {}
+        self._server = None
+
+    def register(self, camera, user=None, password=None):
+        """
+        Register a camera and return its (user, password) login.
+
+        user -- login user (default derived from the camera host)
+        password -- login password (default random)
+        """
+        user = user or 'dcs-%s-%d' % (camera.host, camera.port)
+        password = password or secrets.token_hex(8)
+        self._logins[user] = (password, camera)
+        return user, password
+
+    def unregister(self, camera):
+        """Remove all logins of a camera."""
+        for _user, (_, _camera) in list(self._logins.items()):
+            if _camera is camera:
+                del self._logins[_user]
+
+    async def start(self):
+        """Start listening for camera connections."""
+        self._server = await asyncio.start_server(self._session, self.host, self.port)
+        if self.port == 0:
+            self.port = self._server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self):
+        """Start the receiver if needed and serve until cancelled."""
+        if self._server is None:
+            await self.start()
+        await self._server.serve_forever()
+
+    async def stop(self):
+        """Stop accepting connections."""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    def _authenticate(self, user, password):
+        """Return the camera for the login, or None."""
+        _login = self._logins.get(user)
+        if _login is None or not secrets.compare_digest(_login[0], password or ''):
+            return None
+        return _login[1]
+
+    @abc.abstractmethod
+    async def _session(self, reader, writer):
+        """Serve one camera connection until it closes."""
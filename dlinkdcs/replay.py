@@ -0,0 +1,331 @@
+"""
+Capture and replay of DLINK DCS IP Camera traffic for load testing.
+
+A TrafficRecorder hooks DlinkDCSCamera.send_command() and appends every
+exchange to a compact capture file: a fixed size binary header per
+exchange followed by the camera, CGI path, query string and raw response
+bytes. Passwords sent to or returned by the cameras are masked.
+
+A ReplayServer stands in for the recorded cameras, answering each CGI
+with the recorded response after the recorded latency, and replay()
+plays the recorded requests against it at 1x to 100x speed from many
+simulated cameras. Each simulated camera logs in as 'sim-<n>' and
+replays the traffic of one of the recorded cameras.
+
+    python3 -m dlinkdcs.replay traffic.dcap --cameras 500 --speed 20
+"""
+
+import argparse
+import collections
+import heapq
+import http.server
+import json
+import random
+import re
+import statistics
+import struct
+import threading
+import time
+import urllib.parse
+
+from base64 import b64decode
+from concurrent.futures import ThreadPoolExecutor
+
+from .dlinkdcs import DlinkDCSCamera
+from .endpoints import ENDPOINTS
+from .timelapse import camera_id
+
+
+MAGIC = b'DCSCAP1\n'
+
+# CGI keys of the setter passwords, masked in queries and responses
+SECRET_KEYS = frozenset(_param.key for _endpoint in ENDPOINTS
+                        for _param in _endpoint.params if _param.name == 'password')
+MASK = '********'
+
+_SECRET_LINE = re.compile(
+    rb'^(%s)=[^\r\n]*' % b'|'.join(re.escape(_key.encode('ascii'))
+                                   for _key in sorted(SECRET_KEYS)), re.MULTILINE)
+
+# started, elapsed, status, camera, cgi and query lengths, body length
+_HEADER = struct.Struct('<dfHHHHI')
+
+Exchange = collections.namedtuple(
+    'Exchange', ['started', 'elapsed', 'camera', 'cmd', 'query', 'status', 'body'])
+
+ReplayStats = collections.namedtuple(
+    'ReplayStats', ['requests', 'errors', 'duration', 'p50', 'p90', 'p99', 'max_lag'])
+
+
+class TrafficRecorder(object):
+    """Record send_command() exchanges of IP Cameras to a capture file."""
+
+    def __init__(self, filename, cameras=None):
+        """
+        Initialize the recorder.
+
+        filename -- capture file, appended to if it exists
+        cameras -- record only these DlinkDCSCameras (default all)
+        """
+        self.filename = filename
+        self.cameras = None if cameras is None else set(cameras)
+        self._file = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Open the capture file and start recording."""
+        self._file = open(self.filename, 'ab')
+        if self._file.tell() == 0:
+            self._file.write(MAGIC)
+        DlinkDCSCamera.command_hooks.append(self)
+
+    def stop(self):
+        """Stop recording and close the capture file."""
+        if self in DlinkDCSCamera.command_hooks:
+            DlinkDCSCamera.command_hooks.remove(self)
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def __call__(self, camera, cmd, params, response, started, elapsed):
+        if self.cameras is not None and camera not in self.cameras:
+            return
+        _camera = camera_id(camera).encode('utf-8')
+        _cmd = cmd.encode('utf-8')
+        _query = urllib.parse.urlencode(
+            {_key: MASK if _key in SECRET_KEYS else _value
+             for _key, _value in params.items()}).encode('utf-8')
+        _body = _SECRET_LINE.sub(rb'\1=' + MASK.encode('ascii'), response.content)
+        _record = b''.join((
+            _HEADER.pack(started, elapsed, response.status_code, len(_camera),
+                         len(_cmd), len(_query), len(_body)),
+            _camera, _cmd, _query, _body))
+        with self._lock:
+            if self._file is not None:
+                self._file.write(_record)
+
+
+def read_capture(filename):
+    """
+    Yield the Exchanges of a capture file, up to a record cut short by a
+    crash while it was written.
+    """
+    with open(filename, 'rb') as _file:
+        if _file.read(len(MAGIC)) != MAGIC:
+            raise ValueError('%s is not a capture file' % filename)
+        while True:
+            _header = _file.read(_HEADER.size)
+            if len(_header) < _HEADER.size:
+                return
+            (_started, _elapsed, _status, _camera, _cmd, _query,
+             _body) = _HEADER.unpack(_header)
+            _data = _file.read(_camera + _cmd + _query + _body)
+            if len(_data) < _camera + _cmd + _query + _body:
+                return
+            _view = memoryview(_data)
+            yield Exchange(
+                _started, _elapsed, bytes(_view[:_camera]).decode('utf-8'),
+                bytes(_view[_camera:_camera + _cmd]).decode('utf-8'),
+                bytes(_view[_camera + _cmd:_camera + _cmd + _query]).decode('utf-8'),
+                _status, bytes(_view[_camera + _cmd + _query:]))
+
+
+class _ReplayHandler(http.server.BaseHTTPRequestHandler):
+    """Answer with the recorded response of the simulated camera."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        _server = self.server.replay
+        _url = urllib.parse.urlsplit(self.path)
+        _user = ''
+        _auth = self.headers.get('Authorization', '')
+        if _auth.startswith('Basic '):
+            _user = b64decode(_auth[6:]).decode('utf-8').partition(':')[0]
+        _exchange = _server.response(_user, _url.path.lstrip('/'), _url.query)
+        if _exchange is None:
+            _status, _body = 404, b''
+        else:
+            if _server.latency:
+                time.sleep(_exchange.elapsed)
+            _status, _body = _exchange.status, _exchange.body
+        self.send_response(_status)
+        self.send_header('Content-Type', 'text/plain')
+        self.send_header('Content-Length', str(len(_body)))
+        self.end_headers()
+        self.wfile.write(_body)
+
+
+class _ReplayHTTPServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+    # many simulated cameras connect at the same time
+    request_queue_size = 1024
+
+
+class ReplayServer(object):
+    """Local HTTP server standing in for the recorded cameras."""
+
+    def __init__(self, exchanges, host='127.0.0.1', port=0, latency=True):
+        """
+        Initialize the server.
+
+        exchanges -- iterable of Exchanges e.g. from read_capture()
+        host -- local address to listen on (default localhost)
+        port -- port to listen on, 0 for any free port (default 0)
+        latency -- delay each response by its recorded latency (default True)
+        """
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.cameras = []
+        self._responses = {}
+        for _exchange in exchanges:
+            if _exchange.camera not in self._responses:
+                self.cameras.append(_exchange.camera)
+            _responses = self._responses.setdefault(_exchange.camera, {})
+            _responses[(_exchange.cmd, _exchange.query)] = _exchange
+            _responses.setdefault(_exchange.cmd, _exchange)
+        self._server = None
+
+    def recorded_camera(self, user):
+        """Return the recorded camera replayed by a simulated camera login."""
+        try:
+            return self.cameras[int(user.rpartition('-')[2]) % len(self.cameras)]
+        except (ValueError, ZeroDivisionError):
+            return None
+
+    def response(self, user, cmd, query):
+        """Return the recorded Exchange answering a request, or None."""
+        _responses = self._responses.get(self.recorded_camera(user), {})
+        return _responses.get((cmd, query)) or _responses.get(cmd)
+
+    def start(self):
+        """Start serving in a background thread."""
+        self._server = _ReplayHTTPServer((self.host, self.port), _ReplayHandler)
+        self._server.replay = self
+        self.port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        """Stop the server."""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+def _percentile(values, percent):
+    if len(values) < 2:
+        return values[0] if values else None
+    return statistics.quantiles(values, n=100, method='inclusive')[percent - 1]
+
+
+def replay(exchanges, port, host='127.0.0.1', cameras=100, speed=1.0, workers=64,
+           seed=None):
+    """
+    Replay recorded requests from simulated cameras and return ReplayStats.
+
+    Simulated camera n replays the requests of recorded camera n modulo
+    the number of recorded cameras, shifted by a random offset so copies
+    of the same camera are not in lockstep.
+
+    exchanges -- list of Exchanges e.g. from read_capture()
+    port -- port of the ReplayServer
+    host -- address of the ReplayServer (default localhost)
+    cameras -- number of simulated cameras (default 100)
+    speed -- replay speed, 1 for the recorded timing (default 1)
+    workers -- requests sent at the same time (default 64)
+    seed -- random seed of the offsets (default random)
+    """
+    if speed <= 0:
+        raise ValueError('speed must be positive')
+    _recorded = {}
+    for _exchange in exchanges:
+        _recorded.setdefault(_exchange.camera, []).append(_exchange)
+    if not _recorded:
+        return ReplayStats(0, 0, 0.0, None, None, None, 0.0)
+    _order = list(_recorded)
+    _first = min(_e.started for _e in exchanges)
+    _last = max(_e.started for _e in exchanges)
+    _random = random.Random(seed)
+    _spread = max(_last - _first, 1.0) / speed
+    _schedule = []
+    _sequence = 0
+    for _n in range(cameras):
+        _camera = DlinkDCSCamera(host, 'sim-%d' % _n, '', port, timeout=30)
+        _offset = _random.uniform(0, min(_spread, 1.0))
+        for _exchange in _recorded[_order[_n % len(_order)]]:
+            _due = (_exchange.started - _first) / speed + _offset
+            _params = urllib.parse.parse_qsl(_exchange.query, keep_blank_values=True)
+            _schedule.append((_due, _sequence, _camera, _exchange.cmd, dict(_params)))
+            _sequence += 1
+    heapq.heapify(_schedule)
+
+    _latencies = []
+    _errors = [0]
+    _lag = [0.0]
+    _lock = threading.Lock()
+
+    def _send(due, camera, cmd, params):
+        _start = time.perf_counter()
+        try:
+            camera.send_command(cmd, params)
+        except Exception:
+            with _lock:
+                _errors[0] += 1
+            return
+        with _lock:
+            _latencies.append(time.perf_counter() - _start)
+            _lag[0] = max(_lag[0], _start - due)
+
+    _begin = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as _executor:
+        while _schedule:
+            _due, _, _camera, _cmd, _params = heapq.heappop(_schedule)
+            _wait = _begin + _due - time.perf_counter()
+            if _wait > 0:
+                time.sleep(_wait)
+            _executor.submit(_send, _begin + _due, _camera, _cmd, _params)
+    _duration = time.perf_counter() - _begin
+    return ReplayStats(len(_latencies) + _errors[0], _errors[0], _duration,
+                       _percentile(_latencies, 50), _percentile(_latencies, 90),
+                       _percentile(_latencies, 99), _lag[0])
+
+
+def main(argv=None):
+    _parser = argparse.ArgumentParser(
+        prog='dlinkdcs.replay', description='Replay a DLINK DCS capture file.')
+    _parser.add_argument('capture', help='capture file')
+    _parser.add_argument('--cameras', type=int, default=100,
+                         help='simulated cameras (default 100)')
+    _parser.add_argument('--speed', type=float, default=1,
+                         help='replay speed, 1 to 100 (default 1)')
+    _parser.add_argument('--workers', type=int, default=64,
+                         help='requests sent at the same time (default 64)')
+    _parser.add_argument('--no-latency', action='store_true',
+                         help='answer without the recorded latency')
+    _args = _parser.parse_args(argv)
+    _exchanges = list(read_capture(_args.capture))
+    _server = ReplayServer(_exchanges, latency=not _args.no_latency)
+    _server.start()
+    try:
+        _stats = replay(_exchanges, _server.port, cameras=_args.cameras,
+                        speed=_args.speed, workers=_args.workers)
+    finally:
+        _server.stop()
+    print(json.dumps(_stats._asdict()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""
+DLINK DCS IP Camera response parsing.
+
+Responses are multiline key=value pairs. List responses such as the user
+list repeat the same keys once per entry, so they are parsed as a stream
+of pairs rather than a single dict.
+"""
+
+
+def iter_pairs(lines):
+    """
+    Yield the (key, value) pairs of a response as each line arrives.
+
+    lines -- iterable of response lines, as str
+    """
+    for line in lines:
+        line = line.strip()
+        # ignore blank lines and xml <result> block
+        if line != '' and not line.startswith('<'):
+            _key, _, _value = line.partition('=')
+            yield _key, _value
+
+
+def iter_entries(pairs, entry_key=None, header_keys=()):
+    """
+    Group a stream of (key, value) pairs into entry dicts.
+
+    A new entry is started when entry_key is seen or, if entry_key is not
+    set, when a key repeats within the current entry.
+
+    pairs -- iterable of (key, value) pairs
+    entry_key -- key that starts each entry e.g. 'UserName'
+    header_keys -- keys that describe the whole list and are not part of
+                   any entry, yielded as (key, value) tuples
+    """
+    _entry = {}
+    for _key, _value in pairs:
+        if _key in header_keys:
+            yield _key, _value
+            continue
+        if _entry and (_key == entry_key or (entry_key is None and _key in _entry)):
+            yield _entry
+            _entry = {}
+        _entry[_key] = _value
+    if _entry:
+        yield _entry
+
+
+class EntryList(list):
+    """List of response entries with the list wide header values."""
+
+    def __init__(self, entries=(), header=None):
+        """Initialize with the entry dicts and header dict."""
+        super(EntryList, self).__init__(entries)
+        self.header = header if header is not None else {}
+
+    @classmethod
+    def from_pairs(cls, pairs, entry_key=None, header_keys=()):
+        """Build the list from a stream of (key, value) pairs."""
+        _list = cls()
+        for _item in iter_entries(pairs, entry_key, header_keys):
+            if isinstance(_item, dict):
+                _list.append(_item)
+            else:
+                _list.header[_item[0]] = _item[1]
+        return _list
@@ -0,0 +1,239 @@
+"""
+Staged rollout of a configuration change across a fleet of DLINK DCS IP
+Cameras.
+
+The change is applied in waves: a canary group first, then waves growing
+by a factor up to a maximum size, each with a bounded number of cameras
+contacted at the same time. Before a camera is changed, the settings the
+change touches are read through the getter of the same CGI and saved;
+after the change they are read back and compared. When the failure rate
+of a wave is over the threshold the rollout stops and every changed camera
+is restored to its saved settings.
+
+The progress is saved to a JSON state file after every camera, so an
+interrupted rollout resumes where it stopped.
+"""
+
+import collections
+import json
+import logging
+import os
+import threading
+import time
+
+from .endpoints import BY_NAME, ENDPOINTS
+from .fleet import DlinkDCSFleet
+from .timelapse import camera_id
+
+
+_LOGGER = logging.getLogger("DlinkDCSRollout")
+
+PENDING = 'pending'
+VERIFIED = 'verified'
+FAILED = 'failed'
+RESTORED = 'restored'
+
+RUNNING = 'running'
+COMPLETED = 'completed'
+ROLLED_BACK = 'rolled_back'
+
+# keys the cameras do not return as they were set
+IGNORE_KEYS = ('EmailPassword', 'FTPPassword', 'ConfigReboot')
+
+RolloutProgress = collections.namedtuple(
+    'RolloutProgress', ['wave', 'camera', 'state', 'error', 'done', 'failed', 'total'])
+
+_GETTERS = {_e.cgi: _e.name for _e in ENDPOINTS if not _e.setter}
+
+
+def _call(call):
+    """Return the (method, args, kwargs) of a call tuple or dict."""
+    if isinstance(call, dict):
+        return call['method'], list(call.get('args', [])), dict(call.get('kwargs', {}))
+    _method, _args, _kwargs = (tuple(call) + ([], {}))[:3]
+    return _method, list(_args), dict(_kwargs)
+
+
+class DlinkDCSRollout(object):
+    """Apply a configuration change to a fleet in verified waves."""
+
+    def __init__(self, cameras, change, state_file=None, canary=1, growth=2,
+                 max_wave=50, workers=8, max_error_rate=0.1, pause=0,
+                 on_progress=None):
+        """
+        Initialize the rollout, resuming from the state file if it exists.
+
+        cameras -- iterable of DlinkDCSCamera, changed in this order
+        change -- list of setter calls, each a (method, args, kwargs) tuple
+                  or a {"method", "args", "kwargs"} dict as used by the
+                  command line apply command
+        state_file -- JSON file the progress is saved to (default None)
+        canary -- number of cameras in the first wave (default 1)
+        growth -- factor each following wave grows by (default 2)
+        max_wave -- largest number of cameras in a wave (default 50)
+        workers -- cameras changed at the same time (default 8)
+        max_error_rate -- fraction of failed cameras in a wave above which
+                          the rollout is rolled back (default 0.1)
+        pause -- seconds to wait between waves (default 0)
+        on_progress -- called as on_progress(progress) with a
+                       RolloutProgress after each camera
+        """
+        self.cameras = {camera_id(_camera): _camera for _camera in cameras}
+        self.change = [_call(_c) for _c in change]
+        self.state_file = state_file
+        self.canary = canary
+        self.growth = growth
+        self.max_wave = max_wave
+        self.workers = workers
+        self.max_error_rate = max_error_rate
+        self.pause = pause
+        self.on_progress = on_progress
+        self._lock = threading.Lock()
+        for _method, _args, _kwargs in self.change:
+            _endpoint = BY_NAME.get(_method)
+            if _endpoint is None or not _endpoint.setter:
+                raise ValueError('%s is not a setter' % _method)
+            if _endpoint.cgi not in _GETTERS:
+                raise ValueError('%s cannot be read back' % _method)
+            # validate before any camera is changed
+            _endpoint.encode(_args, _kwargs)
+        self.state = {'change': self.change, 'status': RUNNING, 'wave': 0,
+                      'cameras': {}}
+        if state_file is not None and os.path.exists(state_file):
+            with open(state_file) as _file:
+                _state = json.load(_file)
+            if _state['change'] != json.loads(json.dumps(self.change)):
+                raise ValueError('%s is the state of a different change' % state_file)
+            self.state = _state
+        for _name in self.cameras:
+            self.state['cameras'].setdefault(_name, {'state': PENDING})
+
+    @property
+    def status(self):
+        """RUNNING, COMPLETED or ROLLED_BACK."""
+        return self.state['status']
+
+    def save(self):
+        """Write the state file."""
+        if self.state_file is None:
+            return
+        with self._lock:
+            with open(self.state_file + '.tmp', 'w') as _file:
+                json.dump(self.state, _file, indent=1)
+            os.replace(self.state_file + '.tmp', self.state_file)
+
+    def _update(self, name, **values):
+        """Update the state of a camera and save it."""
+        with self._lock:
+            self.state['cameras'][name].update(values)
+        self.save()
+
+    def waves(self):
+        """Return the lists of camera names of the remaining waves."""
+        _pending = [_name for _name in self.cameras
+                    if self.state['cameras'][_name]['state'] == PENDING]
+        _waves = []
+        _wave = self.state['wave']
+        while _pending:
+            _size = max(1, min(int(self.canary * self.growth ** _wave), self.max_wave))
+            _waves.append(_pending[:_size])
+            _pending = _pending[_size:]
+            _wave += 1
+        return _waves
+
+    def _batch(self, camera):
+        """Return the change queued in a DlinkDCSBatch of a camera."""
+        _batch = camera.batch()
+        for _method, _args, _kwargs in self.change:
+            getattr(_batch, _method)(*_args, **_kwargs)
+        return _batch
+
+    def _apply(self, name):
+        _camera = self.cameras[name]
+        _record = self.state['cameras'][name]
+        _batch = self._batch(_camera)
+        _expected = _batch.pending()
+        if 'previous' not in _record:
+            _previous = {}
+            for _cgi, _params in _expected.items():
+                _current = getattr(_camera, _GETTERS[_cgi])()
+                _previous[_cgi] = {_key: _current[_key] for _key in _params
+                                   if _key in _current and _key not in IGNORE_KEYS}
+            # saved before the change so it can be restored after a crash
+            self._update(name, previous=_previous)
+        _batch.send()
+        for _cgi, _params in _expected.items():
+            _current = getattr(_camera, _GETTERS[_cgi])()
+            _wrong = [_key for _key, _value in _params.items()
+                      if _key in _current and _key not in IGNORE_KEYS and
+                      _current[_key] != str(_value)]
+            if _wrong:
+                raise ValueError('%s not applied: %s' % (_cgi, ', '.join(_wrong)))
+
+    def _progress(self, wave, name):
+        if self.on_progress is None:
+            return
+        _record = self.state['cameras'][name]
+        _states = [_c['state'] for _c in self.state['cameras'].values()]
+        self.on_progress(RolloutProgress(
+            wave, name, _record['state'], _record.get('error'),
+            _states.count(VERIFIED), _states.count(FAILED), len(self.cameras)))
+
+    def run(self):
+        """Run the remaining waves and return the final status."""
+        if self.status != RUNNING:
+            return self.status
+        _names = {_camera: _name for _name, _camera in self.cameras.items()}
+        for _wave in self.waves():
+            _fleet = DlinkDCSFleet([self.cameras[_n] for _n in _wave], self.workers)
+            _failed = 0
+            for _result in _fleet.map(lambda camera: self._apply(_names[camera]),
+                                      skip_unsupported=False):
+                _name = _names[_result.camera]
+                if _result.error is None:
+                    self._update(_name, state=VERIFIED)
+                else:
+                    _failed += 1
+                    self._update(_name, state=FAILED, error=str(_result.error))
+                    _LOGGER.warning('%s rollout failed: %s', _name, _result.error)
+                self._progress(self.state['wave'], _name)
+            if _failed > self.max_error_rate * len(_wave):
+                _LOGGER.error('wave %d failed on %d of %d cameras, rolling back',
+                              self.state['wave'], _failed, len(_wave))
+                self.rollback()
+                return self.status
+            self.state['wave'] += 1
+            self.save()
+            if self.pause:
+                time.sleep(self.pause)
+        self.state['status'] = COMPLETED
+        self.save()
+        return self.status
+
+    def _restore(self, name):
+        _camera = self.cameras[name]
+        for _cgi, _previous in self.state['cameras'][name]['previous'].items():
+            if _previous:
+                _params = dict(_previous)
+                _params['ConfigReboot'] = 'no'
+                _camera.send_command(_cgi, _params)
+
+    def rollback(self):
+        """Restore the saved settings of every changed camera."""
+        _names = [_name for _name, _record in self.state['cameras'].items()
+                  if 'previous' in _record and _record['state'] != RESTORED and
+                  _name in self.cameras]
+        _by_camera = {self.cameras[_name]: _name for _name in _names}
+        _fleet = DlinkDCSFleet(list(_by_camera), self.workers)
+        for _result in _fleet.map(lambda camera: self._restore(_by_camera[camera]),
+                                  skip_unsupported=False):
+            _name = _by_camera[_result.camera]
+            if _result.error is None:
+                self._update(_name, state=RESTORED)
+            else:
+                self._update(_name, error='restore failed: %s' % _result.error)
+                _LOGGER.error('%s restore failed: %s', _name, _result.error)
+            self._progress(self.state['wave'], _name)
+        self.state['status'] = ROLLED_BACK
+        self.save()
+        return self.status
@@ -0,0 +1,361 @@
+"""
+Local evaluation of DLINK DCS IP Camera feature schedules.
+
+Feature schedules are read from the camera getters and compiled into a
+weekly interval index answering "which cameras have a feature active at
+this time" without querying the cameras. Changed schedules are written
+back with the matching setters.
+
+Times are seconds from Sunday 00:00:00 in camera local time.
+"""
+
+import bisect
+import collections
+import copy
+import datetime
+
+
+DAY = 86400
+WEEK = 7 * DAY
+
+DAY_NAMES = ('Sun', 'Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat')
+
+# feature -- (getter, enable key, mode key, schedule mode value,
+#             day key, start key, stop key, interval key, setter)
+_Feature = collections.namedtuple('_Feature', [
+    'getter', 'enable', 'mode', 'schedule_mode',
+    'day', 'start', 'stop', 'interval', 'setter'])
+
+FEATURES = {
+    'motion_detection': _Feature(
+        'get_motion_detection', 'MotionDetectionEnable', 'MotionDetectionScheduleMode',
+        '1', 'MotionDetectionScheduleDay', 'MotionDetectionScheduleTimeStart',
+        'MotionDetectionScheduleTimeStop', None, 'set_motion_detection_schedule'),
+    'sound_detection': _Feature(
+        'get_sound_detection', 'SoundDetectionEnable', 'SoundDetectionScheduleMode',
+        '1', 'SoundDetectionScheduleDay', 'SoundDetectionScheduleTimeStart',
+        'SoundDetectionScheduleTimeStop', None, 'set_sound_detection_schedule'),
+    'email_image': _Feature(
+        'get_email', 'EmailScheduleEnable', 'EmailScheduleMode',
+        '1', 'EmailScheduleDay', 'EmailScheduleTimeStart',
+        'EmailScheduleTimeStop', 'EmailScheduleInterval', 'set_email_image_schedule'),
+    'email_video': _Feature(
+        'get_email', 'EmailScheduleEnableVideo', 'EmailScheduleModeVideo',
+        '1', 'EmailScheduleDayVideo', 'EmailScheduleTimeStartVideo',
+        'EmailScheduleTimeStopVideo', 'EmailScheduleIntervalVideo',
+        'set_email_video_schedule'),
+    'upload_image': _Feature(
+        'get_upload', 'FTPScheduleEnable', 'FTPScheduleMode',
+        '1', 'FTPScheduleDay', 'FTPScheduleTimeStart',
+        'FTPScheduleTimeStop', None, 'set_upload_image_schedule'),
+    'upload_video': _Feature(
+        'get_upload', 'FTPScheduleEnableVideo', 'FTPScheduleModeVideo',
+        '1', 'FTPScheduleDayVideo', 'FTPScheduleTimeStartVideo',
+        'FTPScheduleTimeStopVideo', None, 'set_upload_video_schedule'),
+}
+
+DAY_NIGHT = 'day_night'
+
+
+def parse_time(value):
+    """Return the seconds since midnight of a 'HH:MM' or 'HH:MM:SS' time."""
+    _parts = [int(_p) for _p in value.split(':')]
+    return _parts[0] * 3600 + _parts[1] * 60 + (_parts[2] if len(_parts) > 2 else 0)
+
+
+def week_time(when):
+    """Return the seconds since Sunday 00:00:00 of a datetime."""
+    _day = (when.weekday() + 1) % 7
+    return _day * DAY + when.hour * 3600 + when.minute * 60 + when.second
+
+
+def _normalize(intervals):
+    """Merge (start, end) week intervals, splitting those wrapping the week."""
+    _split = []
+    for _start, _end in intervals:
+        if _end > WEEK:
+            _split.append((_start, WEEK))
+            _split.append((0, _end - WEEK))
+        elif _end > _start:
+            _split.append((_start, _end))
+    _merged = []
+    for _start, _end in sorted(_split):
+        if _merged and _start <= _merged[-1][1]:
+            _merged[-1] = (_merged[-1][0], max(_merged[-1][1], _end))
+        else:
+            _merged.append((_start, _end))
+    return tuple(_merged)
+
+
+def _daily(day_windows):
+    """
+    Return the week intervals of (day, start seconds, stop seconds) windows.
+
+    A window with the same start and stop lasts the whole day and a stop
+    before the start ends on the next day.
+    """
+    _intervals = []
+    for _day, _start, _stop in day_windows:
+        _begin = _day * DAY + _start
+        if _stop == _start:
+            _intervals.append((_day * DAY, (_day + 1) * DAY))
+        elif _stop > _start:
+            _intervals.append((_begin, _day * DAY + _stop))
+        else:
+            _intervals.append((_begin, (_day + 1) * DAY + _stop))
+    return _normalize(_intervals)
+
+
+class FeatureSchedule(object):
+    """Weekly schedule of a camera feature using a day bitmask."""
+
+    def __init__(self, feature, days, start, stop, enabled=True, scheduled=True,
+                 interval=None):
+        """
+        Initialize the schedule.
+
+        feature -- one of the FEATURES names e.g. 'motion_detection'
+        days -- value representing scheduled days (0..127)
+                e.g. days = MONDAY + WEDNESDAY + FRIDAY
+        start -- daily start time in the format 'HH:MM:SS'
+        stop -- daily stop time in the format 'HH:MM:SS'
+        enabled -- feature is enabled (default True)
+        scheduled -- feature follows the schedule, otherwise it is always
+                     active when enabled (default True)
+        interval -- email interval in seconds, kept when written back
+        """
+        self.feature = feature
+        self.days = int(days)
+        self.start = start
+        self.stop = stop
+        self.enabled = enabled
+        self.scheduled = scheduled
+        self.interval = interval
+
+    @classmethod
+    def from_response(cls, feature, response):
+        """Build the schedule from the feature getter response."""
+        _f = FEATURES[feature]
+        return cls(
+            feature,
+            response.get(_f.day) or 0,
+            response.get(_f.start) or '00:00:00',
+            response.get(_f.stop) or '00:00:00',
+            response.get(_f.enable, '1') == '1',
+            response.get(_f.mode, _f.schedule_mode) == _f.schedule_mode,
+            int(response[_f.interval]) if _f.interval in response else None)
+
+    def __eq__(self, other):
+        return (isinstance(other, FeatureSchedule) and
+                self.params() == other.params())
+
+    def __repr__(self):
+        return 'FeatureSchedule(%r, %d, %r, %r)' % (
+            self.feature, self.days, self.start, self.stop)
+
+    def params(self):
+        """Return the schedule setter arguments."""
+        _args = (self.days, self.start, self.stop)
+        return _args if self.interval is None else _args + (self.interval,)
+
+    def intervals(self):
+        """Return the (start, end) week intervals the feature is active."""
+        if not self.enabled:
+            return ()
+        if not self.scheduled:
+            return ((0, WEEK),)
+        _start, _stop = parse_time(self.start), parse_time(self.stop)
+        return _daily((_day, _start, _stop) for _day in range(7)
+                      if self.days & (1 << _day))
+
+    def apply(self, camera):
+        """Write the schedule to the camera."""
+        return getattr(camera, FEATURES[self.feature].setter)(*self.params())
+
+
+class DayNightSchedule(object):
+    """Weekly IR LED night schedule with start and end times per day."""
+
+    feature = DAY_NIGHT
+
+    def __init__(self, times, mode=None):
+        """
+        Initialize the schedule.
+
+        times -- seven (start, end) 'HH:MM' tuples, Sunday first
+        mode -- camera DayNightMode, the night schedule is only followed in
+                DAY_NIGHT_SCHEDULE mode (default schedule mode)
+        """
+        self.times = tuple(tuple(_t) for _t in times)
+        self.mode = mode
+
+    @classmethod
+    def from_response(cls, response):
+        """Build the schedule from the get_day_night response."""
+        return cls([(response.get('IRLedSchedule%sStart' % _d, '00:00'),
+                     response.get('IRLedSchedule%sEnd' % _d, '00:00'))
+                    for _d in DAY_NAMES], response.get('DayNightMode'))
+
+    def __eq__(self, other):
+        return isinstance(other, DayNightSchedule) and self.times == other.times
+
+    def __repr__(self):
+        return 'DayNightSchedule(%r)' % (self.times,)
+
+    def params(self):
+        """Return the set_day_night_schedule arguments."""
+        return tuple(_v for _t in self.times for _v in _t)
+
+    def intervals(self):
+        """Return the (start, end) week intervals of night mode."""
+        if self.mode == '3':
+            return ((0, WEEK),)
+        if self.mode not in (None, '4'):
+            return ()
+        return _daily((_day, parse_time(_start), parse_time(_end))
+                      for _day, (_start, _end) in enumerate(self.times)
+                      if _start != _end)
+
+    def apply(self, camera):
+        """Write the schedule to the camera."""
+        return camera.set_day_night_schedule(*self.params())
+
+
+class ScheduleIndex(object):
+    """
+    Precomputed weekly index of the schedules of many cameras.
+
+    The index keeps its own copies of the schedules, so a schedule is only
+    changed by add() and the index is rebuilt when it is.
+    """
+
+    def __init__(self):
+        self._schedules = {}
+        self._loaded = {}
+        self._index = None
+
+    @classmethod
+    def from_fleet(cls, fleet, features=None):
+        """
+        Read the schedules of every camera of a DlinkDCSFleet.
+
+        features -- feature names to read (default all, including DAY_NIGHT)
+        """
+        _index = cls()
+        for _result in fleet.map(lambda camera: _index.load(camera, features)):
+            if _result.error is not None:
+                raise _result.error
+        return _index
+
+    def load(self, camera, features=None):
+        """
+        Read the schedules of a camera with its getters.
+
+        features -- feature names to read (default all, including DAY_NIGHT)
+        """
+        _features = features or list(FEATURES) + [DAY_NIGHT]
+        _responses = {}
+        for _feature in _features:
+            if _feature == DAY_NIGHT:
+                _schedule = DayNightSchedule.from_response(camera.get_day_night())
+            else:
+                _getter = FEATURES[_feature].getter
+                if _getter not in _responses:
+                    _responses[_getter] = getattr(camera, _getter)()
+                _schedule = FeatureSchedule.from_response(_feature, _responses[_getter])
+            self.add(camera, _schedule)
+            self._loaded[(camera, _feature)] = copy.copy(_schedule)
+
+    def add(self, camera, schedule):
+        """Add or replace the schedule of a camera feature."""
+        self._schedules[(camera, schedule.feature)] = copy.copy(schedule)
+        self._index = None
+
+    def schedule(self, camera, feature):
+        """
+        Return a copy of the schedule of a camera feature, or None. Edit it
+        and add() it back to change the schedule.
+        """
+        _schedule = self._schedules.get((camera, feature))
+        return None if _schedule is None else copy.copy(_schedule)
+
+    def _build(self):
+        _events = collections.defaultdict(list)
+        for (_camera, _feature), _schedule in self._schedules.items():
+            for _start, _end in _schedule.intervals():
+                _events[_feature].append((_start, 1, _camera))
+                _events[_feature].append((_end, -1, _camera))
+        self._index = {}
+        for _feature, _feature_events in _events.items():
+            _feature_events.sort(key=lambda e: (e[0], e[1]))
+            _bounds = [0]
+            _segments = [frozenset()]
+            _active = collections.Counter()
+            _shared = {}
+            for _time, _delta, _camera in _feature_events:
+                _active[_camera] += _delta
+                if _active[_camera] <= 0:
+                    del _active[_camera]
+                _set = frozenset(_active)
+                _set = _shared.setdefault(_set, _set)
+                if _bounds[-1] == _time:
+                    _segments[-1] = _set
+                else:
+                    _bounds.append(_time)
+                    _segments.append(_set)
+            self._index[_feature] = (_bounds, _segments)
+
+    def _lookup(self, feature):
+        if self._index is None:
+            self._build()
+        return self._index.get(feature, ([0], [frozenset()]))
+
+    def active(self, feature, when):
+        """
+        Return the cameras with the feature active at a time.
+
+        when -- datetime in camera local time, or seconds since Sunday
+                00:00:00
+        """
+        if isinstance(when, datetime.datetime):
+            when = week_time(when)
+        _bounds, _segments = self._lookup(feature)
+        return _segments[bisect.bisect_right(_bounds, when % WEEK) - 1]
+
+    def active_between(self, feature, start, end):
+        """
+        Return the cameras with the feature active at any time from start up
+        to end, as datetimes in camera local time.
+        """
+        _seconds = (end - start).total_seconds()
+        if _seconds >= WEEK:
+            return frozenset().union(*self._lookup(feature)[1])
+        _start = week_time(start)
+        _end = _start + _seconds
+        _bounds, _segments = self._lookup(feature)
+        _cameras = set()
+        for _from, _to in ((_start, min(_end, WEEK)), (0, _end - WEEK)):
+            if _to <= _from:
+                continue
+            _first = bisect.bisect_right(_bounds, _from) - 1
+            _last = bisect.bisect_left(_bounds, _to)
+            for _segment in _segments[_first:_last]:
+                _cameras.update(_segment)
+        return frozenset(_cameras)
+
+    def features_active(self, camera, when):
+        """Return the names of the camera features active at a time."""
+        return [_feature for (_camera, _feature) in self._schedules
+                if _camera is camera and camera in self.active(_feature, when)]
+
+    def changed(self):
+        """Return the (camera, schedule) pairs changed since loaded."""
+        return [(_camera, _schedule)
+                for (_camera, _feature), _schedule in self._schedules.items()
+                if self._loaded.get((_camera, _feature)) != _schedule]
+
+    def apply(self):
+        """Write the changed schedules back to the cameras."""
+        for _camera, _schedule in self.changed():
+            _schedule.apply(_camera)
+            self._loaded[(_camera, _schedule.feature)] = copy.copy(_schedule)
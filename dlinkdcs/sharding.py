@@ -0,0 +1,383 @@
+"""
+Run DLINK DCS IP Camera commands across worker processes.
+
+Cameras are split between worker processes with a consistent hash ring of
+the camera hosts, so each process parses and handles only its own share
+of a large fleet. Each worker runs its own DlinkDCSFleet of pooled
+sessions. Commands and results are passed through pipes as marshal
+encoded tuples, with cameras referred to by number.
+
+Adding or removing cameras never moves other cameras between workers,
+and changing the number of workers only moves the cameras whose hash
+range changed owner.
+
+Workers rebuild each camera as a plain DlinkDCSCamera from its host,
+login, port and timeout. Subclasses, cached responses, capabilities,
+command hooks and tracers of the given cameras do not reach the workers;
+results refer to the given cameras.
+"""
+
+import bisect
+import hashlib
+import logging
+import marshal
+import multiprocessing
+import threading
+
+from multiprocessing.connection import wait
+
+from .dlinkdcs import DlinkDCSCamera
+from .fleet import DlinkDCSFleet, FleetResult
+
+
+_LOGGER = logging.getLogger("DlinkDCSShardedFleet")
+
+_ADD = 0
+_REMOVE = 1
+_RUN = 2
+_STOP = 3
+
+
+class ShardError(Exception):
+    """Error raised by a command in a worker process."""
+
+    def __init__(self, error_type, message):
+        super(ShardError, self).__init__('%s: %s' % (error_type, message))
+        self.error_type = error_type
+
+
+def _hash(key):
+    return int.from_bytes(hashlib.md5(key.encode('utf-8')).digest()[:8], 'big')
+
+
+class HashRing(object):
+    """Consistent hash ring mapping keys to nodes."""
+
+    def __init__(self, nodes=(), replicas=100):
+        """
+        Initialize the ring.
+
+        nodes -- initial node names
+        replicas -- points on the ring per node (default 100)
+        """
+        self.replicas = replicas
+        self._points = []
+        self._nodes = []
+        for _node in nodes:
+            self.add(_node)
+
+    def add(self, node):
+        """Add a node to the ring."""
+        for _i in range(self.replicas):
+            _point = _hash('%s#%d' % (node, _i))
+            _index = bisect.bisect(self._points, _point)
+            self._points.insert(_index, _point)
+            self._nodes.insert(_index, node)
+
+    def remove(self, node):
+        """Remove a node from the ring."""
+        _kept = [(_p, _n) for _p, _n in zip(self._points, self._nodes) if _n != node]
+        self._points = [_p for _p, _ in _kept]
+        self._nodes = [_n for _, _n in _kept]
+
+    def node(self, key):
+        """Return the node owning a key."""
+        if not self._points:
+            raise LookupError('hash ring is empty')
+        _index = bisect.bisect(self._points, _hash(key)) % len(self._points)
+        return self._nodes[_index]
+
+
+def shard_key(camera):
+    """Return the hash ring key of a camera."""
+    return '%s:%d' % (camera.host, camera.port)
+
+
+def _compact(value):
+    """Convert a result into types marshal can encode."""
+    if value is None or isinstance(value, (bool, int, float, str, bytes)):
+        return value
+    if isinstance(value, dict):
+        return {_compact(_k): _compact(_v) for _k, _v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_compact(_v) for _v in value]
+    return repr(value)
+
+
+def _worker(connection, workers):
+    """Worker process running the commands of its cameras."""
+    _cameras = {}
+    _fleet = DlinkDCSFleet(workers=workers)
+    while True:
+        _message = marshal.loads(connection.recv_bytes())
+        if _message[0] == _ADD:
+            for _id, _host, _user, _password, _port, _timeout in _message[1]:
+                _camera = DlinkDCSCamera(_host, _user, _password, _port, _timeout)
+                _cameras[_id] = _camera
+                _fleet.add(_camera)
+        elif _message[0] == _REMOVE:
+            for _id in _message[1]:
+                _camera = _cameras.pop(_id, None)
+                if _camera is not None:
+                    _fleet.remove(_camera)
+                    _camera.close()
+        elif _message[0] == _RUN:
+            _, _method, _args, _kwargs = _message
+            _ids = {_camera: _id for _id, _camera in _cameras.items()}
+            for _result in _fleet.run(_method, *_args, **_kwargs):
+                _error = None
+                if _result.error is not None:
+                    _error = (type(_result.error).__name__, str(_result.error))
+                connection.send_bytes(marshal.dumps(
+                    (_ids[_result.camera], _compact(_result.result), _error)))
+            connection.send_bytes(marshal.dumps(None))
+        else:
+            _fleet.close()
+            return
+
+
+class _Shard(object):
+    """A worker process and the numbers of its cameras."""
+
+    def __init__(self, context, workers):
+        self.connection, _child = context.Pipe()
+        self.process = context.Process(target=_worker, args=(_child, workers),
+                                       daemon=True)
+        self.process.start()
+        _child.close()
+        self.ids = set()
+
+    def send(self, message):
+        self.connection.send_bytes(marshal.dumps(message))
+
+
+class DlinkDCSShardedFleet(object):
+    """A fleet of IP Cameras split between worker processes."""
+
+    def __init__(self, cameras=(), processes=None, workers=16, replicas=100,
+                 context=None):
+        """
+        Initialize and start the worker processes.
+
+        cameras -- iterable of DlinkDCSCamera
+        processes -- number of worker processes (default CPU count)
+        workers -- cameras contacted at the same time by each process
+                   (default 16)
+        replicas -- hash ring points per process (default 100)
+        context -- multiprocessing context (default the platform default)
+        """
+        self.workers = workers
+        self._context = context or multiprocessing.get_context()
+        self._ring = HashRing(replicas=replicas)
+        self._shards = {}
+        self._cameras = {}
+        self._ids = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+        # held while the results of a run are read from the pipes
+        self._run_lock = threading.Lock()
+        self._run_thread = None
+        # pipes of the run, closed by it when stopped during the run
+        self._reading = set()
+        self.resize(processes or multiprocessing.cpu_count())
+        self.update(cameras)
+
+    def __len__(self):
+        return len(self._cameras)
+
+    @property
+    def processes(self):
+        """Number of worker processes."""
+        return len(self._shards)
+
+    def shard(self, camera):
+        """Return the number of the worker process running a camera."""
+        return self._ring.node(shard_key(camera))
+
+    def _add(self, shard, ids):
+        _specs = []
+        for _id in ids:
+            _camera = self._cameras[_id]
+            _specs.append((_id, _camera.host, _camera.user, _camera.password,
+                           _camera.port, _camera.timeout))
+        self._shards[shard].send((_ADD, _specs))
+        self._shards[shard].ids.update(ids)
+
+    def _remove(self, shard, ids):
+        self._shards[shard].send((_REMOVE, list(ids)))
+        self._shards[shard].ids.difference_update(ids)
+
+    def update(self, cameras):
+        """
+        Set the cameras of the fleet. Cameras already in the fleet keep
+        their worker process.
+        """
+        with self._lock:
+            _wanted = {shard_key(_camera): _camera for _camera in cameras}
+            _added = {}
+            for _key, _camera in _wanted.items():
+                if _key in self._ids:
+                    continue
+                _id = self._next_id
+                self._next_id += 1
+                self._ids[_key] = _id
+                self._cameras[_id] = _camera
+                _added.setdefault(self._ring.node(_key), []).append(_id)
+            _removed = {}
+            for _key in list(self._ids):
+                if _key not in _wanted:
+                    _id = self._ids.pop(_key)
+                    del self._cameras[_id]
+                    _removed.setdefault(self._ring.node(_key), []).append(_id)
+            for _shard, _ids in _removed.items():
+                self._remove(_shard, _ids)
+            for _shard, _ids in _added.items():
+                self._add(_shard, _ids)
+
+    def resize(self, processes):
+        """
+        Change the number of worker processes, moving only the cameras
+        whose hash range changes process.
+        """
+        with self._lock:
+            for _shard in range(len(self._shards), processes):
+                self._shards[_shard] = _Shard(self._context, self.workers)
+                self._ring.add(_shard)
+            _stopped = [_s for _s in self._shards if _s >= processes]
+            for _shard in _stopped:
+                self._ring.remove(_shard)
+            _moves = {}
+            for _shard, _state in self._shards.items():
+                for _id in _state.ids:
+                    _target = self._ring.node(shard_key(self._cameras[_id]))
+                    if _target != _shard:
+                        _moves.setdefault((_shard, _target), []).append(_id)
+            for (_source, _target), _ids in _moves.items():
+                if _source < processes:
+                    self._remove(_source, _ids)
+                self._add(_target, _ids)
+            for _shard in _stopped:
+                self._stop(self._shards.pop(_shard))
+
+    def _stop(self, shard):
+        try:
+            shard.send((_STOP,))
+        except OSError:
+            pass
+        if shard.connection not in self._reading:
+            self._close(shard)
+
+    def _close(self, shard):
+        shard.process.join(5)
+        shard.connection.close()
+
+    def run(self, method, *args, **kwargs):
+        """
+        Call a DlinkDCSCamera method on every camera and yield a FleetResult
+        as each camera finishes, with errors raised in the workers as
+        ShardError. Arguments and results are limited to the types marshal
+        can encode; other result values are returned as their repr().
+
+        method -- name of the camera method e.g. 'get_common_info'
+
+        Cameras can be updated and the fleet resized while results are
+        read; a run gets the results of the cameras it started with. Runs
+        from other threads wait for the current run to finish. The cameras
+        of a worker process that exits get a failed result, and the worker
+        is restarted by the next run.
+        """
+        if self._run_thread == threading.get_ident():
+            raise RuntimeError('run() called while reading the results of a run')
+        with self._run_lock:
+            self._run_thread = threading.get_ident()
+            try:
+                yield from self._run(method, args, kwargs)
+            finally:
+                self._run_thread = None
+
+    def _run(self, method, args, kwargs):
+        # only the sends are locked, so update() and resize() can be
+        # called while the results are yielded
+        with self._lock:
+            _cameras = dict(self._cameras)
+            _pending = {}
+            _failed = []
+            for _shard in list(self._shards):
+                _state = self._shards[_shard]
+                if not _state.ids:
+                    continue
+                if not _state.process.is_alive():
+                    _state = self._restart(_shard)
+                try:
+                    _state.send((_RUN, method, args, kwargs))
+                except OSError:
+                    _failed.extend(self._exited(_state.ids))
+                    continue
+                # the cameras of the worker waiting for a result
+                _pending[_state.connection] = set(_state.ids)
+            _shards = [_s for _s in self._shards.values() if _s.connection in _pending]
+            self._reading = set(_pending)
+        try:
+            for _id, _result, _error in _failed:
+                yield FleetResult(_cameras[_id], _result, ShardError(*_error))
+            while _pending:
+                for _id, _result, _error in self._receive(_pending):
+                    yield FleetResult(_cameras[_id], _result, None if _error is None
+                                      else ShardError(*_error))
+        finally:
+            # read the rest of the results if the caller stopped early
+            while _pending:
+                for _ in self._receive(_pending):
+                    pass
+            with self._lock:
+                self._reading = set()
+                _stopped = [_s for _s in _shards if _s not in self._shards.values()]
+            for _shard in _stopped:
+                self._close(_shard)
+
+    def _receive(self, pending):
+        """
+        Return the results received from the workers of pending, with a
+        failed result for each camera of a worker that exited.
+        """
+        _results = []
+        for _connection in wait(list(pending)):
+            try:
+                _message = marshal.loads(_connection.recv_bytes())
+            except (EOFError, OSError):
+                _LOGGER.error('worker process exited')
+                _results.extend(self._exited(pending.pop(_connection)))
+                continue
+            if _message is None:
+                del pending[_connection]
+            else:
+                pending[_connection].discard(_message[0])
+                _results.append(_message)
+        return _results
+
+    @staticmethod
+    def _exited(ids):
+        return [(_id, None, ('WorkerExited', 'worker process exited'))
+                for _id in sorted(ids)]
+
+    def _restart(self, shard):
+        """Replace a worker process that exited, adding its cameras back."""
+        _LOGGER.warning('restarting worker process %d', shard)
+        _state = self._shards[shard]
+        self._close(_state)
+        self._shards[shard] = _Shard(self._context, self.workers)
+        self._add(shard, sorted(_state.ids))
+        return self._shards[shard]
+
+    def close(self):
+        """Stop the worker processes."""
+        with self._lock:
+            for _state in self._shards.values():
+                self._stop(_state)
+            self._shards.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
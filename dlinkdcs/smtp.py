@@ -0,0 +1,439 @@
+"""
+Local SMTP server receiving DLINK DCS IP Camera email notifications.
+
+Cameras are configured to send their motion emails to the receiver with
+DlinkDCSCamera.push_email_to(). Each camera authenticates with its own
+login so every message can be mapped back to the camera that sent it.
+MIME attachments are decoded line by line as the message arrives and are
+streamed to disk and/or a callback, never buffering the whole message.
+"""
+
+import asyncio
+import base64
+import binascii
+import collections
+import email.parser
+import email.utils
+import logging
+import os
+import quopri
+import socket
+import time
+
+from .receiver import CameraReceiver, _open, _peer_host
+
+
+_LOGGER = logging.getLogger("DlinkDCSEmailReceiver")
+
+Attachment = collections.namedtuple(
+    'Attachment', ['filename', 'content_type', 'size', 'path'])
+
+MotionEvent = collections.namedtuple(
+    'MotionEvent', ['camera', 'received', 'sender', 'subject', 'text', 'attachments'])
+
+# maximum number of bytes of text kept from the message body
+MAX_TEXT = 65536
+
+
+class _LineTooLong(Exception):
+    """A line longer than the stream reader limit was received."""
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class DlinkDCSEmailReceiver(CameraReceiver):
+    """Asyncio SMTP server for IP Camera email notifications."""
+
+    def __init__(self, host='0.0.0.0', port=2525, public_host=None,
+                 directory=None, on_data=None, on_event=None):
+        """
+        Initialize the email receiver.
+
+        host -- local address to listen on (default all interfaces)
+        port -- SMTP port (default 2525)
+        public_host -- address the cameras use to reach the receiver
+                       (default host)
+        directory -- save attachments below directory/<camera host>/
+        on_data -- called as on_data(camera, filename, chunk) for each
+                   decoded attachment chunk, and with chunk None when the
+                   attachment is complete
+        on_event -- called as on_event(event) with a MotionEvent for each
+                    message received
+        """
+        super(DlinkDCSEmailReceiver, self).__init__(host, port, public_host)
+        self.directory = directory
+        self.on_data = on_data
+        self.on_event = on_event
+        self._senders = {}
+
+    def register(self, camera, user=None, password=None, sender=None):
+        """
+        Register a camera and return its SMTP (user, password) login.
+
+        user -- SMTP user (default derived from the camera host)
+        password -- SMTP password (default random)
+        sender -- from address, identifying the camera when it does not
+                  authenticate and connects from its own host address
+                  (default sender_address(user))
+        """
+        user, password = super(DlinkDCSEmailReceiver, self).register(
+            camera, user, password)
+        self._senders[(sender or self.sender_address(user)).lower()] = camera
+        return user, password
+
+    def sender_address(self, user):
+        """Return the default from address of a camera login."""
+        return '%s@%s' % (user, self.public_host)
+
+    def unregister(self, camera):
+        """Remove all logins and sender addresses of a camera."""
+        super(DlinkDCSEmailReceiver, self).unregister(camera)
+        for _sender, _camera in list(self._senders.items()):
+            if _camera is camera:
+                del self._senders[_sender]
+
+    def camera_for_sender(self, sender):
+        """
+        Return the camera registered with the sender address, or None. The
+        address alone is not proof of the camera, see _sender_camera().
+        """
+        return self._senders.get((sender or '').lower())
+
+    async def _session(self, reader, writer):
+        await _SMTPSession(self, reader, writer).run()
+
+
+class _Part(object):
+    """A MIME part being decoded."""
+
+    def __init__(self, receiver, camera, headers, index):
+        self.receiver = receiver
+        self.camera = camera
+        self.content_type = headers.get_content_type()
+        self.encoding = (headers.get('Content-Transfer-Encoding') or '').strip().lower()
+        self.boundary = headers.get_boundary()
+        self.filename = headers.get_filename()
+        if self.filename is None and headers.get_content_maintype() in ('image', 'video'):
+            self.filename = 'attachment-%d.%s' % (index, headers.get_content_subtype())
+        self.size = 0
+        self.path = None
+        self._file = None
+        self._pending = b''
+        self._newline = b''
+        if self.filename is not None and receiver.directory is not None:
+            _name = '%d-%d-%s' % (int(time.time() * 1000), index,
+                                  os.path.basename(self.filename))
+            self.path = os.path.join(receiver.directory, str(camera.host), _name)
+
+    async def open(self):
+        """Open the attachment file, off the event loop."""
+        if self.path is not None:
+            self._file = await asyncio.to_thread(_open, self.path, 'wb')
+
+    def is_attachment(self):
+        return self.filename is not None
+
+    async def line(self, line):
+        """Decode one body line, without its line ending."""
+        if self.encoding == 'base64':
+            self._pending += line.strip()
+            _length = len(self._pending) - len(self._pending) % 4
+            _data, self._pending = self._pending[:_length], self._pending[_length:]
+            try:
+                _data = base64.b64decode(_data)
+            except binascii.Error:
+                _data = b''
+        elif self.encoding == 'quoted-printable':
+            _soft = line.endswith(b'=')
+            _data = quopri.decodestring(line[:-1] if _soft else line)
+            _data, self._newline = self._newline + _data, (b'' if _soft else b'\r\n')
+        else:
+            _data, self._newline = self._newline + line, b'\r\n'
+        await self.write(_data)
+
+    async def write(self, data):
+        if not data:
+            return
+        self.size += len(data)
+        if self._file is not None:
+            # disk writes would block every other camera's session
+            await asyncio.to_thread(self._file.write, data)
+        if self.is_attachment() and self.receiver.on_data is not None:
+            self.receiver.on_data(self.camera, self.filename, data)
+
+    async def close(self):
+        if self._file is not None:
+            await asyncio.to_thread(self._file.close)
+            self._file = None
+        if self.is_attachment() and self.receiver.on_data is not None:
+            self.receiver.on_data(self.camera, self.filename, None)
+        return Attachment(self.filename, self.content_type, self.size, self.path)
+
+    async def discard(self):
+        """Close and delete the file of an incomplete attachment."""
+        if self._file is not None:
+            await asyncio.to_thread(self._file.close)
+            self._file = None
+        if self.path is not None:
+            await asyncio.to_thread(_remove, self.path)
+
+
+class _TextPart(_Part):
+    """A MIME text part kept in memory, up to MAX_TEXT bytes."""
+
+    def __init__(self, receiver, camera, headers, index):
+        super(_TextPart, self).__init__(receiver, camera, headers, index)
+        self.text = bytearray()
+
+    async def write(self, data):
+        self.text += data[:MAX_TEXT - len(self.text)]
+
+
+class _MessageParser(object):
+    """Incremental MIME message parser fed one line at a time."""
+
+    def __init__(self, receiver, camera):
+        self.receiver = receiver
+        self.camera = camera
+        self.headers = None
+        self.attachments = []
+        self.text = []
+        self._header_lines = []
+        self._boundaries = []
+        self._part = None
+        self._index = 0
+
+    async def feed(self, line):
+        """Parse one message line, without its line ending."""
+        if self._header_lines is not None:
+            if line:
+                self._header_lines.append(line)
+                return
+            _headers = email.parser.BytesHeaderParser().parsebytes(
+                b'\r\n'.join(self._header_lines) + b'\r\n\r\n')
+            self._header_lines = None
+            if self.headers is None:
+                self.headers = _headers
+            await self._start_part(_headers)
+            return
+        if line.startswith(b'--') and self._boundaries:
+            _marker = line.rstrip()[2:]
+            for _depth in range(len(self._boundaries) - 1, -1, -1):
+                _boundary = self._boundaries[_depth]
+                if _marker == _boundary or _marker == _boundary + b'--':
+                    await self._end_part()
+                    del self._boundaries[_depth + 1:]
+                    if _marker == _boundary:
+                        self._header_lines = []
+                    return
+        if self._part is not None:
+            await self._part.line(line)
+
+    async def _start_part(self, headers):
+        _part_class = _Part
+        if headers.get_content_maintype() == 'text' and headers.get_filename() is None:
+            _part_class = _TextPart
+        self._part = _part_class(self.receiver, self.camera, headers, self._index)
+        self._index += 1
+        if self._part.boundary is not None:
+            self._boundaries.append(self._part.boundary.encode('utf-8'))
+            self._part = None
+        else:
+            await self._part.open()
+
+    async def _end_part(self):
+        if self._part is None:
+            return
+        _attachment = await self._part.close()
+        if isinstance(self._part, _TextPart):
+            self.text.append(bytes(self._part.text).decode('utf-8', 'replace'))
+        elif self._part.is_attachment():
+            self.attachments.append(_attachment)
+        self._part = None
+
+    async def close(self):
+        await self._end_part()
+
+    async def discard(self):
+        """Delete the attachments of a message that did not arrive whole."""
+        if self._part is not None:
+            await self._part.discard()
+            self._part = None
+        for _attachment in self.attachments:
+            if _attachment.path is not None:
+                await asyncio.to_thread(_remove, _attachment.path)
+        self.attachments = []
+
+
+class _SMTPSession(object):
+    """A single camera SMTP connection."""
+
+    def __init__(self, receiver, reader, writer):
+        self.receiver = receiver
+        self.reader = reader
+        self.writer = writer
+        self.camera = None
+        self.sender = None
+        self.recipients = []
+
+    async def reply(self, message):
+        self.writer.write(message.encode('utf-8') + b'\r\n')
+        await self.writer.drain()
+
+    async def readline(self):
+        try:
+            _line = await self.reader.readline()
+        except ValueError:
+            # the reader's limit was reached before the line ended
+            raise _LineTooLong()
+        if not _line:
+            raise ConnectionError('connection closed')
+        return _line.rstrip(b'\r\n')
+
+    async def run(self):
+        await self.reply('220 DLINK DCS email receiver ready')
+        try:
+            while True:
+                _line = (await self.readline()).decode('utf-8', 'replace')
+                _cmd, _, _arg = _line.strip().partition(' ')
+                _cmd = _cmd.upper()
+                if _cmd == 'QUIT':
+                    await self.reply('221 Bye')
+                    break
+                _handler = getattr(self, 'smtp_' + _cmd.lower(), None)
+                if _handler is None:
+                    await self.reply('502 Command not implemented')
+                else:
+                    await _handler(_arg)
+        except _LineTooLong:
+            await self.reply('500 Line too long')
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.writer.close()
+
+    async def smtp_helo(self, arg):
+        await self.reply('250 %s' % self.receiver.public_host)
+
+    async def smtp_ehlo(self, arg):
+        await self.reply('250-%s\r\n250-AUTH PLAIN LOGIN\r\n250 8BITMIME'
+                         % self.receiver.public_host)
+
+    async def smtp_auth(self, arg):
+        _mechanism, _, _initial = arg.partition(' ')
+        _mechanism = _mechanism.upper()
+        try:
+            if _mechanism == 'PLAIN':
+                if not _initial:
+                    await self.reply('334 ')
+                    _initial = (await self.readline()).decode('ascii')
+                _, _user, _password = base64.b64decode(_initial).split(b'\0', 2)
+            elif _mechanism == 'LOGIN':
+                if not _initial:
+                    await self.reply('334 VXNlcm5hbWU6')
+                    _initial = (await self.readline()).decode('ascii')
+                _user = base64.b64decode(_initial)
+                await self.reply('334 UGFzc3dvcmQ6')
+                _password = base64.b64decode(await self.readline())
+            else:
+                await self.reply('504 Unrecognized authentication type')
+                return
+        except (ValueError, binascii.Error):
+            await self.reply('501 Cannot decode response')
+            return
+        self.camera = self.receiver._authenticate(
+            _user.decode('utf-8', 'replace'), _password.decode('utf-8', 'replace'))
+        if self.camera is None:
+            await self.reply('535 Authentication failed')
+        else:
+            await self.reply('235 Authentication successful')
+
+    async def smtp_starttls(self, arg):
+        await self.reply('454 TLS not available')
+
+    async def smtp_mail(self, arg):
+        _, _, _address = arg.partition(':')
+        self.sender = email.utils.parseaddr(_address)[1]
+        if self.camera is None:
+            self.camera = await self._sender_camera(self.sender)
+        if self.camera is None:
+            await self.reply('530 Authentication required')
+            return
+        self.recipients = []
+        await self.reply('250 OK')
+
+    async def _sender_camera(self, sender):
+        """
+        Return the camera of an unauthenticated sender address, if the
+        connection comes from the host of that camera, as anyone can send
+        any from address.
+        """
+        _camera = self.receiver.camera_for_sender(sender)
+        if _camera is None:
+            return None
+        _peer = _peer_host(self.writer)
+        try:
+            _infos = await asyncio.get_running_loop().getaddrinfo(
+                _camera.host, None, type=socket.SOCK_STREAM)
+        except OSError:
+            _infos = []
+        if _peer in [_info[4][0] for _info in _infos]:
+            return _camera
+        _LOGGER.warning('refused sender %s from %s, not the address of %s',
+                        sender, _peer, _camera.host)
+        return None
+
+    async def smtp_rcpt(self, arg):
+        if self.sender is None or self.camera is None:
+            await self.reply('503 Need MAIL command')
+            return
+        _, _, _address = arg.partition(':')
+        self.recipients.append(email.utils.parseaddr(_address)[1])
+        await self.reply('250 OK')
+
+    async def smtp_data(self, arg):
+        if not self.recipients:
+            await self.reply('503 Need RCPT command')
+            return
+        await self.reply('354 End data with <CR><LF>.<CR><LF>')
+        _parser = _MessageParser(self.receiver, self.camera)
+        try:
+            while True:
+                _line = await self.readline()
+                if _line == b'.':
+                    break
+                if _line.startswith(b'.'):
+                    _line = _line[1:]
+                await _parser.feed(_line)
+        except BaseException:
+            # no partial attachments are left when the connection drops
+            await _parser.discard()
+            raise
+        await _parser.close()
+        _headers = _parser.headers
+        _event = MotionEvent(
+            self.camera, time.time(), self.sender,
+            _headers.get('Subject', '') if _headers is not None else '',
+            '\n'.join(_parser.text), _parser.attachments)
+        _LOGGER.debug('%s sent %d attachments', self.camera.host, len(_event.attachments))
+        if self.receiver.on_event is not None:
+            self.receiver.on_event(_event)
+        self.sender = None
+        self.recipients = []
+        await self.reply('250 OK message accepted')
+
+    async def smtp_rset(self, arg):
+        self.sender = None
+        self.recipients = []
+        await self.reply('250 OK')
+
+    async def smtp_noop(self, arg):
+        await self.reply('250 OK')
+
+    async def smtp_vrfy(self, arg):
+        await self.reply('252 Cannot verify user')
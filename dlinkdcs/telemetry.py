@@ -0,0 +1,225 @@
+"""
+Array backed time series of numeric DLINK DCS IP Camera telemetry.
+
+Each metric is stored as fixed size ring buffers, one row per camera, in a
+single NumPy array, so rollups across all cameras are vectorized. With a
+directory the arrays are memory mapped files and persist across runs.
+
+Requires numpy.
+"""
+
+import collections
+import json
+import os
+import threading
+import time
+import warnings
+
+import numpy
+
+from .timelapse import camera_id
+
+
+Rollup = collections.namedtuple('Rollup', ['cameras', 'min', 'max', 'mean', 'count'])
+
+
+class _Metric(object):
+    """Ring buffers of one metric for all cameras."""
+
+    def __init__(self, name, capacity, max_cameras, directory):
+        _shape = (max_cameras, capacity)
+        if directory is None:
+            self.values = numpy.full(_shape, numpy.nan, dtype=numpy.float32)
+            self.times = numpy.zeros(_shape, dtype=numpy.float64)
+            self.positions = numpy.zeros(max_cameras, dtype=numpy.int64)
+            return
+        _base = os.path.join(directory, name)
+        _exists = os.path.exists(_base + '.values')
+        _mode = 'r+' if _exists else 'w+'
+        if _exists:
+            for _suffix, _size in (('.values', 4 * capacity * max_cameras),
+                                   ('.times', 8 * capacity * max_cameras),
+                                   ('.positions', 8 * max_cameras)):
+                if os.path.getsize(_base + _suffix) != _size:
+                    raise ValueError('%s%s does not match the capacity and max_cameras'
+                                     ' of the store' % (_base, _suffix))
+        self.values = numpy.memmap(_base + '.values', numpy.float32, _mode, shape=_shape)
+        self.times = numpy.memmap(_base + '.times', numpy.float64, _mode, shape=_shape)
+        self.positions = numpy.memmap(
+            _base + '.positions', numpy.int64, _mode, shape=(max_cameras,))
+        if not _exists:
+            self.values[:] = numpy.nan
+
+    def flush(self):
+        for _array in (self.values, self.times, self.positions):
+            if isinstance(_array, numpy.memmap):
+                _array.flush()
+
+
+class TelemetryStore(object):
+    """Fixed size ring buffers per metric per camera."""
+
+    def __init__(self, capacity=1440, max_cameras=1024, directory=None):
+        """
+        Initialize the store.
+
+        capacity -- number of samples kept per metric per camera
+                    (default 1440)
+        max_cameras -- number of cameras the store can hold (default 1024)
+        directory -- directory of memory mapped files persisting the store,
+                     None to keep it in memory (default None)
+        """
+        self.capacity = capacity
+        self.max_cameras = max_cameras
+        self.directory = directory
+        self._metrics = {}
+        self._cameras = {}
+        self._lock = threading.Lock()
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+            _index = os.path.join(directory, 'cameras.json')
+            if os.path.exists(_index):
+                with open(_index) as _file:
+                    _saved = json.load(_file)
+                _shape = (_saved.get('capacity', capacity),
+                          _saved.get('max_cameras', max_cameras))
+                if _shape != (capacity, max_cameras):
+                    raise ValueError(
+                        'store in %s has capacity %d and max_cameras %d'
+                        % ((directory,) + _shape))
+                self._cameras = _saved['cameras']
+                for _metric in _saved['metrics']:
+                    self._metric(_metric)
+
+    def _metric(self, metric):
+        _metric = self._metrics.get(metric)
+        if _metric is None:
+            _metric = _Metric(metric, self.capacity, self.max_cameras, self.directory)
+            self._metrics[metric] = _metric
+            self._write_index()
+        return _metric
+
+    def _row(self, camera):
+        _row = self._cameras.get(camera)
+        if _row is None:
+            if len(self._cameras) >= self.max_cameras:
+                raise ValueError(
+                    'telemetry store is full (%d cameras)' % self.max_cameras)
+            _row = self._cameras[camera] = len(self._cameras)
+            # saved before any sample is written to the row, so a crash
+            # cannot give the row to another camera on the next run
+            self._write_index()
+        return _row
+
+    def _write_index(self):
+        """Atomically replace the camera index of a persisted store."""
+        if self.directory is None:
+            return
+        _index = os.path.join(self.directory, 'cameras.json')
+        with open(_index + '.tmp', 'w') as _file:
+            json.dump({'cameras': self._cameras, 'metrics': list(self._metrics),
+                       'capacity': self.capacity, 'max_cameras': self.max_cameras},
+                      _file)
+            _file.flush()
+            os.fsync(_file.fileno())
+        os.replace(_index + '.tmp', _index)
+
+    def cameras(self):
+        """Return the names of the cameras in the store."""
+        return list(self._cameras)
+
+    def metrics(self):
+        """Return the names of the metrics in the store."""
+        return list(self._metrics)
+
+    def record(self, camera, metric, value, timestamp=None):
+        """
+        Record a sample.
+
+        camera -- camera name
+        metric -- metric name e.g. 'SignalStrength'
+        value -- numeric sample value
+        timestamp -- sample time in seconds since the epoch (default now)
+        """
+        with self._lock:
+            _row = self._row(camera)
+            _metric = self._metric(metric)
+            _position = _metric.positions[_row]
+            _column = _position % self.capacity
+            _metric.values[_row, _column] = value
+            _metric.times[_row, _column] = time.time() if timestamp is None else timestamp
+            _metric.positions[_row] = _position + 1
+
+    def record_response(self, camera, response, keys, timestamp=None):
+        """
+        Record the numeric values of a getter response.
+
+        camera -- camera name
+        response -- getter response dict
+        keys -- response keys to record, keys missing from the response or
+                not numeric are skipped
+        """
+        for _key in keys:
+            try:
+                _value = float(response[_key])
+            except (KeyError, TypeError, ValueError):
+                continue
+            self.record(camera, _key, _value, timestamp)
+
+    def collect(self, fleet, getter, keys):
+        """
+        Call a getter on every camera of a DlinkDCSFleet and record the
+        values of keys of the responses under camera_id() names.
+        """
+        for _result in fleet.run(getter):
+            if _result.error is None:
+                self.record_response(camera_id(_result.camera), _result.result, keys)
+
+    def series(self, camera, metric):
+        """Return the (timestamps, values) arrays of a camera, oldest first."""
+        _metric = self._metrics[metric]
+        _row = self._cameras[camera]
+        _position = int(_metric.positions[_row])
+        _count = min(_position, self.capacity)
+        _order = (numpy.arange(_position - _count, _position)) % self.capacity
+        return _metric.times[_row, _order], _metric.values[_row, _order]
+
+    def rollup(self, metric, window, now=None):
+        """
+        Return the Rollup of the min, max, mean and count per camera of the
+        samples in the last window seconds, as arrays in cameras() order.
+        """
+        _metric = self._metrics[metric]
+        _rows = len(self._cameras)
+        _cutoff = (time.time() if now is None else now) - window
+        _values = numpy.where(_metric.times[:_rows] >= _cutoff,
+                              _metric.values[:_rows], numpy.nan)
+        with warnings.catch_warnings():
+            # cameras without samples in the window roll up to nan
+            warnings.simplefilter('ignore', RuntimeWarning)
+            return Rollup(self.cameras(),
+                          numpy.nanmin(_values, axis=1),
+                          numpy.nanmax(_values, axis=1),
+                          numpy.nanmean(_values, axis=1),
+                          numpy.count_nonzero(~numpy.isnan(_values), axis=1))
+
+    def fleet_rollup(self, metric, window, now=None):
+        """Return the (min, max, mean) of a metric across all cameras."""
+        _rollup = self.rollup(metric, window, now)
+        _total = _rollup.count.sum()
+        if _total == 0:
+            return (numpy.nan, numpy.nan, numpy.nan)
+        _sums = numpy.nansum(_rollup.mean * _rollup.count)
+        return (float(numpy.nanmin(_rollup.min)), float(numpy.nanmax(_rollup.max)),
+                float(_sums / _total))
+
+    def flush(self):
+        """
+        Write the memory mapped arrays to disk. The camera index is written
+        as cameras and metrics are added.
+        """
+        if self.directory is None:
+            return
+        with self._lock:
+            for _metric in self._metrics.values():
+                _metric.flush()
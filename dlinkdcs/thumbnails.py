@@ -0,0 +1,235 @@
+"""
+Parallel thumbnail pipeline for DLINK DCS IP Camera snapshots.
+
+Snapshots are copied into slots of a shared memory block and decoded in a
+pool of worker processes, using JPEG draft mode to decode directly at a
+reduced scale where possible. The thumbnails are written back into the
+same slot, so image data is never pickled between processes. Finished
+thumbnails are put in a bounded queue in submission order; when the
+queue is full the slots stay in use and submit() blocks, so a slow
+consumer slows the producers instead of growing memory.
+
+Requires Pillow.
+"""
+
+import collections
+import io
+import queue
+import threading
+
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing.shared_memory import SharedMemory
+
+from PIL import Image
+
+
+Thumbnail = collections.namedtuple('Thumbnail', ['camera', 'size', 'images', 'error'])
+
+# shared memory block attached by each worker process
+_shared = None
+
+
+def _attach(name):
+    """Attach a worker process to the shared memory block."""
+    global _shared
+    _shared = SharedMemory(name)
+
+
+def render(data, sizes, quality=75):
+    """
+    Decode a JPEG image and return its (width, height) and the list of
+    JPEG encoded thumbnails fitting each size.
+
+    data -- JPEG bytes
+    sizes -- list of (width, height) bounding boxes
+    quality -- JPEG quality of the thumbnails (default 75)
+    """
+    _img = Image.open(io.BytesIO(data))
+    _size = _img.size
+    _img.draft('RGB', max(sizes, key=lambda _box: _box[0] * _box[1]))
+    _img = _img.convert('RGB')
+    _thumbnails = []
+    for _box in sizes:
+        _thumbnail = _img.copy()
+        _thumbnail.thumbnail(_box)
+        _output = io.BytesIO()
+        _thumbnail.save(_output, 'JPEG', quality=quality)
+        _thumbnails.append(_output.getvalue())
+    return _size, _thumbnails
+
+
+def _render_slot(offset, length, slot_size, sizes, quality, data=None):
+    """Render the image in a slot and write the thumbnails back to it."""
+    if data is None:
+        with _shared.buf[offset:offset + length] as _view:
+            data = bytes(_view)
+    _size, _thumbnails = render(data, sizes, quality)
+    if sum(len(_t) for _t in _thumbnails) > slot_size:
+        return _size, _thumbnails
+    _lengths = []
+    _position = offset
+    for _thumbnail in _thumbnails:
+        _shared.buf[_position:_position + len(_thumbnail)] = _thumbnail
+        _position += len(_thumbnail)
+        _lengths.append(len(_thumbnail))
+    return _size, _lengths
+
+
+class ThumbnailPipeline(object):
+    """Decode snapshots into thumbnails in a process pool."""
+
+    def __init__(self, sizes=((160, 120),), processes=None, slots=32,
+                 slot_size=512 * 1024, queue_size=64, quality=75):
+        """
+        Initialize and start the pipeline.
+
+        sizes -- (width, height) boxes of the thumbnails made from each
+                 snapshot (default ((160, 120),))
+        processes -- number of worker processes (default CPU count)
+        slots -- snapshots decoded or waiting at the same time (default 32)
+        slot_size -- bytes of shared memory per snapshot, larger snapshots
+                     are passed to the workers directly (default 512 KiB)
+        queue_size -- thumbnails waiting for get() before the pipeline
+                      stops taking snapshots (default 64)
+        quality -- JPEG quality of the thumbnails (default 75)
+        """
+        self.sizes = [tuple(_size) for _size in sizes]
+        self.slot_size = slot_size
+        self.quality = quality
+        self._shared = SharedMemory(create=True, size=slots * slot_size)
+        self._executor = ProcessPoolExecutor(processes, initializer=_attach,
+                                             initargs=(self._shared.name,))
+        self._free = queue.Queue()
+        for _slot in range(slots):
+            self._free.put(_slot)
+        self._submitted = queue.Queue()
+        self._output = queue.Queue(queue_size)
+        self._collector = threading.Thread(target=self._collect, daemon=True)
+        self._collector.start()
+
+    def submit(self, camera, image):
+        """
+        Queue a JPEG snapshot of a camera, waiting for a free slot.
+
+        camera -- camera the snapshot was taken from
+        image -- JPEG bytes
+        """
+        _slot = self._free.get()
+        _offset = _slot * self.slot_size
+        _data = None
+        if len(image) <= self.slot_size:
+            self._shared.buf[_offset:_offset + len(image)] = image
+        else:
+            _data = bytes(image)
+        _future = self._executor.submit(_render_slot, _offset, len(image),
+                                        self.slot_size, self.sizes, self.quality, _data)
+        self._submitted.put((camera, _slot, _future))
+
+    def capture(self, fleet):
+        """
+        Take a snapshot from every camera of a DlinkDCSFleet and yield the
+        Thumbnail of each camera as it is rendered, with the error of the
+        cameras whose snapshot failed.
+
+        The snapshots are taken in a background thread while the caller
+        reads the thumbnails, so any number of cameras fit through the
+        slots. Thumbnails are read from the same queue as get(), which must
+        not be used until the iteration ends.
+        """
+        _done = object()
+
+        def _capture(camera):
+            self.submit(camera, camera.get_snapshot())
+
+        def _produce():
+            try:
+                for _result in fleet.map(_capture):
+                    if _result.error is not None:
+                        self._submitted.put(
+                            Thumbnail(_result.camera, None, None, _result.error))
+            finally:
+                # after every snapshot submitted before it
+                self._submitted.put(_done)
+
+        threading.Thread(target=_produce, daemon=True).start()
+        _thumbnail = None
+        try:
+            while True:
+                _thumbnail = self._output.get()
+                if _thumbnail is _done or _thumbnail is None:
+                    return
+                yield _thumbnail
+        finally:
+            # read the rest if the caller stopped early, so the snapshot
+            # thread is not left waiting for a slot
+            while _thumbnail is not _done and _thumbnail is not None:
+                _thumbnail = self._output.get()
+
+    def _collect(self):
+        while True:
+            _item = self._submitted.get()
+            if _item is None:
+                self._output.put(None)
+                return
+            if not isinstance(_item, tuple) or isinstance(_item, Thumbnail):
+                # failed capture() snapshots and the end of a capture()
+                self._output.put(_item)
+                continue
+            _camera, _slot, _future = _item
+            try:
+                _size, _rendered = _future.result()
+            except Exception as e:
+                self._free.put(_slot)
+                self._output.put(Thumbnail(_camera, None, None, e))
+                continue
+            _images = {}
+            _position = _slot * self.slot_size
+            for _box, _thumbnail in zip(self.sizes, _rendered):
+                if isinstance(_thumbnail, int):
+                    # length of a thumbnail written back to the slot
+                    _start, _position = _position, _position + _thumbnail
+                    _thumbnail = bytes(self._shared.buf[_start:_position])
+                _images[_box] = _thumbnail
+            self._free.put(_slot)
+            # blocks while the output queue is full
+            self._output.put(Thumbnail(_camera, _size, _images, None))
+
+    def get(self, timeout=None):
+        """
+        Return the next Thumbnail, in submission order, or None once the
+        pipeline is closed.
+
+        timeout -- seconds to wait, raising queue.Empty (default forever)
+        """
+        return self._output.get(timeout=timeout)
+
+    def __iter__(self):
+        while True:
+            _thumbnail = self.get()
+            if _thumbnail is None:
+                return
+            yield _thumbnail
+
+    def close(self):
+        """
+        Finish the queued snapshots and stop the workers. Thumbnails not yet
+        read are discarded.
+        """
+        if self._collector is None:
+            return
+        self._submitted.put(None)
+        while self._collector.is_alive():
+            try:
+                self._output.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        self._collector = None
+        self._executor.shutdown()
+        self._shared.close()
+        self._shared.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
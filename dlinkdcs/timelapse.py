@@ -0,0 +1,222 @@
+"""
+Time-lapse recording of DLINK DCS IP Camera snapshots.
+
+Frames are appended to one data file per camera per day, with a separate
+index file of fixed size (timestamp, offset, length) records. The index is
+memory mapped and binary searched, so any frame is found by timestamp
+without scanning the data file.
+"""
+
+import collections
+import logging
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+
+from .fleet import DlinkDCSFleet
+
+
+_LOGGER = logging.getLogger("DlinkDCSTimeLapse")
+
+Frame = collections.namedtuple('Frame', ['timestamp', 'image'])
+
+# index record: timestamp, offset in the data file, image length
+_INDEX_RECORD = struct.Struct('<dQI')
+
+
+def camera_id(camera):
+    """Return the file system safe storage name of a camera."""
+    return re.sub(r'[^A-Za-z0-9._-]', '_', '%s_%d' % (camera.host, camera.port))
+
+
+class FrameStore(object):
+    """Append-only frame storage with one file per camera per day."""
+
+    def __init__(self, directory, max_open_files=64):
+        """
+        Initialize the store.
+
+        directory -- root directory of the store
+        max_open_files -- number of day files kept open for appending,
+                          least recently used files are closed (default 64)
+        """
+        self.directory = directory
+        self.max_open_files = max_open_files
+        self._open = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def _paths(self, camera, day):
+        _base = os.path.join(self.directory, camera, day)
+        return _base + '.frames', _base + '.index'
+
+    @staticmethod
+    def _day(timestamp):
+        return time.strftime('%Y-%m-%d', time.gmtime(timestamp))
+
+    def append(self, camera, timestamp, image):
+        """
+        Append a frame.
+
+        Frames of a camera must be appended in timestamp order.
+
+        camera -- camera storage name, see camera_id()
+        timestamp -- frame time in seconds since the epoch
+        image -- frame JPEG bytes
+        """
+        _key = (camera, self._day(timestamp))
+        with self._lock:
+            _files = self._open.pop(_key, None)
+            if _files is None:
+                _data_path, _index_path = self._paths(*_key)
+                os.makedirs(os.path.dirname(_data_path), exist_ok=True)
+                _files = (open(_data_path, 'ab'), open(_index_path, 'ab'))
+            self._open[_key] = _files
+            while len(self._open) > self.max_open_files:
+                for _file in self._open.popitem(last=False)[1]:
+                    _file.close()
+            _data, _index = _files
+            _offset = _data.tell()
+            _data.write(image)
+            _data.flush()
+            # the index record is only written once the frame is complete
+            _index.write(_INDEX_RECORD.pack(timestamp, _offset, len(image)))
+            _index.flush()
+
+    def close(self):
+        """Close all open files."""
+        with self._lock:
+            while self._open:
+                for _file in self._open.popitem()[1]:
+                    _file.close()
+
+    def _read_index(self, camera, day):
+        _index_path = self._paths(camera, day)[1]
+        try:
+            with open(_index_path, 'rb') as _file:
+                if os.fstat(_file.fileno()).st_size < _INDEX_RECORD.size:
+                    return None
+                return mmap.mmap(_file.fileno(), 0, access=mmap.ACCESS_READ)
+        except FileNotFoundError:
+            return None
+
+    @staticmethod
+    def _search(index, timestamp, before=False):
+        """
+        Return the number of index records at or before timestamp, as
+        bisect_right().
+
+        before -- count only the records before timestamp, as bisect_left()
+        """
+        _lo, _hi = 0, len(index) // _INDEX_RECORD.size
+        while _lo < _hi:
+            _mid = (_lo + _hi) // 2
+            _timestamp = _INDEX_RECORD.unpack_from(index, _mid * _INDEX_RECORD.size)[0]
+            if _timestamp < timestamp or (_timestamp == timestamp and not before):
+                _lo = _mid + 1
+            else:
+                _hi = _mid
+        return _lo
+
+    def _read(self, camera, day, records):
+        """Yield the frames for (timestamp, offset, length) index records."""
+        _data_path = self._paths(camera, day)[0]
+        with open(_data_path, 'rb') as _file:
+            with mmap.mmap(_file.fileno(), 0, access=mmap.ACCESS_READ) as _data:
+                for _timestamp, _offset, _length in records:
+                    yield Frame(_timestamp, _data[_offset:_offset + _length])
+
+    def find(self, camera, timestamp):
+        """
+        Return the last Frame recorded at or before timestamp on the same
+        day, or None.
+        """
+        _day = self._day(timestamp)
+        _index = self._read_index(camera, _day)
+        if _index is None:
+            return None
+        with _index:
+            _position = self._search(_index, timestamp)
+            if _position == 0:
+                return None
+            _record = _INDEX_RECORD.unpack_from(
+                _index, (_position - 1) * _INDEX_RECORD.size)
+        return next(self._read(camera, _day, [_record]))
+
+    def frames(self, camera, start, end):
+        """Yield the Frames recorded from start up to, not including, end."""
+        _day_start = start - start % 86400
+        while _day_start < end:
+            _day = self._day(_day_start)
+            _index = self._read_index(camera, _day)
+            if _index is not None:
+                with _index:
+                    _first = self._search(_index, start, before=True)
+                    _last = self._search(_index, end, before=True)
+                    _records = [
+                        _INDEX_RECORD.unpack_from(_index, i * _INDEX_RECORD.size)
+                        for i in range(_first, _last)
+                    ]
+                if _records:
+                    for _frame in self._read(camera, _day, _records):
+                        yield _frame
+            _day_start += 86400
+
+
+class TimeLapseRecorder(object):
+    """Record snapshots from many cameras on a fixed schedule."""
+
+    def __init__(self, cameras, store, interval=60, workers=16):
+        """
+        Initialize the recorder.
+
+        cameras -- DlinkDCSFleet or iterable of DlinkDCSCamera
+        store -- FrameStore the frames are written to
+        interval -- seconds between frames (default 60)
+        workers -- number of snapshots retrieved at the same time, which
+                   bounds the number of frames held in memory (default 16)
+        """
+        if not isinstance(cameras, DlinkDCSFleet):
+            cameras = DlinkDCSFleet(cameras, workers)
+        self.fleet = cameras
+        self.store = store
+        self.interval = interval
+        self._stop = threading.Event()
+
+    def record_once(self):
+        """Record one frame from every camera and return the number recorded."""
+        def _record(camera):
+            _timestamp = time.time()
+            self.store.append(camera_id(camera), _timestamp, camera.get_snapshot())
+
+        _count = 0
+        for _result in self.fleet.map(_record):
+            if _result.error is None:
+                _count += 1
+            else:
+                _LOGGER.warning('%s snapshot failed: %s', _result.camera.host,
+                                _result.error)
+        return _count
+
+    def run(self, count=None):
+        """
+        Record frames every interval until stop() is called.
+
+        count -- number of rounds to record (default until stopped)
+        """
+        self._stop.clear()
+        _next = time.monotonic()
+        _round = 0
+        while not self._stop.is_set():
+            self.record_once()
+            _round += 1
+            if count is not None and _round >= count:
+                break
+            _next += self.interval
+            self._stop.wait(max(0, _next - time.monotonic()))
+
+    def stop(self):
+        """Stop a running recorder."""
+        self._stop.set()
@@ -0,0 +1,283 @@
+"""
+Tracing of DLINK DCS IP Camera commands.
+
+A Tracer records a span for each DlinkDCSCamera.send_command(), broken
+into the phases of the request:
+
+    dns -- resolving the camera host name, on new connections only
+    connect -- opening the TCP connection, on new connections only
+    auth -- preparing the request and its Basic Authorization header
+    ttfb -- sending the request until the response headers arrive
+    body -- reading the response body
+    parse -- parsing the key=value response
+
+Slow dns or connect phases point at the network, a slow ttfb at the web
+server of the camera and a slow parse at this library. With a threshold
+only the spans of calls slower than it, or failing, are kept (tail
+sampling), so the tracer can be left running on a whole fleet.
+
+Spans are appended to a JSON file in the Chrome Trace Event format as
+they finish, one thread per camera, and can be opened in chrome://tracing
+or https://ui.perfetto.dev.
+"""
+
+import collections
+import json
+import os
+import re
+import socket
+import sys
+import threading
+import time
+import weakref
+
+import urllib3
+
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+from urllib3.connectionpool import HTTPConnectionPool
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+from urllib3.util.connection import create_connection
+
+from .dlinkdcs import DlinkDCSCamera
+from .timelapse import camera_id
+
+
+# phases is a list of (phase, offset, duration) in seconds from started
+Span = collections.namedtuple(
+    'Span', ['camera', 'cmd', 'started', 'duration', 'phases', 'error'])
+
+# span of the command sent by the current thread, if traced
+_local = threading.local()
+
+# the dns and connect phases replace HTTPConnection._new_conn(), which
+# urllib3 only documents as a hook in these versions; with others the
+# connection opens itself and is timed as part of ttfb
+_URLLIB3_VERSION = tuple(int(_n) for _n in re.findall(r'\d+', urllib3.__version__)[:2])
+_TIME_CONNECT = (1, 26) <= _URLLIB3_VERSION < (3, 0)
+
+
+class _ActiveSpan(object):
+    """Phases of a command being sent."""
+
+    __slots__ = ('start', 'phases', 'request_start', 'headers')
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.phases = []
+        self.request_start = None
+        self.headers = None
+
+    def add(self, phase, start):
+        """Add a phase from start until now and return now."""
+        _end = time.perf_counter()
+        self.phases.append((phase, start - self.start, _end - start))
+        return _end
+
+
+def _active():
+    return getattr(_local, 'span', None)
+
+
+class _TracingConnection(HTTPConnection):
+    """Connection timing the dns, connect and ttfb phases."""
+
+    def _new_conn(self):
+        _span = _active()
+        if _span is None or not _TIME_CONNECT:
+            return super()._new_conn()
+        _start = time.perf_counter()
+        try:
+            _addresses = [_info[4][0] for _info in socket.getaddrinfo(
+                self.host, self.port, type=socket.SOCK_STREAM)]
+        except socket.gaierror:
+            # resolved again and reported by the connection
+            _span.add('dns', _start)
+            return super()._new_conn()
+        _start = _span.add('dns', _start)
+        try:
+            # each address in turn, as when the connection resolves the host
+            for _address in _addresses:
+                try:
+                    _sock = create_connection(
+                        (_address, self.port), self.timeout,
+                        source_address=self.source_address,
+                        socket_options=self.socket_options)
+                    break
+                except socket.timeout as e:
+                    _error = ConnectTimeoutError(
+                        self, 'Connection to %s timed out. (connect timeout=%s)'
+                        % (self.host, self.timeout))
+                    _cause = e
+                except OSError as e:
+                    _error = NewConnectionError(
+                        self, 'Failed to establish a new connection: %s' % e)
+                    _cause = e
+            else:
+                raise _error from _cause
+        finally:
+            # the request is sent once connected
+            _span.request_start = _span.add('connect', _start)
+        sys.audit('http.client.connect', self, self.host, self.port)
+        return _sock
+
+    def request(self, method, url, body=None, headers=None, **kwargs):
+        _span = _active()
+        if _span is not None:
+            _span.request_start = time.perf_counter()
+        return super().request(method, url, body, headers, **kwargs)
+
+    def getresponse(self):
+        _response = super().getresponse()
+        _span = _active()
+        if _span is not None and _span.request_start is not None:
+            _span.headers = _span.add('ttfb', _span.request_start)
+        return _response
+
+
+class _TracingPool(HTTPConnectionPool):
+    ConnectionCls = _TracingConnection
+
+
+class _TracingAdapter(HTTPAdapter):
+    """Transport adapter of a traced camera session."""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = dict(
+            self.poolmanager.pool_classes_by_scheme, http=_TracingPool)
+
+    def send(self, request, **kwargs):
+        _span = _active()
+        if _span is not None:
+            _span.add('auth', _span.start)
+        return super().send(request, **kwargs)
+
+
+class Tracer(object):
+    """Record the phases of IP Camera commands to a Chrome trace file."""
+
+    def __init__(self, filename, threshold=None, cameras=None):
+        """
+        Initialize the tracer.
+
+        filename -- trace file, replaced when the tracer starts
+        threshold -- keep only the spans of commands taking more seconds
+                     than this, or failing (default keep all)
+        cameras -- trace only these DlinkDCSCameras (default all)
+        """
+        self.filename = filename
+        self.threshold = threshold
+        self.cameras = None if cameras is None else set(cameras)
+        # spans written and spans dropped by the threshold
+        self.traced = 0
+        self.sampled_out = 0
+        self._file = None
+        self._written = False
+        self._threads = {}
+        # transport adapter replaced in each traced session
+        self._sessions = weakref.WeakKeyDictionary()
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Open the trace file and start tracing."""
+        if DlinkDCSCamera.tracer is not None:
+            raise RuntimeError('a Tracer is already running')
+        self._file = open(self.filename, 'w')
+        self._file.write('[')
+        self._written = False
+        self._threads = {}
+        DlinkDCSCamera.tracer = self
+
+    def stop(self):
+        """
+        Stop tracing and close the trace file. Traced camera sessions get
+        their transport adapter back.
+        """
+        if DlinkDCSCamera.tracer is self:
+            DlinkDCSCamera.tracer = None
+        with self._lock:
+            for _session, _previous in list(self._sessions.items()):
+                # the tracing adapter is not closed, commands may still be
+                # using its connections
+                if isinstance(_session.adapters.get('http://'), _TracingAdapter):
+                    _session.mount('http://', _previous)
+            self._sessions.clear()
+            if self._file is not None:
+                self._file.write('\n]\n')
+                self._file.close()
+                self._file = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def send_command(self, camera, cmd, params):
+        """Send a command as DlinkDCSCamera.send_command() and trace it."""
+        if self.cameras is not None and camera not in self.cameras:
+            return camera._send_command(cmd, params)
+        _session = camera.session
+        if not isinstance(_session.adapters.get('http://'), _TracingAdapter):
+            with self._lock:
+                _previous = _session.adapters.get('http://')
+                if not isinstance(_previous, _TracingAdapter):
+                    # left open, other threads may be using its connections
+                    self._sessions[_session] = _previous or HTTPAdapter()
+                    _session.mount('http://', _TracingAdapter())
+        _started = time.time()
+        _span = _local.span = _ActiveSpan()
+        _error = None
+        try:
+            r = camera.send_request(cmd, params)
+            if _span.headers is not None:
+                _span.add('body', _span.headers)
+            _elapsed = time.perf_counter() - _span.start
+            for _hook in camera.command_hooks:
+                _hook(camera, cmd, params, r, _started, _elapsed)
+            _parse = time.perf_counter()
+            _response = camera._parse_command(cmd, params, r)
+            _span.add('parse', _parse)
+            return _response
+        except Exception as e:
+            _error = '%s: %s' % (type(e).__name__, e)
+            raise
+        finally:
+            _local.span = None
+            self.record(Span(camera_id(camera), cmd, _started,
+                             time.perf_counter() - _span.start, _span.phases, _error))
+
+    def record(self, span):
+        """Write a Span to the trace file unless the threshold drops it."""
+        if (self.threshold is not None and span.error is None and
+                span.duration < self.threshold):
+            with self._lock:
+                self.sampled_out += 1
+            return
+        _pid = os.getpid()
+        with self._lock:
+            if self._file is None:
+                return
+            _events = []
+            _tid = self._threads.get(span.camera)
+            if _tid is None:
+                _tid = self._threads[span.camera] = len(self._threads) + 1
+                _events.append({'name': 'thread_name', 'ph': 'M', 'pid': _pid,
+                                'tid': _tid, 'args': {'name': span.camera}})
+            _ts = span.started * 1e6
+            _events.append({
+                'name': span.cmd, 'cat': 'command', 'ph': 'X', 'pid': _pid, 'tid': _tid,
+                'ts': round(_ts, 3), 'dur': round(span.duration * 1e6, 3),
+                'args': {} if span.error is None else {'error': span.error}})
+            for _phase, _offset, _duration in span.phases:
+                _events.append({
+                    'name': _phase, 'cat': 'phase', 'ph': 'X', 'pid': _pid, 'tid': _tid,
+                    'ts': round(_ts + _offset * 1e6, 3),
+                    'dur': round(_duration * 1e6, 3)})
+            for _event in _events:
+                self._file.write((',\n' if self._written else '\n') +
+                                 json.dumps(_event))
+                self._written = True
+            self.traced += 1
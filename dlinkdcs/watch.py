@@ -0,0 +1,95 @@
+"""
+Watch DLINK DCS IP Camera settings for changes.
+
+The raw response of each watched getter is hashed before it is parsed, so
+a response that has not changed since the last poll is neither parsed nor
+compared. Only changed responses are parsed and diffed against the last
+parsed response.
+"""
+
+import collections
+import hashlib
+import time
+
+from .endpoints import BY_NAME
+
+
+ConfigChange = collections.namedtuple(
+    'ConfigChange', ['camera', 'endpoint', 'changes', 'response', 'time'])
+
+
+def diff(old, new):
+    """Return the {key: value} of new that differ from old, None if removed."""
+    _changes = {_key: _value for _key, _value in new.items()
+                if _key not in old or old[_key] != _value}
+    for _key in old:
+        if _key not in new:
+            _changes[_key] = None
+    return _changes
+
+
+class ConfigWatcher(object):
+    """Report changes of getter responses across polls of IP Cameras."""
+
+    def __init__(self, endpoints, initial=True):
+        """
+        Initialize the watcher.
+
+        endpoints -- getter names e.g. ['get_motion_detection', 'get_upload']
+        initial -- report the first response of each getter as a change of
+                   every key (default True)
+        """
+        self.endpoints = []
+        for _name in endpoints:
+            _endpoint = BY_NAME.get(_name)
+            if _endpoint is None or _endpoint.setter:
+                raise ValueError('%s is not a getter' % _name)
+            self.endpoints.append(_endpoint)
+        self.initial = initial
+        self._state = {}
+
+    def poll(self, camera):
+        """
+        Poll the getters of a camera once and return the ConfigChanges.
+
+        An error response raises requests.HTTPError rather than being hashed
+        and reported as a change.
+        """
+        _changes = []
+        for _endpoint in self.endpoints:
+            _response = camera.send_request(_endpoint.cgi)
+            _response.raise_for_status()
+            _content = _response.content
+            _digest = hashlib.blake2b(_content, digest_size=16).digest()
+            _key = (camera, _endpoint.name)
+            _previous = self._state.get(_key)
+            if _previous is not None and _previous[0] == _digest:
+                continue
+            _response = camera.unmarshal_response(_content.decode('utf-8'))
+            self._state[_key] = (_digest, _response)
+            if _previous is None:
+                if not self.initial:
+                    continue
+                _diff = dict(_response)
+            else:
+                _diff = diff(_previous[1], _response)
+                if not _diff:
+                    continue
+            _changes.append(ConfigChange(camera, _endpoint.name, _diff, _response,
+                                         time.time()))
+        return _changes
+
+    def forget(self, camera):
+        """Drop the last responses of a camera."""
+        for _endpoint in self.endpoints:
+            self._state.pop((camera, _endpoint.name), None)
+
+
+def wait_interval(interval, started, stop):
+    """Wait until interval seconds after started, or until stop is set."""
+    _remaining = interval - (time.monotonic() - started)
+    if stop is not None:
+        return stop.wait(max(_remaining, 0))
+    if _remaining > 0:
+        time.sleep(_remaining)
+    return False
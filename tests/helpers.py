@@ -0,0 +1,179 @@
+"""
+Fake IP Cameras and a stub camera HTTP server shared by the tests.
+"""
+
+import http.server
+import threading
+import time
+import urllib.parse
+
+import requests
+
+from dlinkdcs import DlinkDCSCamera
+
+
+class FakeResponse(object):
+    """requests Response of a fake camera."""
+
+    def __init__(self, content, status_code=200, content_type='text/plain',
+                 chunks=None):
+        if isinstance(content, str):
+            content = content.encode('utf-8')
+        self.content = content
+        self.status_code = status_code
+        self.headers = {'Content-Type': content_type}
+        self.chunks = chunks
+
+    def raise_for_status(self):
+        if self.status_code != 200:
+            raise requests.HTTPError('%d Error' % self.status_code, response=self)
+
+    def iter_content(self, chunk_size):
+        return iter(self.chunks)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+class SettingsCamera(DlinkDCSCamera):
+    """Camera keeping its settings in memory."""
+
+    __slots__ = ('settings', 'sent', 'ignore')
+
+    def send_command(self, cmd, params={}):
+        _settings = self.settings.setdefault(cmd, {})
+        if params:
+            self.sent.append((cmd, dict(params)))
+            if not self.ignore:
+                _settings.update((_k, str(_v)) for _k, _v in params.items()
+                                 if _k != 'ConfigReboot')
+        return dict(_settings)
+
+
+def settings_camera(host, settings):
+    """Return a SettingsCamera with the {cgi: {key: value}} settings."""
+    _camera = SettingsCamera(host, 'admin', '')
+    _camera.settings = settings
+    _camera.sent = []
+    _camera.ignore = False
+    return _camera
+
+
+class SnapshotCamera(DlinkDCSCamera):
+    """Camera returning numbered snapshots, offline when snapshots is None."""
+
+    __slots__ = ('snapshots',)
+
+    def get_snapshot(self):
+        if self.snapshots is None:
+            raise ConnectionError('camera offline')
+        self.snapshots += 1
+        return b'snapshot%d' % self.snapshots
+
+
+class ResponseCamera(DlinkDCSCamera):
+    """
+    Camera answering each CGI with the text in responses, the error page of
+    a status given as a number, or raising ConnectionError when responses
+    is None.
+    """
+
+    __slots__ = ('responses',)
+
+    def send_request(self, cmd, params={}, **kwargs):
+        if self.responses is None:
+            raise ConnectionError('offline')
+        _content = self.responses.get(cmd, '')
+        if isinstance(_content, int):
+            return FakeResponse('<html>Error %d</html>' % _content, _content)
+        return FakeResponse(_content)
+
+
+def response_camera(host, responses, cls=ResponseCamera):
+    """Return a ResponseCamera answering with the {cgi: text} responses."""
+    _camera = cls(host, 'admin', '')
+    _camera.responses = responses
+    return _camera
+
+
+class CameraHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Camera keeping its settings in server.settings, setting them from the
+    query. Unknown CGIs are not found; server.statuses, server.bodies and
+    server.delays override the status, body and delay of a CGI.
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    def date_time_string(self, timestamp=None):
+        return super().date_time_string(time.time() + self.server.offset)
+
+    def do_GET(self):
+        _server = self.server
+        _server.paths.append(self.path)
+        _url = urllib.parse.urlsplit(self.path)
+        _cgi = _url.path.lstrip('/')
+        if _server.auth is not None and self.headers.get('Authorization') != _server.auth:
+            self._send(401, b'')
+            return
+        time.sleep(_server.delays.get(_cgi, 0))
+        _settings = _server.settings.get(_cgi)
+        _status = _server.statuses.get(_cgi, 404 if _settings is None else 200)
+        if _status != 200:
+            self._send(_status, b'')
+            return
+        _body = _server.bodies.get(_cgi)
+        if _body is None:
+            for _key, _value in urllib.parse.parse_qsl(_url.query):
+                if _key != 'ConfigReboot':
+                    _settings[_key] = _value
+            _body = ''.join('%s=%s\n' % _item for _item in _settings.items()).encode()
+        self._send(200, _body)
+
+    def _send(self, status, body):
+        try:
+            self.send_response(status)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except ConnectionError:
+            # the client timed out
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+class CameraServer(http.server.ThreadingHTTPServer):
+    """Stub camera HTTP server on a free local port."""
+
+    daemon_threads = True
+
+    def __init__(self, settings=None, auth=None, offset=0):
+        """
+        Initialize and start the server.
+
+        settings -- {cgi: {key: value}} settings of the camera
+        auth -- expected Authorization header, None to accept any request
+        offset -- seconds the camera clock is ahead of the local clock
+        """
+        super().__init__(('127.0.0.1', 0), CameraHandler)
+        self.settings = {} if settings is None else settings
+        self.auth = auth
+        self.offset = offset
+        self.statuses = {}
+        self.bodies = {}
+        self.delays = {}
+        self.paths = []
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
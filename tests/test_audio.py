@@ -0,0 +1,40 @@
+import unittest
+
+try:
+    import numpy
+    from dlinkdcs import audio
+except ImportError:
+    numpy = None
+
+
+@unittest.skipIf(numpy is None, 'requires numpy')
+class TestAudio(unittest.TestCase):
+    def tone(self, amplitude, seconds=1.0):
+        t = numpy.arange(int(8000 * seconds)) / 8000.0
+        return (amplitude * numpy.sin(2 * numpy.pi * 440 * t)).astype('<i2')
+
+    def test_block_levels(self):
+        r = audio.block_levels(self.tone(32767 / 2 ** 0.5), 1000)
+        self.assertEqual(len(r), 8)
+        self.assertTrue(numpy.allclose(r, 94.0, atol=0.1))
+
+    def test_ulaw_table(self):
+        self.assertEqual(audio._ULAW[0xff], 0)
+        self.assertEqual(audio._ULAW[0x80], 32124)
+        self.assertEqual(audio._ULAW[0x00], -32124)
+
+    def test_feed_and_recommend(self):
+        meter = audio.AudioMeter(None)
+        data = bytearray(self.tone(100, 10).tobytes() + b'\x00')
+        consumed = meter.feed(data)
+        self.assertEqual(consumed, 160000)
+        del data[:consumed]
+        self.assertEqual(len(data), 1)
+        self.assertEqual(meter.histogram.sum(), 80)
+        self.assertEqual(meter.recommend(), 51)
+        meter.feed(self.tone(32767 / 2 ** 0.5 / 10, 10).tobytes())
+        self.assertEqual(meter.recommend(), 78)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+import unittest
+
+from dlinkdcs.bandwidth import (
+    DlinkDCSBandwidthBalancer, frame_bytes, image_rate, upload_bytes_per_second)
+
+from tests.helpers import settings_camera
+
+
+def fake_camera(number, resolution='640x480', video=True):
+    return settings_camera('192.168.1.%d' % number, {
+        'image.cgi': {'VideoResolution': resolution},
+        'config/stream_info.cgi': {'resolutions': '320x240,640x480'},
+        'upload.cgi': {
+            'FTPScheduleEnable': '1',
+            'FTPScheduleVideoFrequencyMode': '0',
+            'FTPScheduleFramePerSecond': '-1',
+            'FTPScheduleSecondPerFrame': '1',
+            'FTPScheduleEnableVideo': '1' if video else '0',
+            'FTPScheduleVideoLimitSize': '2048',
+            'FTPScheduleVideoLimitTime': '10',
+        },
+    })
+
+
+class TestEstimates(unittest.TestCase):
+    def test_frame_bytes(self):
+        self.assertEqual(frame_bytes({'VideoResolution': '320x240'}), 320 * 240 * 0.15)
+        self.assertEqual(frame_bytes({'VideoResolution': '1'},
+                                     {'resolutions': '320x240,640x480'}),
+                         640 * 480 * 0.15)
+        self.assertEqual(frame_bytes({}), 640 * 480 * 0.15)
+
+    def test_image_rate(self):
+        self.assertEqual(image_rate({'FTPScheduleEnable': '0'}), 0)
+        self.assertEqual(image_rate({'FTPScheduleEnable': '1',
+                                     'FTPScheduleFramePerSecond': '2'}), 2)
+        self.assertEqual(image_rate({'FTPScheduleEnable': '1',
+                                     'FTPScheduleVideoFrequencyMode': '1',
+                                     'FTPScheduleSecondPerFrame': '5'}), 0.2)
+
+    def test_upload_bytes_per_second(self):
+        _upload = fake_camera(1).settings['upload.cgi']
+        # 3 images a second and a 2 MByte clip every 10 seconds
+        self.assertEqual(upload_bytes_per_second(_upload, 46080),
+                         3 * 46080 + 2048 * 1024 / 10)
+
+
+class TestDlinkDCSBandwidthBalancer(unittest.TestCase):
+    def setUp(self):
+        self.cameras = [fake_camera(_i + 1, video=False) for _i in range(4)]
+
+    def test_within_budget(self):
+        _balancer = DlinkDCSBandwidthBalancer(self.cameras, 10 ** 7)
+        _plan = _balancer.run()
+        self.assertTrue(_plan.fits)
+        self.assertEqual(_plan.before, _plan.after)
+        self.assertEqual([_c.sent for _c in self.cameras], [[]] * 4)
+
+    def test_priorities(self):
+        _frame = 640 * 480 * 0.15
+        _balancer = DlinkDCSBandwidthBalancer(
+            {self.cameras[0]: 4, self.cameras[1]: 1, self.cameras[2]: 1,
+             self.cameras[3]: 1}, 6 * _frame)
+        _plan = _balancer.run()
+        self.assertTrue(_plan.fits)
+        self.assertLessEqual(_plan.after, 6 * _frame)
+        self.assertEqual(self.cameras[0].sent, [])
+        for _camera in self.cameras[1:]:
+            self.assertEqual(_camera.sent, [('upload.cgi', {
+                'FTPScheduleFramePerSecond': 1, 'ConfigReboot': 'no'})])
+
+    def test_minimal_changes_and_restore(self):
+        _camera = fake_camera(1)
+        _balancer = DlinkDCSBandwidthBalancer([_camera], 40000)
+        _plan = _balancer.run()
+        self.assertTrue(_plan.fits)
+        self.assertEqual(_camera.sent[0][0], 'upload.cgi')
+        self.assertNotIn('FTPScheduleBaseFileName', _camera.sent[0][1])
+        self.assertEqual(_camera.settings['upload.cgi']['FTPScheduleVideoFrequencyMode'],
+                         '1')
+        # raised back to the settings first seen once the budget allows
+        _balancer.budget = 10 ** 7
+        _plan = _balancer.run()
+        self.assertEqual(_plan.cameras[_camera].changes, {
+            'FTPScheduleVideoFrequencyMode': 0, 'FTPScheduleFramePerSecond': 3,
+            'FTPScheduleVideoLimitSize': 2048})
+
+    def test_upload_turned_on(self):
+        _camera = self.cameras[0]
+        _balancer = DlinkDCSBandwidthBalancer([_camera], 10 ** 7)
+        _balancer.run()
+        _upload = _camera.settings['upload.cgi']
+        _upload['FTPScheduleEnableVideo'] = '1'
+        _upload['FTPScheduleEnable'] = '0'
+        _plan = _balancer.run()
+        self.assertEqual(_plan.cameras[_camera].changes, {})
+        self.assertEqual(_balancer.preferred[_camera], (3, 2048))
+        # the video upload is now counted and can be lowered
+        _balancer.budget = 50000
+        _plan = _balancer.run()
+        self.assertTrue(_plan.fits)
+        self.assertEqual(_plan.cameras[_camera].before, 2048 * 1024 / 10)
+        self.assertIn('FTPScheduleVideoLimitSize', _plan.cameras[_camera].changes)
+
+    def test_over_budget(self):
+        _plan = DlinkDCSBandwidthBalancer(self.cameras, 1).plan()
+        self.assertFalse(_plan.fits)
+        for _camera_plan in _plan.cameras.values():
+            self.assertEqual(_camera_plan.changes['FTPScheduleSecondPerFrame'], 60)
+
+    def test_errors(self):
+        self.cameras[0].settings = None
+        _plan = DlinkDCSBandwidthBalancer(self.cameras, 10 ** 7).run()
+        self.assertEqual(list(_plan.errors), [self.cameras[0]])
+        self.assertEqual(len(_plan.cameras), 3)
+        with self.assertRaises(ValueError):
+            DlinkDCSBandwidthBalancer({self.cameras[0]: 0}, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import unittest
+
+from dlinkdcs import DlinkDCSCamera, DlinkDCSUnsupportedError
+
+from tests.helpers import CameraServer
+
+
+class TestCapabilities(unittest.TestCase):
+    def setUp(self):
+        self.server = CameraServer({
+            'common/info.cgi': {'model': 'DCS-TEST', 'version': '1.00',
+                                'build': str(id(self))},
+            'config/ptz_move.cgi': {'p': '167'},
+            'sdbdetection.cgi': {'SoundDetectionEnable': '0'},
+        })
+        self.server.statuses['sdbdetection.cgi'] = 500
+        self.port = self.server.port
+        self.camera = DlinkDCSCamera('127.0.0.1', 'admin', '', self.port, timeout=5)
+        self.key = ('DCS-TEST', '1.00', str(id(self)))
+
+    def tearDown(self):
+        DlinkDCSCamera._capability_cache.pop(self.key, None)
+        self.camera.close()
+        self.server.stop()
+
+    def test_probe(self):
+        self.assertEqual(self.camera.capabilities(), {
+            DlinkDCSCamera.CAPABILITY_PTZ: True,
+            DlinkDCSCamera.CAPABILITY_PTZ_MOVE: True,
+            DlinkDCSCamera.CAPABILITY_PTZ_PRESETS: False,
+            DlinkDCSCamera.CAPABILITY_PTZ_PRESET_MOVE: False,
+            DlinkDCSCamera.CAPABILITY_SOUND_DETECTION: None,
+        })
+        # the PTZ command CGIs are never probed
+        self.assertNotIn('/cgi/ptdc.cgi', self.server.paths)
+        self.assertNotIn('/pantiltcontrol.cgi', self.server.paths)
+        self.assertTrue(self.camera.supports(DlinkDCSCamera.CAPABILITY_SOUND_DETECTION))
+        with self.assertRaises(DlinkDCSUnsupportedError):
+            self.camera.send_command('pantiltcontrol.cgi', {'PanSingleMoveDegree': 5})
+        # a failed probe is neither shared nor memoized
+        self.assertNotIn(self.key, DlinkDCSCamera._capability_cache)
+        del self.server.statuses['sdbdetection.cgi']
+        self.assertTrue(self.camera.capabilities()[
+            DlinkDCSCamera.CAPABILITY_SOUND_DETECTION])
+        self.assertIn(self.key, DlinkDCSCamera._capability_cache)
+        _other = DlinkDCSCamera('127.0.0.1', 'admin', '', self.port, timeout=5)
+        _probes = len(self.server.paths)
+        self.assertEqual(_other.capabilities(), self.camera.capabilities())
+        self.assertEqual(self.server.paths[_probes:], ['/common/info.cgi'])
+        _other.close()
+
+    def test_timeout(self):
+        del self.server.statuses['sdbdetection.cgi']
+        self.server.delays['sdbdetection.cgi'] = 1
+        _capabilities = self.camera.capabilities(timeout=0.2)
+        self.assertIsNone(_capabilities[DlinkDCSCamera.CAPABILITY_SOUND_DETECTION])
+        self.assertNotIn(self.key, DlinkDCSCamera._capability_cache)
+        self.server.delays.clear()
+        self.assertTrue(self.camera.capabilities(timeout=5)[
+            DlinkDCSCamera.CAPABILITY_SOUND_DETECTION])
+
+    def test_unknown_model(self):
+        self.server.settings['common/info.cgi'] = {'model': 'DCS-TEST'}
+        del self.server.statuses['sdbdetection.cgi']
+        self.camera.capabilities()
+        self.assertNotIn(('DCS-TEST', None, None), DlinkDCSCamera._capability_cache)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,221 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+import urllib.request
+
+from unittest import mock
+
+from dlinkdcs.cli import load_inventory, main
+from dlinkdcs.gateway import DlinkDCSGateway
+
+from tests.helpers import CameraServer
+
+
+def camera_settings():
+    return {
+        'cgiversion.cgi': {'CGIVersion': '2.1.8'},
+        'common/info.cgi': {'model': 'DCS-5020L', 'version': '1.15', 'build': '3'},
+        'motion.cgi': {'MotionDetectionEnable': '0', 'MotionDetectionSensitivity': '50'},
+        'image.cgi': {'VideoResolution': '640x480'},
+        'upload.cgi': {
+            'FTPScheduleEnable': '1',
+            'FTPScheduleVideoFrequencyMode': '0',
+            'FTPScheduleFramePerSecond': '3',
+            'FTPScheduleEnableVideo': '0',
+        },
+    }
+
+
+class CLITestCase(unittest.TestCase):
+    def setUp(self):
+        self.servers = []
+        self.directory = tempfile.TemporaryDirectory()
+        self.inventory = self.path('cameras.cfg')
+        with open(self.inventory, 'w') as _file:
+            _file.write('[DEFAULT]\nuser=admin\nhost=127.0.0.1\n')
+            for _name in ('frontdoor', 'garage'):
+                _server = CameraServer(camera_settings())
+                self.servers.append(_server)
+                _file.write('[%s]\nport=%d\n' % (_name, _server.port))
+
+    def tearDown(self):
+        for _server in self.servers:
+            _server.stop()
+        self.directory.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.directory.name, name)
+
+    def run_cli(self, *argv):
+        """Return the exit status and the JSON lines written by the CLI."""
+        _stream = io.StringIO()
+        _status = main(['--inventory', self.inventory] + list(argv), _stream)
+        return _status, [json.loads(_line) for _line in _stream.getvalue().splitlines()]
+
+
+class StopAfter(io.StringIO):
+    """Stream interrupting the command line after a number of lines."""
+
+    def __init__(self, lines):
+        super().__init__()
+        self.lines = lines
+
+    def write(self, text):
+        super().write(text)
+        if self.getvalue().count('\n') >= self.lines:
+            raise KeyboardInterrupt
+
+
+class TestCommands(CLITestCase):
+    def test_call(self):
+        _status, _lines = self.run_cli('call', 'get_cgi_version')
+        self.assertEqual(_status, 0)
+        self.assertEqual({_l['camera']: _l['result'] for _l in _lines}, {
+            'frontdoor': {'CGIVersion': '2.1.8'}, 'garage': {'CGIVersion': '2.1.8'}})
+        _status, _lines = self.run_cli('call', 'set_motion_detection_sensitivity', '80')
+        self.assertEqual(_status, 0)
+        self.assertEqual(self.servers[1].settings['motion.cgi'][
+            'MotionDetectionSensitivity'], '80')
+        self.assertEqual(self.run_cli('call', 'enable_motion_detection')[0], 0)
+        self.assertEqual(self.servers[0].settings['motion.cgi']['MotionDetectionEnable'],
+                         '1')
+
+    def test_call_text_arguments(self):
+        _motion = self.servers[0].settings['motion.cgi']
+        self.assertEqual(self.run_cli('call', 'set_motion_detection_blockset',
+                                      '0000011111000001111100000')[0], 0)
+        self.assertEqual(_motion['MotionDetectionBlockSet'], '0000011111000001111100000')
+        self.assertEqual(self.run_cli('call', 'set_motion_detection', 'true')[0], 0)
+        self.assertEqual(_motion['MotionDetectionEnable'], '1')
+        self.assertEqual(self.run_cli('call', 'set_motion_detection', 'enable=0')[0], 0)
+        self.assertEqual(_motion['MotionDetectionEnable'], '0')
+        self.assertEqual(self.run_cli('call', 'set_upload_server', 'ftp.example.com',
+                                      'camera', '0123')[0], 0)
+        self.assertEqual(self.servers[1].settings['upload.cgi']['FTPPassword'], '0123')
+        _status, _lines = self.run_cli('call', 'set_motion_detection', 'maybe')
+        self.assertEqual(_status, 1)
+        self.assertIn('must be a boolean', _lines[0]['error'])
+
+    def test_timeout(self):
+        self.assertEqual(
+            [_c.timeout for _c in load_inventory(self.inventory, 2.5).values()],
+            [2.5, 2.5])
+        with open(self.inventory, 'a') as _file:
+            _file.write('timeout=1\n')
+        self.assertEqual(
+            [_c.timeout for _c in load_inventory(self.inventory, 2.5).values()],
+            [2.5, 1.0])
+
+    def test_call_checks_method(self):
+        for _method in ('close', 'watch', 'batch', 'cache_responses', 'send_command',
+                        'get_cgi_version_async', '_send_command', 'no_such_method'):
+            with self.assertRaises(SystemExit):
+                self.run_cli('call', _method)
+
+    def test_call_errors(self):
+        _status, _lines = self.run_cli('call', 'set_motion_detection_sensitivity', '101')
+        self.assertEqual(_status, 1)
+        self.assertIn('must be in the range', _lines[0]['error'])
+
+    def test_backup(self):
+        _status, _lines = self.run_cli('backup')
+        self.assertEqual(_status, 0)
+        self.assertEqual(len(_lines), 2)
+        self.assertEqual(_lines[0]['result']['get_motion_detection'],
+                         camera_settings()['motion.cgi'])
+
+    def test_apply(self):
+        _calls = self.path('calls.json')
+        with open(_calls, 'w') as _file:
+            json.dump([{'method': 'set_motion_detection', 'args': [True]},
+                       {'method': 'get_motion_detection'}], _file)
+        _status, _lines = self.run_cli('apply', _calls)
+        self.assertEqual(_status, 0)
+        self.assertEqual(_lines[0]['result'][1]['MotionDetectionEnable'], '1')
+        with open(_calls, 'w') as _file:
+            json.dump([{'method': 'close'}], _file)
+        with self.assertRaises(SystemExit):
+            self.run_cli('apply', _calls)
+
+    def test_rollout(self):
+        _calls = self.path('calls.json')
+        with open(_calls, 'w') as _file:
+            json.dump([{'method': 'set_motion_detection_sensitivity', 'args': [80]}],
+                      _file)
+        _status, _lines = self.run_cli('rollout', _calls, '--state', self.path('state'))
+        self.assertEqual(_status, 0)
+        self.assertEqual([_l['result']['state'] for _l in _lines], ['verified'] * 2)
+        for _server in self.servers:
+            self.assertEqual(_server.settings['motion.cgi']['MotionDetectionSensitivity'],
+                             '80')
+
+    def test_watch(self):
+        _stream = StopAfter(2)
+        _status = main(['--inventory', self.inventory, 'watch', 'get_motion_detection',
+                        '--interval', '0.1'], _stream)
+        self.assertEqual(_status, 0)
+        _lines = [json.loads(_l) for _l in _stream.getvalue().splitlines()]
+        self.assertEqual([_l['method'] for _l in _lines], ['get_motion_detection'] * 2)
+        with self.assertRaises(SystemExit):
+            self.run_cli('watch', 'set_motion_detection')
+
+    def test_gateway(self):
+        _responses = []
+
+        def _serve(gateway):
+            gateway.start()
+            _url = 'http://127.0.0.1:%d/garage/cgiversion.cgi' % gateway.port
+            with urllib.request.urlopen(_url, timeout=5) as _response:
+                _responses.append(_response.read())
+            raise KeyboardInterrupt
+
+        with mock.patch.object(DlinkDCSGateway, 'serve_forever', _serve):
+            _status, _lines = self.run_cli('gateway', '--listen', '0')
+        self.assertEqual(_status, 0)
+        self.assertEqual(_responses, [b'CGIVersion=2.1.8\n'])
+
+    def test_trace(self):
+        _trace = self.path('trace.json')
+        _status, _lines = self.run_cli('--trace', _trace, 'call', 'get_cgi_version')
+        self.assertEqual(_status, 0)
+        with open(_trace) as _file:
+            _events = json.load(_file)
+        self.assertEqual(len([_e for _e in _events if _e.get('cat') == 'command']), 2)
+
+
+class TestBalance(CLITestCase):
+    def test_state(self):
+        _state = self.path('balance.json')
+        # 3 images a second of 46 KBytes each is about 1100 kbit/s per camera
+        _status, _lines = self.run_cli('balance', '--budget', '1200', '--state', _state)
+        self.assertEqual(_status, 0)
+        self.assertEqual(sorted(_l['camera'] for _l in _lines), ['frontdoor', 'garage'])
+        self.assertLessEqual(sum(_l['result']['after'] for _l in _lines), 1200)
+        with open(_state) as _file:
+            self.assertEqual(json.load(_file), {'frontdoor': [3, 0], 'garage': [3, 0]})
+        self.assertNotEqual(self.servers[0].settings['upload.cgi'],
+                            camera_settings()['upload.cgi'])
+        # raised back to the settings first seen
+        _status, _lines = self.run_cli('balance', '--budget', '10000', '--state', _state)
+        self.assertEqual(_status, 0)
+        for _server in self.servers:
+            self.assertEqual(_server.settings['upload.cgi']['FTPScheduleFramePerSecond'],
+                             '3')
+
+    def test_dry_run(self):
+        # over the budget even at one image a minute
+        _status, _lines = self.run_cli('balance', '--budget', '0.1', '--dry-run')
+        self.assertEqual(_status, 1)
+        self.assertTrue(all(_l['result']['changes'] for _l in _lines))
+        self.assertEqual(self.servers[0].settings, camera_settings())
+
+    def test_bad_priority(self):
+        for _priority in ('frontdoor', 'frontdoor=high', 'frontdoor=0', 'attic=2'):
+            with self.assertRaises(SystemExit):
+                self.run_cli('balance', '--budget', '100', '--priority', _priority)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -6,6 +6,7 @@ import time
 
 from configparser import ConfigParser
 from dlinkdcs import DlinkDCSCamera as ipcam
+from dlinkdcs import DlinkDCSUnsupportedError
 
 config = ConfigParser()
 config_filepath = os.path.join(os.path.dirname(__file__), 'camtest.cfg')
@@ -25,6 +26,15 @@ class TestDlinkDCSCam(unittest.TestCase):
     def setUp(self):
         self.ipcam = ipcam(CAM_HOST, CAM_USER, CAM_PASS, CAM_PORT)
 
+    def test_capabilities(self):
+        r = self.ipcam.capabilities()
+        self.assertTrue(ipcam.CAPABILITY_PTZ in r)
+        self.assertTrue(ipcam.CAPABILITY_SOUND_DETECTION in r)
+        self.assertEqual(r, ipcam(CAM_HOST, CAM_USER, CAM_PASS, CAM_PORT).capabilities())
+        if not r[ipcam.CAPABILITY_PTZ]:
+            with self.assertRaises(DlinkDCSUnsupportedError):
+                self.ipcam.get_ptz()
+
     def test_get_cgi_version(self):
         r = self.ipcam.get_cgi_version()
         self.assertTrue('CGIVersion' in r)
@@ -82,6 +92,14 @@ class TestDlinkDCSCam(unittest.TestCase):
         r = self.ipcam.get_ptz_presets()
         self.assertTrue('presets' in r)
 
+    def test_get_ptz_preset_entries(self):
+        r = self.ipcam.get_ptz_preset_entries()
+        self.assertTrue('home' in r.header)
+
+    def test_get_snapshot(self):
+        r = self.ipcam.get_snapshot()
+        self.assertTrue(r.startswith(b'\xff\xd8'))
+
     def test_get_sound_detection(self):
         r = self.ipcam.get_sound_detection()
         self.assertTrue('SoundDetectionEnable' in r)
@@ -102,6 +120,11 @@ class TestDlinkDCSCam(unittest.TestCase):
         r = self.ipcam.get_user_list()
         self.assertTrue('UserName' in r)
 
+    def test_get_user_entries(self):
+        r = self.ipcam.get_user_entries()
+        self.assertTrue(len(r) > 0)
+        self.assertTrue(all('UserName' in u for u in r))
+
     def test_set_day_night(self):
         r = self.ipcam.set_day_night(ipcam.DAY_NIGHT_MANUAL)
         self.assertTrue('DayNightMode' in r)
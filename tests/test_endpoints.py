@@ -0,0 +1,122 @@
+import asyncio
+import inspect
+import unittest
+
+from dlinkdcs import DlinkDCSCamera
+from dlinkdcs.endpoints import BY_NAME, ENDPOINTS
+
+
+class RecordingCamera(DlinkDCSCamera):
+    __slots__ = ('commands',)
+
+    def send_command(self, cmd, params={}):
+        self.commands.append((cmd, params))
+        return {}
+
+
+class TestEndpoints(unittest.TestCase):
+    def setUp(self):
+        self.camera = RecordingCamera('192.168.1.101', 'admin', '')
+        self.camera.commands = []
+
+    def test_methods(self):
+        for _endpoint in ENDPOINTS:
+            self.assertTrue(callable(getattr(DlinkDCSCamera, _endpoint.name)))
+            self.assertTrue(callable(getattr(DlinkDCSCamera, _endpoint.name + '_async')))
+
+    def test_getter(self):
+        self.camera.get_common_info()
+        self.assertEqual(self.camera.commands, [('common/info.cgi', {})])
+
+    def test_setter(self):
+        self.camera.set_email_account('smtp', 'user', 'secret', 'from', 'to',
+                                      DlinkDCSCamera.EMAIL_TLS_STARTTLS, port='587')
+        self.assertEqual(self.camera.commands, [('email.cgi', {
+            'EmailSMTPServerAddress': 'smtp',
+            'EmailSMTPPortNumber': 587,
+            'EmailTLSAuthentication': 2,
+            'EmailUserName': 'user',
+            'EmailPassword': 'secret',
+            'EmailReceiverAddress': 'to',
+            'EmailSenderAddress': 'from',
+            'ConfigReboot': 'no',
+        })])
+
+    def test_setter_quirks(self):
+        self.camera.set_ptz(tilt=10)
+        self.camera.set_ptz_move(-5, 5)
+        self.camera.set_motion_detection(False)
+        self.assertEqual(self.camera.commands, [
+            ('config/ptz_move.cgi', {'p': 167, 't': 10, 'z': 0}),
+            ('cgi/ptdc.cgi', {'posX': -5, 'posY': 5, 'command': 'set_relative_pos'}),
+            ('motion.cgi', {'MotionDetectionEnable': '0', 'ConfigReboot': 'no'}),
+        ])
+
+    def test_signature(self):
+        self.assertEqual(str(inspect.signature(DlinkDCSCamera.set_ptz)),
+                         '(self, pan=167, tilt=25, zoom=0)')
+        self.assertIn('0 to 336', DlinkDCSCamera.set_ptz.__doc__)
+
+    def test_validation(self):
+        with self.assertRaises(ValueError):
+            self.camera.set_ptz(pan=337)
+        with self.assertRaises(ValueError):
+            self.camera.set_sound_detection_sensitivity(40)
+        with self.assertRaises(ValueError):
+            self.camera.set_day_night(DlinkDCSCamera.DAY_NIGHT_SCHEDULE + '0')
+        with self.assertRaises(ValueError):
+            self.camera.set_motion_detection_schedule(128, '00:00:00', '12:00:00')
+        with self.assertRaises(ValueError):
+            self.camera.set_motion_detection_schedule(1, '00:00', '12:00:00')
+        with self.assertRaises(ValueError):
+            self.camera.set_motion_detection_blockset('11111')
+        self.assertEqual(self.camera.commands, [])
+
+    def test_time_boundaries(self):
+        _hh_mm = BY_NAME['set_day_night_schedule'].params[0].pattern
+        _hh_mm_ss = BY_NAME['set_motion_detection_schedule'].params[1].pattern
+        for _time in ('0:00', '09:30', '23:59', '24:00'):
+            self.assertTrue(_hh_mm.fullmatch(_time), _time)
+            self.assertTrue(_hh_mm_ss.fullmatch(_time + ':00'), _time)
+        for _time in ('24:01', '24:59', '25:00', '23:60', '123:00'):
+            self.assertFalse(_hh_mm.fullmatch(_time), _time)
+            self.assertFalse(_hh_mm_ss.fullmatch(_time + ':00'), _time)
+        self.assertFalse(_hh_mm_ss.fullmatch('24:00:01'))
+        self.assertFalse(_hh_mm_ss.fullmatch('23:59:60'))
+        self.camera.set_motion_detection_schedule(1, '00:00:00', '24:00:00')
+        with self.assertRaises(ValueError):
+            self.camera.set_motion_detection_schedule(1, '00:00:00', '24:59:00')
+
+    def test_arguments(self):
+        with self.assertRaises(TypeError):
+            self.camera.set_ptz(1, 2, 3, 4)
+        with self.assertRaises(TypeError):
+            self.camera.set_ptz(1, pan=2)
+        with self.assertRaises(TypeError):
+            self.camera.set_ptz(bogus=1)
+        with self.assertRaises(TypeError):
+            self.camera.set_motion_detection()
+
+    def test_async(self):
+        asyncio.run(self.camera.set_sound_detection_sensitivity_async(decibels=60))
+        self.assertEqual(self.camera.commands, [('sdbdetection.cgi', {
+            'SoundDetectionDB': 60, 'ConfigReboot': 'no'})])
+        with self.assertRaises(ValueError):
+            asyncio.run(self.camera.set_sound_detection_sensitivity_async(95))
+
+    def test_batch(self):
+        with self.camera.batch() as _batch:
+            _batch.set_motion_detection(True)
+            _batch.set_motion_detection_sensitivity(80)
+            _batch.set_upload_image(True)
+        self.assertEqual(self.camera.commands, [
+            ('motion.cgi', {'MotionDetectionEnable': '1',
+                            'MotionDetectionSensitivity': 80, 'ConfigReboot': 'no'}),
+            ('upload.cgi', {'FTPScheduleEnable': '1', 'ConfigReboot': 'no'}),
+        ])
+        with self.assertRaises(AttributeError):
+            _batch.get_common_info
+
+
+if __name__ == '__main__':
+    unittest.main()
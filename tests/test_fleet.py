@@ -0,0 +1,52 @@
+import unittest
+
+from dlinkdcs import DlinkDCSCamera, DlinkDCSFleet
+
+from tests.helpers import CameraServer
+
+
+class TestDlinkDCSFleet(unittest.TestCase):
+    def setUp(self):
+        # the camera clock is ahead of the local clock
+        self.server = CameraServer({
+            'cgiversion.cgi': {'CGIVersion': '2.1.8'},
+            'datetime.cgi': {'TimeZone': '0'},
+            'image/jpeg.cgi': {},
+        }, offset=30.25)
+        self.server.bodies['image/jpeg.cgi'] = b'\xff\xd8jpeg\xff\xd9'
+        _port = self.server.port
+        self.camera = DlinkDCSCamera('127.0.0.1', 'admin', '', _port, timeout=5)
+        # nothing listens on port 1
+        self.offline = DlinkDCSCamera('127.0.0.1', 'admin', '', 1, timeout=5)
+        self.fleet = DlinkDCSFleet([self.camera, self.offline], workers=1)
+
+    def tearDown(self):
+        self.fleet.close()
+        self.server.stop()
+
+    def test_warm_up(self):
+        with self.assertLogs('DlinkDCSFleet', 'WARNING'):
+            _errors = self.fleet.warm_up()
+        self.assertEqual(list(_errors), [self.offline])
+        self.assertIs(self.fleet.warm_up_error(self.offline), _errors[self.offline])
+        self.assertIsNone(self.fleet.warm_up_error(self.camera))
+        self.assertLess(self.fleet.rtt(self.camera), 0.1)
+        # measured to well under the one second resolution of the Date header
+        self.assertAlmostEqual(self.fleet.clock_offset(self.camera), 30.25, delta=0.05)
+
+    def test_capture_all(self):
+        with self.assertLogs('DlinkDCSFleet', 'WARNING'):
+            _frames = self.fleet.capture_all(delay=0.01)
+        self.assertEqual([_f.camera for _f in _frames], [self.camera, self.offline])
+        self.assertEqual(_frames[0].image, b'\xff\xd8jpeg\xff\xd9')
+        self.assertAlmostEqual(_frames[0].camera_time - _frames[0].captured_at, 30.25,
+                               delta=0.05)
+        self.assertIsNotNone(_frames[1].error)
+        # cameras are only warmed up once, including failed ones
+        _requests = len(self.server.paths)
+        self.fleet.capture_all(delay=0.01)
+        self.assertEqual(self.server.paths[_requests:], ['/image/jpeg.cgi'])
+
+
+if __name__ == '__main__':
+    unittest.main()
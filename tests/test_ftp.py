@@ -0,0 +1,122 @@
+import asyncio
+import ftplib
+import io
+import os
+import socket
+import tempfile
+import threading
+import unittest
+
+from dlinkdcs import DlinkDCSCamera, DlinkDCSUploadReceiver
+from dlinkdcs.receiver import CameraReceiver
+
+
+class TestDlinkDCSUploadReceiver(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.uploads = []
+        self.receiver = DlinkDCSUploadReceiver(
+            '127.0.0.1', 0, directory=self.directory.name,
+            on_upload=self.uploads.append)
+        self.camera = DlinkDCSCamera('192.168.1.101', 'admin', '')
+        self.loop = asyncio.new_event_loop()
+        self.loop.run_until_complete(self.receiver.start())
+        self.thread = threading.Thread(target=self.loop.run_forever)
+        self.thread.start()
+
+    def tearDown(self):
+        asyncio.run_coroutine_threadsafe(self.receiver.stop(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+        self.directory.cleanup()
+
+    def upload(self, user, password, passive=True):
+        ftp = ftplib.FTP()
+        ftp.connect('127.0.0.1', self.receiver.port)
+        try:
+            ftp.login(user, password)
+            ftp.set_pasv(passive)
+            ftp.cwd('/images')
+            ftp.storbinary('STOR image.jpg', io.BytesIO(b'\xff\xd8' * 50000))
+        finally:
+            ftp.close()
+
+    def test_upload_passive(self):
+        user, password = self.receiver.register(self.camera)
+        self.upload(user, password)
+        self.assertEqual(len(self.uploads), 1)
+        self.assertTrue(self.uploads[0].camera is self.camera)
+        self.assertEqual(self.uploads[0].path, '/images/image.jpg')
+        self.assertEqual(self.uploads[0].size, 100000)
+        self.assertEqual(os.path.getsize(self.uploads[0].filename), 100000)
+
+    def test_upload_active(self):
+        user, password = self.receiver.register(self.camera)
+        self.upload(user, password, passive=False)
+        self.assertEqual(self.uploads[0].size, 100000)
+
+    def test_port(self):
+        user, password = self.receiver.register(self.camera)
+        ftp = ftplib.FTP()
+        ftp.connect('127.0.0.1', self.receiver.port)
+        try:
+            ftp.login(user, password)
+            for _arg in ('127,0,0,1,x,1', '127,0,0,1,256,1', '127,0,0,1'):
+                with self.assertRaisesRegex(ftplib.error_perm, '^501'):
+                    ftp.sendcmd('PORT ' + _arg)
+            # connections to other hosts are refused
+            with self.assertRaisesRegex(ftplib.error_perm, '^501'):
+                ftp.sendcmd('PORT 10,0,0,1,0,25')
+            self.assertTrue(ftp.sendcmd('PORT 127,0,0,1,4,1').startswith('200'))
+        finally:
+            ftp.close()
+
+    def test_passive_other_host(self):
+        user, password = self.receiver.register(self.camera)
+        ftp = ftplib.FTP()
+        ftp.connect('127.0.0.1', self.receiver.port)
+        try:
+            ftp.login(user, password)
+            _address = ftplib.parse227(ftp.sendcmd('PASV'))
+            # another host connecting first is refused
+            with self.assertLogs('DlinkDCSUploadReceiver', 'WARNING'):
+                with socket.create_connection(_address, 5,
+                                              ('127.0.0.2', 0)) as _intruder:
+                    self.assertEqual(_intruder.recv(1), b'')
+            with socket.create_connection(_address, 5) as _data:
+                ftp.putcmd('STOR image.jpg')
+                self.assertTrue(ftp.getresp().startswith('150'))
+                _data.sendall(b'camera')
+            self.assertTrue(ftp.getresp().startswith('226'))
+        finally:
+            ftp.close()
+        self.assertEqual(self.uploads[0].size, 6)
+
+    def test_passive_host_name(self):
+        self.receiver.public_host = 'localhost'
+        user, password = self.receiver.register(self.camera)
+        ftp = ftplib.FTP()
+        ftp.connect('127.0.0.1', self.receiver.port)
+        try:
+            ftp.login(user, password)
+            self.assertEqual(ftplib.parse227(ftp.sendcmd('PASV'))[0], '127.0.0.1')
+            self.receiver.public_host = '::1'
+            with self.assertRaisesRegex(ftplib.error_temp, '^425'):
+                ftp.sendcmd('PASV')
+        finally:
+            ftp.close()
+
+    def test_receiver_is_abstract(self):
+        with self.assertRaises(TypeError):
+            CameraReceiver('127.0.0.1', 0)
+
+    def test_upload_bad_login(self):
+        user, password = self.receiver.register(self.camera)
+        with self.assertRaises(ftplib.error_perm):
+            self.upload(user, 'wrong')
+        self.assertEqual(self.uploads, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
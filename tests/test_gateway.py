@@ -0,0 +1,185 @@
+import threading
+import time
+import unittest
+import urllib.error
+import urllib.request
+
+from dlinkdcs import DlinkDCSCamera
+from dlinkdcs.gateway import DlinkDCSGateway, MJPEG_CGI, _Stream
+
+from tests.helpers import FakeResponse
+
+
+def mjpeg_chunks(frames):
+    for _frame in frames:
+        _part = (b'--frame\r\nContent-Type: image/jpeg\r\n\r\n' + _frame + b'\r\n')
+        # split parts across chunks
+        yield _part[:10]
+        yield _part[10:]
+        time.sleep(0.01)
+
+
+def stalled_chunks(resume):
+    # the first frame is complete once the next one starts
+    yield b'--frame\r\nContent-Type: image/jpeg\r\n\r\nframe0\r\n--frame\r\n'
+    resume.wait()
+
+
+class FakeCamera(DlinkDCSCamera):
+    __slots__ = ('requests', 'timeouts', 'delay', 'resume', 'status')
+
+    def send_request(self, cmd, params={}, **kwargs):
+        self.requests.append((cmd, dict(params)))
+        self.timeouts.append(kwargs.get('timeout'))
+        time.sleep(self.delay)
+        if cmd == MJPEG_CGI and self.status != 200:
+            return FakeResponse(b'', self.status)
+        if cmd == MJPEG_CGI:
+            _chunks = mjpeg_chunks(b'frame%d' % _i for _i in range(50))
+            if self.resume is not None:
+                _chunks = stalled_chunks(self.resume)
+            return FakeResponse(b'', 200, 'multipart/x-mixed-replace;boundary=frame',
+                                _chunks)
+        _count = len([_r for _r in self.requests if _r[0] == cmd])
+        return FakeResponse(('%s=%d\n' % (cmd, _count)).encode('utf-8'))
+
+
+class TestDlinkDCSGateway(unittest.TestCase):
+    def setUp(self):
+        self.camera = FakeCamera('192.168.1.101', 'admin', '')
+        self.camera.requests = []
+        self.camera.timeouts = []
+        self.camera.delay = 0
+        self.camera.resume = None
+        self.camera.status = 200
+        self.gateway = DlinkDCSGateway({'frontdoor': self.camera}, port=0, ttl=60)
+
+    def test_cache(self):
+        _first = self.gateway.request('frontdoor', 'motion.cgi')
+        self.assertEqual(_first.body, b'motion.cgi=1\n')
+        self.assertIs(self.gateway.request('frontdoor', 'motion.cgi'), _first)
+        self.assertEqual(len(self.camera.requests), 1)
+        self.gateway.invalidate('frontdoor')
+        self.assertEqual(self.gateway.request('frontdoor', 'motion.cgi').body,
+                         b'motion.cgi=2\n')
+
+    def test_single_flight(self):
+        self.camera.delay = 0.1
+        _threads = [threading.Thread(target=self.gateway.request,
+                                     args=('frontdoor', 'motion.cgi'))
+                    for _ in range(10)]
+        for _thread in _threads:
+            _thread.start()
+        for _thread in _threads:
+            _thread.join()
+        self.assertEqual(len(self.camera.requests), 1)
+
+    def test_write_invalidates(self):
+        self.gateway.request('frontdoor', 'motion.cgi')
+        self.gateway.request('frontdoor', 'motion.cgi', {'MotionDetectionEnable': '1'})
+        self.gateway.request('frontdoor', 'motion.cgi')
+        self.assertEqual(self.camera.requests, [
+            ('motion.cgi', {}),
+            ('motion.cgi', {'MotionDetectionEnable': '1'}),
+            ('motion.cgi', {}),
+        ])
+
+    def test_write_invalidates_stale(self):
+        self.gateway.request('frontdoor', 'config/ptz_move.cgi')
+        self.gateway.request('frontdoor', 'cgi/ptdc.cgi', {'posX': '10'})
+        self.gateway.request('frontdoor', 'config/ptz_move.cgi')
+        self.assertEqual(len(self.camera.requests), 3)
+
+    def test_uncached_cgi(self):
+        for _ in range(2):
+            self.gateway.request('frontdoor', 'no/such.cgi')
+        self.assertEqual(len(self.camera.requests), 2)
+        self.assertEqual(self.gateway._cache, {})
+
+    def test_timeout(self):
+        self.gateway.request('frontdoor', 'motion.cgi')
+        self.camera.timeout = 3
+        self.gateway.request('frontdoor', 'upload.cgi')
+        self.assertEqual(self.camera.timeouts, [10, 3])
+
+    def test_unknown_camera(self):
+        self.assertEqual(self.gateway.request('backdoor', 'motion.cgi').status, 404)
+
+    def test_http(self):
+        self.gateway.start()
+        try:
+            _url = 'http://127.0.0.1:%d/frontdoor/' % self.gateway.port
+            with urllib.request.urlopen(_url + 'motion.cgi') as r:
+                self.assertEqual(r.read(), b'motion.cgi=1\n')
+
+            def _watch(frames):
+                with urllib.request.urlopen(_url + MJPEG_CGI) as r:
+                    frames.append(r.read(100))
+
+            _frames = [[], []]
+            _threads = [threading.Thread(target=_watch, args=(_f,)) for _f in _frames]
+            for _thread in _threads:
+                _thread.start()
+            for _thread in _threads:
+                _thread.join()
+            for _f in _frames:
+                self.assertTrue(_f[0].startswith(b'--frame\r\n'))
+            self.assertEqual(
+                len([_r for _r in self.camera.requests if _r[0] == MJPEG_CGI]), 1)
+        finally:
+            self.gateway.stop()
+
+    def test_http_repeated_parameter(self):
+        self.gateway.start()
+        try:
+            _url = 'http://127.0.0.1:%d/frontdoor/motion.cgi' % self.gateway.port
+            with self.assertRaises(urllib.error.HTTPError) as _context:
+                urllib.request.urlopen(_url + '?MotionDetectionEnable=1'
+                                       '&MotionDetectionEnable=0')
+            self.assertEqual(_context.exception.code, 400)
+            self.assertEqual(self.camera.requests, [])
+        finally:
+            self.gateway.stop()
+
+    def test_http_stream_error(self):
+        self.camera.status = 401
+        self.gateway.start()
+        try:
+            _url = 'http://127.0.0.1:%d/frontdoor/%s' % (self.gateway.port, MJPEG_CGI)
+            with self.assertLogs('DlinkDCSGateway', 'WARNING'):
+                with self.assertRaises(urllib.error.HTTPError) as _context:
+                    urllib.request.urlopen(_url, timeout=5)
+            self.assertEqual(_context.exception.code, 401)
+        finally:
+            self.gateway.stop()
+
+    def test_slow_raw_stream(self):
+        self.gateway.stream_buffer = 2
+        _stream = _Stream(self.gateway, 'frontdoor', self.camera)
+        _slow = _stream.subscribe()
+        with self.assertLogs('DlinkDCSGateway', 'WARNING'):
+            for _chunk in (b'a', b'b', b'c'):
+                _stream._publish(_chunk, frame=False)
+        # the client ends after the chunks it read rather than skip one
+        self.assertEqual(_slow.get_nowait(), None)
+        self.assertEqual(_stream.subscribers, set())
+
+    def test_http_stalled_stream(self):
+        self.camera.resume = threading.Event()
+        self.gateway.stall_timeout = 0.2
+        self.gateway.start()
+        try:
+            _url = 'http://127.0.0.1:%d/frontdoor/%s' % (self.gateway.port, MJPEG_CGI)
+            _start = time.monotonic()
+            with self.assertLogs('DlinkDCSGateway', 'WARNING'):
+                with urllib.request.urlopen(_url, timeout=5) as r:
+                    # the client is closed instead of waiting for a frame
+                    self.assertTrue(r.read().endswith(b'frame0\r\n'))
+            self.assertLess(time.monotonic() - _start, 4)
+        finally:
+            self.camera.resume.set()
+            self.gateway.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
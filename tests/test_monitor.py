@@ -0,0 +1,70 @@
+import time
+import unittest
+
+from dlinkdcs.monitor import (
+    DlinkDCSHealthMonitor, EVENT_IP_CHANGED, EVENT_OFFLINE, EVENT_ONLINE,
+    EVENT_SIGNAL_DROPPED)
+
+from tests.helpers import response_camera
+
+
+class TestDlinkDCSHealthMonitor(unittest.TestCase):
+    def setUp(self):
+        self.camera = response_camera('192.168.1.101', {
+            'inetwork.cgi': 'IPAddress=192.168.1.101\n',
+            'iwireless.cgi': 'SignalStrength=80\n',
+        })
+        self.monitor = DlinkDCSHealthMonitor([self.camera], jitter=0)
+
+    def events(self):
+        return [e.type for e in self.monitor.poll(self.camera)]
+
+    def test_poll(self):
+        self.assertEqual(self.events(), [EVENT_ONLINE])
+        self.assertEqual(self.events(), [])
+        self.camera.responses = {
+            'inetwork.cgi': 'IPAddress=192.168.1.102\n',
+            'iwireless.cgi': 'SignalStrength=50\n',
+        }
+        self.assertEqual(self.events(), [EVENT_IP_CHANGED, EVENT_SIGNAL_DROPPED])
+        self.camera.responses = None
+        self.assertEqual(self.events(), [EVENT_OFFLINE])
+        self.assertEqual(self.events(), [])
+
+    def test_signal_window(self):
+        self.assertEqual(self.events(), [EVENT_ONLINE])
+        # a slow drop is reported once it adds up within the window
+        for _signal, _events in ((75, []), (70, []), (64, []),
+                                 (58, [EVENT_SIGNAL_DROPPED]), (55, []), (50, [])):
+            self.camera.responses['iwireless.cgi'] = 'SignalStrength=%d\n' % _signal
+            self.assertEqual(self.events(), _events)
+        self.assertEqual(self.monitor.health(self.camera)[2], 50)
+
+    def test_remove_and_add(self):
+        _polled = []
+        self.monitor._poll = lambda camera, health: _polled.append(camera)
+        self.monitor.remove(self.camera)
+        self.monitor.add(self.camera)
+        with self.monitor._condition:
+            # every entry due now, the stale one first
+            self.monitor._heap = [(0,) + _e[1:] for _e in self.monitor._heap]
+        self.monitor.start()
+        try:
+            _deadline = time.monotonic() + 5
+            while self.monitor._heap and time.monotonic() < _deadline:
+                time.sleep(0.01)
+        finally:
+            self.monitor.stop()
+        self.assertEqual(_polled, [self.camera])
+
+    def test_next_interval(self):
+        health = self.monitor._health[self.camera]
+        self.assertEqual(self.monitor.next_interval(health), 60)
+        health.latency = 3.0
+        self.assertEqual(self.monitor.next_interval(health), 180)
+        health.failures = 5
+        self.assertEqual(self.monitor.next_interval(health), 900)
+
+
+if __name__ == '__main__':
+    unittest.main()
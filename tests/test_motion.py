@@ -0,0 +1,78 @@
+import io
+import unittest
+
+try:
+    import numpy
+    from PIL import Image
+    from dlinkdcs import motion
+except ImportError:
+    numpy = None
+
+
+def jpeg(pixels):
+    out = io.BytesIO()
+    Image.fromarray(pixels).save(out, 'JPEG', quality=95)
+    return out.getvalue()
+
+
+class FakeCamera(object):
+    def __init__(self, images, noisy=False):
+        self.images = images
+        self.noisy = noisy
+        self.taken = 0
+        self.settings = []
+
+    def get_snapshot(self):
+        self.taken += 1
+        if self.noisy:
+            return jpeg(numpy.full((240, 320), 20 if self.taken % 2 else 230,
+                                   numpy.uint8))
+        return self.images[self.taken % len(self.images)]
+
+    def set_motion_detection_blockset(self, blockset):
+        self.settings.append(blockset)
+
+    def set_motion_detection_sensitivity(self, sensitivity):
+        self.settings.append(sensitivity)
+
+
+@unittest.skipIf(numpy is None, 'requires numpy and Pillow')
+class TestMotion(unittest.TestCase):
+    def setUp(self):
+        # static scene with a flickering top left cell, like a tree in wind
+        self.images = []
+        for i in range(10):
+            pixels = numpy.full((240, 320), 100, numpy.uint8)
+            pixels[:48, :64] = 20 if i % 2 else 230
+            self.images.append(jpeg(pixels))
+
+    def test_cell_activity(self):
+        activity = motion.cell_activity(motion.decode_frames(self.images))
+        self.assertEqual(activity.shape, (9, 5, 5))
+        self.assertTrue((activity[:, 0, 0] > 0.9).all())
+        self.assertTrue((activity[:, 2:, 2:] == 0).all())
+
+    def test_analyze(self):
+        r = motion.analyze(self.images)
+        self.assertEqual(r.blockset, '0' + '1' * 24)
+        self.assertEqual(r.sensitivity, 90)
+        with self.assertRaises(ValueError):
+            motion.analyze(self.images[:1])
+
+    def test_suggest_sensitivity(self):
+        activity = numpy.full((9, 5, 5), 0.1)
+        self.assertEqual(motion.suggest_sensitivity(activity, '1' * 25), 50)
+        self.assertEqual(motion.suggest_sensitivity(activity, '1' * 25, scale=200), 70)
+
+    def test_tune_all_noisy(self):
+        camera = FakeCamera(self.images, noisy=True)
+        with self.assertRaises(ValueError):
+            motion.tune(camera, count=4, interval=0, apply=True)
+        self.assertEqual(camera.settings, [])
+        self.assertEqual(motion.tune(camera, count=4, interval=0).blockset, '0' * 25)
+        with self.assertRaises(ValueError):
+            motion.tune(camera, count=1, interval=0)
+
+
+if __name__ == '__main__':
+    unittest.main()
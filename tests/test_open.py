@@ -0,0 +1,112 @@
+import time
+import unittest
+
+import requests
+
+from dlinkdcs import DlinkDCSCamera
+
+from tests.helpers import CameraServer
+
+
+class TestDlinkDCSCameraOpen(unittest.TestCase):
+    def setUp(self):
+        self.server = CameraServer({
+            'cgiversion.cgi': {'CGIVersion': '2.1.8'},
+            'common/info.cgi': {'model': 'DCS-5020L', 'version': '1.15'},
+            'config/stream_info.cgi': {'videos': 'MJPEG', 'resolutions': '640x480'},
+            'motion.cgi': {'MotionDetectionEnable': '0'},
+            'config/ptz_move.cgi': {'p': '167', 't': '25'},
+            'cgi/ptdc.cgi': {},
+            'pantiltcontrol.cgi': {},
+        }, auth='Basic YWRtaW46')
+        self.port = self.server.port
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_prefetch(self):
+        self.server.delays = dict.fromkeys(self.server.settings, 0.2)
+        _getters = ['get_common_info', 'get_stream_info', 'get_motion_detection']
+        _start = time.perf_counter()
+        _camera = DlinkDCSCamera.open('127.0.0.1', 'admin', '', self.port, timeout=5,
+                                      prefetch=_getters)
+        # the getters are sent at the same time after the login check
+        self.assertLess(time.perf_counter() - _start, 0.2 * 3)
+        self.assertEqual(len(self.server.paths), 4)
+        self.assertEqual(_camera.get_common_info()['model'], 'DCS-5020L')
+        self.assertEqual(_camera.get_cgi_version(), {'CGIVersion': '2.1.8'})
+        self.assertEqual(len(self.server.paths), 4)
+        _camera.close()
+
+    def test_setter_invalidates(self):
+        _camera = DlinkDCSCamera.open('127.0.0.1', 'admin', '', self.port, timeout=5,
+                                      prefetch=['get_motion_detection'])
+        _camera.get_motion_detection()['MotionDetectionEnable'] = '1'
+        self.assertEqual(_camera.get_motion_detection(), {'MotionDetectionEnable': '0'})
+        self.assertEqual(len(self.server.paths), 2)
+        _camera.set_motion_detection(True)
+        _camera.get_motion_detection()
+        self.assertEqual(len(self.server.paths), 4)
+        _camera.invalidate()
+        _camera.get_motion_detection()
+        self.assertEqual(len(self.server.paths), 5)
+        _camera.close()
+
+    def test_ptz_move_invalidates(self):
+        _camera = DlinkDCSCamera.open('127.0.0.1', 'admin', '', self.port, timeout=5,
+                                      prefetch=['get_ptz'])
+        _camera.set_ptz_move(10, 0)
+        _camera.get_ptz()
+        self.assertEqual(self.server.paths[-1], '/config/ptz_move.cgi')
+        _camera.set_ptz_move_preset('home')
+        _camera.get_ptz()
+        self.assertEqual(self.server.paths[-1], '/config/ptz_move.cgi')
+        self.assertEqual(len(self.server.paths), 6)
+        _camera.close()
+
+    def test_error_not_cached(self):
+        _camera = DlinkDCSCamera.open('127.0.0.1', 'admin', '', self.port, timeout=5)
+        _camera.get_sound_detection()
+        _camera.get_sound_detection()
+        self.assertEqual(len(self.server.paths), 3)
+        _camera.close()
+
+    def test_ttl(self):
+        _camera = DlinkDCSCamera.open('127.0.0.1', 'admin', '', self.port, timeout=5,
+                                      prefetch=['get_motion_detection'], ttl=0.1)
+        time.sleep(0.2)
+        _camera.get_motion_detection()
+        self.assertEqual(len(self.server.paths), 3)
+        _camera.close()
+
+    def test_prefetch_errors(self):
+        _camera = DlinkDCSCamera('127.0.0.1', 'admin', '', self.port, timeout=5)
+        with self.assertRaises(ValueError):
+            _camera.prefetch(['set_motion_detection'])
+        _camera.port = 1
+        _errors = _camera.prefetch(['get_common_info'])
+        self.assertEqual(list(_errors), ['get_common_info'])
+
+    def test_login_failure(self):
+        _closed = []
+
+        class Camera(DlinkDCSCamera):
+            def close(self):
+                _closed.append(self._session)
+                DlinkDCSCamera.close(self)
+
+        with self.assertRaises(requests.HTTPError):
+            Camera.open('127.0.0.1', '', '', self.port, timeout=5)
+        self.assertEqual(len(_closed), 1)
+        self.assertIsNotNone(_closed[0])
+
+    def test_uncached(self):
+        _camera = DlinkDCSCamera('127.0.0.1', 'admin', '', self.port, timeout=5)
+        _camera.get_cgi_version()
+        _camera.get_cgi_version()
+        self.assertEqual(len(self.server.paths), 2)
+        _camera.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
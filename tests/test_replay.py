@@ -0,0 +1,74 @@
+import os
+import tempfile
+import unittest
+
+from dlinkdcs import DlinkDCSCamera
+from dlinkdcs.replay import ReplayServer, TrafficRecorder, read_capture, replay
+
+from tests.helpers import response_camera
+
+
+class TestReplay(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.directory.name, 'traffic.dcap')
+        self.cameras = [response_camera('192.168.1.%d' % _i, {
+            'motion.cgi': 'motion.cgi=192.168.1.%d\n' % _i,
+            'upload.cgi': 'FTPUserName=cam\r\nFTPPassword=secret\r\nFTPPort=21\r\n',
+        }) for _i in (1, 2)]
+        with TrafficRecorder(self.filename):
+            for _camera in self.cameras:
+                _camera.get_motion_detection()
+                _camera.set_motion_detection_sensitivity(80)
+        # not recorded once stopped
+        self.cameras[0].get_upload()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_capture(self):
+        _exchanges = list(read_capture(self.filename))
+        self.assertEqual([(_e.camera, _e.cmd) for _e in _exchanges], [
+            ('192.168.1.1_80', 'motion.cgi'), ('192.168.1.1_80', 'motion.cgi'),
+            ('192.168.1.2_80', 'motion.cgi'), ('192.168.1.2_80', 'motion.cgi')])
+        self.assertEqual(_exchanges[1].query,
+                         'MotionDetectionSensitivity=80&ConfigReboot=no')
+        self.assertEqual(_exchanges[2].body, b'motion.cgi=192.168.1.2\n')
+        self.assertEqual(DlinkDCSCamera.command_hooks, [])
+
+    def test_passwords_masked(self):
+        with TrafficRecorder(self.filename):
+            self.cameras[0].get_upload()
+            self.cameras[0].set_upload_server('ftp.example.com', 'cam', 'secret')
+        _exchanges = list(read_capture(self.filename))[4:]
+        self.assertEqual(_exchanges[0].body,
+                         b'FTPUserName=cam\r\nFTPPassword=********\r\nFTPPort=21\r\n')
+        self.assertIn('FTPPassword=%2A%2A%2A%2A%2A%2A%2A%2A', _exchanges[1].query)
+        with open(self.filename, 'rb') as _file:
+            self.assertNotIn(b'secret', _file.read())
+
+    def test_truncated(self):
+        with open(self.filename, 'rb') as _file:
+            _data = _file.read()
+        # a crash while the last record was written
+        with open(self.filename, 'wb') as _file:
+            _file.write(_data[:-5])
+        self.assertEqual(len(list(read_capture(self.filename))), 3)
+
+    def test_replay(self):
+        _exchanges = list(read_capture(self.filename))
+        _server = ReplayServer(_exchanges)
+        self.assertEqual(_server.response('sim-3', 'motion.cgi', '').body,
+                         b'motion.cgi=192.168.1.2\n')
+        _server.start()
+        try:
+            _stats = replay(_exchanges, _server.port, cameras=10, speed=100, seed=1)
+        finally:
+            _server.stop()
+        self.assertEqual(_stats.requests, 20)
+        self.assertEqual(_stats.errors, 0)
+        self.assertIsNotNone(_stats.p99)
+
+
+if __name__ == '__main__':
+    unittest.main()
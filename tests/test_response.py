@@ -0,0 +1,28 @@
+import unittest
+
+from dlinkdcs.response import EntryList, iter_entries, iter_pairs
+
+
+class TestResponse(unittest.TestCase):
+
+    def test_iter_pairs(self):
+        r = list(iter_pairs(['<result>', 'a=1', '', 'b=x=y', 'a=2', '</result>']))
+        self.assertEqual(r, [('a', '1'), ('b', 'x=y'), ('a', '2')])
+
+    def test_iter_entries_repeated_key(self):
+        r = list(iter_entries([('n', 'a'), ('p', '1'), ('n', 'b'), ('p', '2')]))
+        self.assertEqual(r, [{'n': 'a', 'p': '1'}, {'n': 'b', 'p': '2'}])
+
+    def test_iter_entries_entry_key(self):
+        r = list(iter_entries([('UserName', 'a'), ('UserName', 'b')], 'UserName'))
+        self.assertEqual(r, [{'UserName': 'a'}, {'UserName': 'b'}])
+
+    def test_entry_list_header(self):
+        r = EntryList.from_pairs(
+            [('home', '167,25'), ('n', 'a'), ('n', 'b')], header_keys=('home',))
+        self.assertEqual(r, [{'n': 'a'}, {'n': 'b'}])
+        self.assertEqual(r.header, {'home': '167,25'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import json
+import os
+import tempfile
+import unittest
+
+from dlinkdcs.rollout import (
+    COMPLETED, DlinkDCSRollout, FAILED, RESTORED, ROLLED_BACK, VERIFIED)
+
+from tests.helpers import settings_camera
+
+
+def fake_cameras(count):
+    return [settings_camera('192.168.1.%d' % (_i + 1), {
+        'motion.cgi': {'MotionDetectionEnable': '0', 'MotionDetectionSensitivity': '50'},
+    }) for _i in range(count)]
+
+
+CHANGE = [
+    ('set_motion_detection', [True]),
+    {'method': 'set_motion_detection_sensitivity', 'args': [80]},
+]
+
+
+class TestDlinkDCSRollout(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.state_file = os.path.join(self.directory.name, 'rollout.json')
+        self.cameras = fake_cameras(10)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_waves(self):
+        _rollout = DlinkDCSRollout(self.cameras, CHANGE, canary=1, growth=2, max_wave=4)
+        self.assertEqual([len(_w) for _w in _rollout.waves()], [1, 2, 4, 3])
+
+    def test_run(self):
+        _progress = []
+        _rollout = DlinkDCSRollout(self.cameras, CHANGE, self.state_file,
+                                   on_progress=_progress.append)
+        self.assertEqual(_rollout.run(), COMPLETED)
+        for _camera in self.cameras:
+            self.assertEqual(_camera.settings['motion.cgi'], {
+                'MotionDetectionEnable': '1', 'MotionDetectionSensitivity': '80'})
+        self.assertEqual(len(_progress), 10)
+        self.assertEqual(_progress[-1].done, 10)
+        with open(self.state_file) as _file:
+            self.assertEqual(json.load(_file)['status'], COMPLETED)
+
+    def test_rollback(self):
+        # cameras in the third wave do not apply the change
+        for _camera in self.cameras[3:]:
+            _camera.ignore = True
+        _rollout = DlinkDCSRollout(self.cameras, CHANGE, self.state_file)
+        self.assertEqual(_rollout.run(), ROLLED_BACK)
+        _states = {_n: _c['state'] for _n, _c in _rollout.state['cameras'].items()}
+        self.assertEqual(list(_states.values()).count(RESTORED), 7)
+        for _camera in self.cameras:
+            self.assertEqual(_camera.settings['motion.cgi'], {
+                'MotionDetectionEnable': '0', 'MotionDetectionSensitivity': '50'})
+
+    def test_resume(self):
+        _rollout = DlinkDCSRollout(self.cameras[:3], CHANGE, self.state_file)
+        self.assertEqual(_rollout.run(), COMPLETED)
+        # state of a wave interrupted after the first three cameras
+        with open(self.state_file) as _file:
+            _state = json.load(_file)
+        _state['status'] = 'running'
+        with open(self.state_file, 'w') as _file:
+            json.dump(_state, _file)
+        _rollout = DlinkDCSRollout(self.cameras, CHANGE, self.state_file)
+        self.assertEqual(sum(len(_w) for _w in _rollout.waves()), 7)
+        self.assertEqual(_rollout.state['cameras']['192.168.1.1_80']['state'], VERIFIED)
+        self.assertEqual(_rollout.run(), COMPLETED)
+        with self.assertRaises(ValueError):
+            DlinkDCSRollout(self.cameras, CHANGE[:1], self.state_file)
+
+    def test_validation(self):
+        with self.assertRaises(ValueError):
+            DlinkDCSRollout(self.cameras, [('set_motion_detection_sensitivity', [101])])
+        with self.assertRaises(ValueError):
+            DlinkDCSRollout(self.cameras, [('get_motion_detection',)])
+        with self.assertRaises(ValueError):
+            DlinkDCSRollout(self.cameras, [('set_ptz_move', [1, 1])])
+
+    def test_failed_capture(self):
+        _camera = self.cameras[0]
+        _camera.settings = None
+        _rollout = DlinkDCSRollout([_camera], CHANGE, max_error_rate=1)
+        self.assertEqual(_rollout.run(), COMPLETED)
+        self.assertEqual(_rollout.state['cameras']['192.168.1.1_80']['state'], FAILED)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import datetime
+import unittest
+
+from dlinkdcs import DlinkDCSCamera as ipcam
+from dlinkdcs.schedule import (
+    DAY_NIGHT, DayNightSchedule, FeatureSchedule, ScheduleIndex)
+
+
+WEEKDAYS = ipcam.MONDAY + ipcam.TUESDAY + ipcam.WEDNESDAY + ipcam.THURSDAY + ipcam.FRIDAY
+
+# 2024-01-01 is a Monday
+MONDAY_NOON = datetime.datetime(2024, 1, 1, 12, 0, 0)
+SUNDAY_NOON = datetime.datetime(2024, 1, 7, 12, 0, 0)
+
+
+class FakeCamera(object):
+    def __init__(self, motion):
+        self.motion = motion
+        self.calls = []
+
+    def get_motion_detection(self):
+        return self.motion
+
+    def set_motion_detection_schedule(self, *args):
+        self.calls.append(args)
+
+
+class TestSchedule(unittest.TestCase):
+    def setUp(self):
+        self.index = ScheduleIndex()
+        self.office = object()
+        self.night = object()
+        self.weekend = object()
+        self.index.add(self.office, FeatureSchedule(
+            'motion_detection', WEEKDAYS, '08:00:00', '18:00:00'))
+        self.index.add(self.night, FeatureSchedule(
+            'motion_detection', 127, '22:00:00', '06:00:00'))
+        self.index.add(self.weekend, FeatureSchedule(
+            'motion_detection', ipcam.SUNDAY + ipcam.SATURDAY, '00:00:00', '00:00:00'))
+
+    def test_active(self):
+        self.assertEqual(self.index.active('motion_detection', MONDAY_NOON),
+                         frozenset([self.office]))
+        self.assertEqual(self.index.active('motion_detection', SUNDAY_NOON),
+                         frozenset([self.weekend]))
+        self.assertEqual(
+            self.index.active('motion_detection', MONDAY_NOON.replace(hour=3)),
+            frozenset([self.night]))
+        self.assertEqual(self.index.active('sound_detection', MONDAY_NOON), frozenset())
+
+    def test_active_wraps_week(self):
+        saturday_night = datetime.datetime(2024, 1, 6, 23, 0, 0)
+        self.assertEqual(self.index.active('motion_detection', saturday_night),
+                         frozenset([self.night, self.weekend]))
+        self.assertEqual(
+            self.index.active('motion_detection', SUNDAY_NOON.replace(hour=5)),
+            frozenset([self.night, self.weekend]))
+
+    def test_active_between(self):
+        r = self.index.active_between(
+            'motion_detection', MONDAY_NOON, MONDAY_NOON + datetime.timedelta(hours=11))
+        self.assertEqual(r, frozenset([self.office, self.night]))
+
+    def test_disabled(self):
+        self.index.add(self.office, FeatureSchedule(
+            'motion_detection', WEEKDAYS, '08:00:00', '18:00:00', enabled=False))
+        self.assertEqual(self.index.active('motion_detection', MONDAY_NOON), frozenset())
+
+    def test_day_night(self):
+        times = [('18:00', '07:00')] * 7
+        self.index.add(self.office, DayNightSchedule(times, ipcam.DAY_NIGHT_SCHEDULE))
+        self.assertEqual(self.index.active(DAY_NIGHT, MONDAY_NOON.replace(hour=20)),
+                         frozenset([self.office]))
+        self.assertEqual(self.index.active(DAY_NIGHT, MONDAY_NOON), frozenset())
+
+    def test_load_and_apply(self):
+        camera = FakeCamera({
+            'MotionDetectionEnable': '1',
+            'MotionDetectionScheduleMode': '1',
+            'MotionDetectionScheduleDay': '62',
+            'MotionDetectionScheduleTimeStart': '08:00:00',
+            'MotionDetectionScheduleTimeStop': '18:00:00',
+        })
+        index = ScheduleIndex()
+        index.load(camera, ['motion_detection'])
+        self.assertTrue(camera in index.active('motion_detection', MONDAY_NOON))
+        self.assertEqual(index.changed(), [])
+        index.add(camera, FeatureSchedule('motion_detection', 62, '09:00:00', '17:00:00'))
+        index.apply()
+        self.assertEqual(camera.calls, [(62, '09:00:00', '17:00:00')])
+        self.assertEqual(index.changed(), [])
+        # edits reach the index only through add()
+        schedule = index.schedule(camera, 'motion_detection')
+        schedule.days = 0
+        self.assertEqual(index.changed(), [])
+        self.assertTrue(camera in index.active('motion_detection', MONDAY_NOON))
+        index.add(camera, schedule)
+        schedule.days = 62
+        self.assertEqual(index.changed(), [(camera, FeatureSchedule(
+            'motion_detection', 0, '09:00:00', '17:00:00'))])
+        self.assertFalse(camera in index.active('motion_detection', MONDAY_NOON))
+
+
+if __name__ == '__main__':
+    unittest.main()
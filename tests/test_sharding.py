@@ -0,0 +1,92 @@
+import unittest
+
+from dlinkdcs import DlinkDCSCamera
+from dlinkdcs.sharding import DlinkDCSShardedFleet, HashRing, ShardError
+
+from tests.helpers import CameraServer
+
+
+class TestHashRing(unittest.TestCase):
+    def test_stable(self):
+        _keys = ['192.168.1.%d:80' % _i for _i in range(1000)]
+        _ring = HashRing(range(4))
+        _before = {_key: _ring.node(_key) for _key in _keys}
+        self.assertEqual(set(_before.values()), {0, 1, 2, 3})
+        _ring.add(4)
+        _moved = [_k for _k in _keys if _ring.node(_k) != _before[_k]]
+        # only keys taken over by the new node move
+        self.assertTrue(all(_ring.node(_k) == 4 for _k in _moved))
+        self.assertLess(len(_moved), 350)
+        _ring.remove(4)
+        self.assertEqual({_key: _ring.node(_key) for _key in _keys}, _before)
+
+
+class TestDlinkDCSShardedFleet(unittest.TestCase):
+    def setUp(self):
+        self.server = CameraServer({'cgiversion.cgi': {'CGIVersion': '2.1.8'}})
+        _port = self.server.port
+        self.cameras = [DlinkDCSCamera('127.0.0.1', 'admin', '', _port, timeout=5)]
+        # two names for the local server
+        self.cameras.append(DlinkDCSCamera('localhost', 'admin', '', _port, timeout=5))
+        self.fleet = DlinkDCSShardedFleet(self.cameras, processes=2, workers=2)
+
+    def tearDown(self):
+        self.fleet.close()
+        self.server.stop()
+
+    def test_run(self):
+        _results = {_r.camera: _r for _r in self.fleet.run('get_cgi_version')}
+        self.assertEqual(set(_results), set(self.cameras))
+        for _result in _results.values():
+            self.assertEqual(_result.result, {'CGIVersion': '2.1.8'})
+        _errors = list(self.fleet.run('no_such_method'))
+        self.assertEqual(len(_errors), 2)
+        self.assertIsInstance(_errors[0].error, ShardError)
+
+    def test_update_and_resize(self):
+        _shard = self.fleet.shard(self.cameras[0])
+        self.fleet.update(self.cameras[:1])
+        self.assertEqual(self.fleet.shard(self.cameras[0]), _shard)
+        self.assertEqual([_r.camera for _r in self.fleet.run('get_cgi_version')],
+                         self.cameras[:1])
+        self.fleet.resize(1)
+        self.assertEqual(self.fleet.processes, 1)
+        self.assertEqual(len(list(self.fleet.run('get_cgi_version'))), 1)
+
+    def test_update_while_running(self):
+        _results = []
+        for _result in self.fleet.run('get_cgi_version'):
+            _results.append(_result.camera)
+            # these waited for the run to finish while it held the lock
+            self.fleet.update(self.cameras[:1])
+            self.fleet.resize(1)
+            with self.assertRaises(RuntimeError):
+                next(self.fleet.run('get_cgi_version'))
+        self.assertEqual(sorted(_results, key=self.cameras.index), self.cameras)
+        self.assertEqual([_r.camera for _r in self.fleet.run('get_cgi_version')],
+                         self.cameras[:1])
+
+    def test_worker_exited(self):
+        _state = self.fleet._shards[self.fleet.shard(self.cameras[0])]
+        _state.process.kill()
+        _state.process.join()
+        _state.process.is_alive = lambda: True
+        with self.assertLogs('DlinkDCSShardedFleet', 'WARNING'):
+            _results = {_r.camera: _r for _r in self.fleet.run('get_cgi_version')}
+            self.assertEqual(set(_results), set(self.cameras))
+            self.assertEqual(_results[self.cameras[0]].error.error_type,
+                             'WorkerExited')
+            # the next run restarts the worker
+            del _state.process.is_alive
+            _results = list(self.fleet.run('get_cgi_version'))
+        self.assertEqual(len(_results), 2)
+        self.assertTrue(all(_r.error is None for _r in _results))
+
+    def test_stop_early(self):
+        for _result in self.fleet.run('get_cgi_version'):
+            break
+        self.assertEqual(len(list(self.fleet.run('get_cgi_version'))), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+import asyncio
+import os
+import smtplib
+import tempfile
+import threading
+import time
+import unittest
+
+from email.message import EmailMessage
+
+from dlinkdcs import DlinkDCSCamera, DlinkDCSEmailReceiver
+
+
+class TestDlinkDCSEmailReceiver(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.events = []
+        self.receiver = DlinkDCSEmailReceiver(
+            '127.0.0.1', 0, directory=self.directory.name,
+            on_event=self.events.append)
+        self.camera = DlinkDCSCamera('192.168.1.101', 'admin', '')
+        self.loop = asyncio.new_event_loop()
+        self.loop.run_until_complete(self.receiver.start())
+        self.thread = threading.Thread(target=self.loop.run_forever)
+        self.thread.start()
+
+    def tearDown(self):
+        asyncio.run_coroutine_threadsafe(self.receiver.stop(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+        self.directory.cleanup()
+
+    def message(self):
+        msg = EmailMessage()
+        msg['Subject'] = 'Motion Detected'
+        msg['From'] = 'camera@example.com'
+        msg['To'] = 'receiver@example.com'
+        msg.set_content('motion detected\n')
+        msg.add_attachment(b'\xff\xd8' + bytes(range(256)) * 400, maintype='image',
+                           subtype='jpeg', filename='snapshot.jpg')
+        return msg
+
+    def test_send_authenticated(self):
+        user, password = self.receiver.register(self.camera)
+        with smtplib.SMTP('127.0.0.1', self.receiver.port) as smtp:
+            smtp.login(user, password)
+            smtp.send_message(self.message())
+        self.assertEqual(len(self.events), 1)
+        event = self.events[0]
+        self.assertTrue(event.camera is self.camera)
+        self.assertEqual(event.subject, 'Motion Detected')
+        self.assertTrue('motion detected' in event.text)
+        self.assertEqual(len(event.attachments), 1)
+        attachment = event.attachments[0]
+        self.assertEqual(attachment.filename, 'snapshot.jpg')
+        self.assertEqual(attachment.content_type, 'image/jpeg')
+        self.assertEqual(attachment.size, 2 + 256 * 400)
+        with open(attachment.path, 'rb') as f:
+            self.assertEqual(f.read(), b'\xff\xd8' + bytes(range(256)) * 400)
+
+    def test_send_by_sender(self):
+        _camera = DlinkDCSCamera('127.0.0.1', 'admin', '')
+        self.receiver.register(_camera, sender='camera@example.com')
+        with smtplib.SMTP('127.0.0.1', self.receiver.port) as smtp:
+            smtp.send_message(self.message())
+        self.assertTrue(self.events[0].camera is _camera)
+
+    def test_send_spoofed_sender(self):
+        # the camera is on 192.168.1.101, the message comes from 127.0.0.1
+        self.receiver.register(self.camera, sender='camera@example.com')
+        with self.assertLogs('DlinkDCSEmailReceiver', 'WARNING'):
+            with smtplib.SMTP('127.0.0.1', self.receiver.port) as smtp:
+                with self.assertRaises(smtplib.SMTPSenderRefused):
+                    smtp.send_message(self.message())
+        self.assertEqual(self.events, [])
+
+    def test_line_too_long(self):
+        user, password = self.receiver.register(self.camera)
+        with smtplib.SMTP('127.0.0.1', self.receiver.port) as smtp:
+            smtp.login(user, password)
+            smtp.send(b'NOOP ' + b'x' * 100000 + b'\r\n')
+            self.assertEqual(smtp.getreply()[0], 500)
+
+    def test_connection_dropped(self):
+        user, password = self.receiver.register(self.camera)
+        _data = self.message().as_bytes().replace(b'\n', b'\r\n')
+        smtp = smtplib.SMTP('127.0.0.1', self.receiver.port)
+        smtp.login(user, password)
+        smtp.mail('camera@example.com')
+        smtp.rcpt('receiver@example.com')
+        smtp.putcmd('data')
+        self.assertEqual(smtp.getreply()[0], 354)
+        smtp.send(_data[:len(_data) - 1000])
+        self.assertTrue(self.wait_files(lambda _files: _files))
+        smtp.close()
+        self.assertTrue(self.wait_files(lambda _files: not _files))
+        self.assertEqual(self.events, [])
+
+    def wait_files(self, condition):
+        for _ in range(200):
+            _files = [_name for _dir, _dirs, _names in os.walk(self.directory.name)
+                      for _name in _names]
+            if condition(_files):
+                return True
+            time.sleep(0.01)
+        return False
+
+    def test_push_email_to(self):
+        _calls = []
+
+        class Camera(DlinkDCSCamera):
+            def set_email_account(self, *args, **kwargs):
+                _calls.append((args, kwargs))
+
+        _registered = []
+        _register = self.receiver.register
+        self.receiver.register = (
+            lambda *args: _registered.append(args) or _register(*args))
+        _camera = Camera('192.168.1.102', 'admin', '')
+        _camera.push_email_to(self.receiver)
+        self.assertEqual(len(_registered), 1)
+        _user = _calls[0][0][1]
+        self.assertEqual(_calls[0][0][3], '%s@127.0.0.1' % _user)
+        self.assertTrue(self.receiver.camera_for_sender(_calls[0][0][3]) is _camera)
+
+    def test_send_unknown(self):
+        with smtplib.SMTP('127.0.0.1', self.receiver.port) as smtp:
+            with self.assertRaises(smtplib.SMTPSenderRefused):
+                smtp.send_message(self.message())
+        self.assertEqual(self.events, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+import os
+import tempfile
+import unittest
+
+try:
+    import numpy
+    from dlinkdcs.telemetry import TelemetryStore
+except ImportError:
+    numpy = None
+
+
+@unittest.skipIf(numpy is None, 'requires numpy')
+class TestTelemetryStore(unittest.TestCase):
+    def fill(self, store):
+        for i in range(10):
+            store.record('cam1', 'SignalStrength', 50 + i, 1000 + i)
+            store.record('cam2', 'SignalStrength', 80 - i, 1000 + i)
+
+    def test_ring_buffer(self):
+        store = TelemetryStore(capacity=4)
+        self.fill(store)
+        times, values = store.series('cam1', 'SignalStrength')
+        self.assertEqual(list(times), [1006, 1007, 1008, 1009])
+        self.assertEqual(list(values), [56, 57, 58, 59])
+
+    def test_rollup(self):
+        store = TelemetryStore(capacity=100)
+        self.fill(store)
+        store.record('cam3', 'SignalStrength', 10, 0)
+        r = store.rollup('SignalStrength', 3, now=1009)
+        self.assertEqual(r.cameras, ['cam1', 'cam2', 'cam3'])
+        self.assertEqual(list(r.min[:2]), [56, 71])
+        self.assertEqual(list(r.max[:2]), [59, 74])
+        self.assertEqual(list(r.mean[:2]), [57.5, 72.5])
+        self.assertEqual(list(r.count), [4, 4, 0])
+        self.assertEqual(store.fleet_rollup('SignalStrength', 3, now=1009), (56, 74, 65))
+
+    def test_record_response(self):
+        store = TelemetryStore()
+        store.record_response('cam1', {'SignalStrength': '75', 'SSID': 'home',
+                                       'Channel': '6'},
+                              ['SignalStrength', 'SSID', 'Mode'], 5)
+        self.assertEqual(store.metrics(), ['SignalStrength'])
+
+    def test_persistence(self):
+        with tempfile.TemporaryDirectory() as directory:
+            store = TelemetryStore(capacity=8, max_cameras=4, directory=directory)
+            self.fill(store)
+            store.flush()
+            del store
+            store = TelemetryStore(capacity=8, max_cameras=4, directory=directory)
+            times, values = store.series('cam2', 'SignalStrength')
+            self.assertEqual(list(values), [78, 77, 76, 75, 74, 73, 72, 71])
+            del store
+            with self.assertRaises(ValueError):
+                TelemetryStore(capacity=16, max_cameras=4, directory=directory)
+
+    def test_persistence_shape(self):
+        with tempfile.TemporaryDirectory() as directory:
+            store = TelemetryStore(capacity=8, max_cameras=4, directory=directory)
+            self.fill(store)
+            del store
+            # the index is written without a flush
+            with self.assertRaises(ValueError):
+                TelemetryStore(capacity=8, max_cameras=8, directory=directory)
+            os.remove(os.path.join(directory, 'cameras.json'))
+            # arrays without the index
+            with self.assertRaises(ValueError):
+                TelemetryStore(capacity=8, max_cameras=8, directory=directory)._metric(
+                    'SignalStrength')
+
+    def test_index_without_flush(self):
+        with tempfile.TemporaryDirectory() as directory:
+            store = TelemetryStore(capacity=8, max_cameras=4, directory=directory)
+            store.record('cam1', 'SignalStrength', 70, 1)
+            store.record('cam2', 'SignalStrength', 80, 1)
+            # as after a crash, the rows keep their cameras
+            store = TelemetryStore(capacity=8, max_cameras=4, directory=directory)
+            self.assertEqual(store.cameras(), ['cam1', 'cam2'])
+            self.assertEqual(store.metrics(), ['SignalStrength'])
+            store.record('cam3', 'SignalStrength', 90, 2)
+            self.assertEqual(list(store.series('cam2', 'SignalStrength')[1]), [80])
+
+
+if __name__ == '__main__':
+    unittest.main()
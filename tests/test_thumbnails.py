@@ -0,0 +1,76 @@
+import io
+import unittest
+
+from dlinkdcs import DlinkDCSCamera, DlinkDCSFleet
+
+try:
+    from PIL import Image
+    from dlinkdcs.thumbnails import ThumbnailPipeline, render
+except ImportError:
+    Image = None
+
+
+def jpeg(size, color):
+    out = io.BytesIO()
+    Image.new('RGB', size, color).save(out, 'JPEG', quality=95)
+    return out.getvalue()
+
+
+@unittest.skipIf(Image is None, 'requires Pillow')
+class TestThumbnails(unittest.TestCase):
+    def test_render(self):
+        _size, _thumbnails = render(jpeg((640, 480), 'red'), [(160, 120), (64, 64)])
+        self.assertEqual(_size, (640, 480))
+        self.assertEqual(Image.open(io.BytesIO(_thumbnails[0])).size, (160, 120))
+        self.assertEqual(Image.open(io.BytesIO(_thumbnails[1])).size, (64, 48))
+
+    def test_pipeline(self):
+        _images = [jpeg((640, 480), (_i * 20, 0, 0)) for _i in range(10)]
+        with ThumbnailPipeline([(160, 120), (32, 24)], processes=2, slots=3,
+                               slot_size=8192, queue_size=2) as _pipeline:
+            for _i, _image in enumerate(_images):
+                # more snapshots than slots and queue, consumed as they finish
+                if _i >= 4:
+                    _thumbnail = _pipeline.get(timeout=30)
+                    self.assertEqual(_thumbnail.camera, _i - 4)
+                _pipeline.submit(_i, _image)
+            _pipeline.submit('bad', b'not a jpeg')
+            for _i in range(6, 10):
+                _thumbnail = _pipeline.get(timeout=30)
+                self.assertEqual(_thumbnail.camera, _i)
+                self.assertEqual(_thumbnail.size, (640, 480))
+                _small = Image.open(io.BytesIO(_thumbnail.images[(32, 24)]))
+                self.assertEqual(_small.size, (32, 24))
+            _bad = _pipeline.get(timeout=30)
+            self.assertEqual(_bad.camera, 'bad')
+            self.assertIsNotNone(_bad.error)
+
+    def test_large_snapshot(self):
+        with ThumbnailPipeline(processes=1, slots=1, slot_size=16) as _pipeline:
+            _pipeline.submit('camera', jpeg((320, 240), 'blue'))
+            _thumbnail = _pipeline.get(timeout=30)
+            self.assertIsNone(_thumbnail.error)
+            self.assertIn((160, 120), _thumbnail.images)
+
+    def test_capture(self):
+        class _Camera(DlinkDCSCamera):
+            def get_snapshot(self):
+                if self.port == 1:
+                    raise ConnectionError('camera offline')
+                return jpeg((320, 240), (self.port, 0, 0))
+
+        _cameras = [_Camera('192.168.1.%d' % _i, 'admin', '', _i) for _i in range(1, 7)]
+        # more cameras than slots and queue together
+        with ThumbnailPipeline(processes=1, slots=1, queue_size=1) as _pipeline:
+            _thumbnails = list(_pipeline.capture(DlinkDCSFleet(_cameras, workers=3)))
+            self.assertEqual(sorted(_t.camera.port for _t in _thumbnails),
+                             [1, 2, 3, 4, 5, 6])
+            self.assertEqual([_t.camera.port for _t in _thumbnails if _t.error], [1])
+            # stopping early leaves the pipeline usable
+            for _thumbnail in _pipeline.capture(DlinkDCSFleet(_cameras, workers=3)):
+                break
+            self.assertEqual(len(list(_pipeline.capture(DlinkDCSFleet(_cameras)))), 6)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+import tempfile
+import time
+import unittest
+
+from dlinkdcs.timelapse import FrameStore, TimeLapseRecorder, camera_id
+
+from tests.helpers import SnapshotCamera
+
+
+class TestFrameStore(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = FrameStore(self.directory.name, max_open_files=1)
+        self.day = 1700006400.0  # 2023-11-15 00:00:00 UTC
+        for i in range(100):
+            self.store.append('cam1', self.day + i * 60, b'frame%d' % i)
+            self.store.append('cam2', self.day + i * 60, b'other%d' % i)
+
+    def tearDown(self):
+        self.store.close()
+        self.directory.cleanup()
+
+    def test_find(self):
+        r = self.store.find('cam1', self.day + 10 * 60)
+        self.assertEqual(r.image, b'frame10')
+        r = self.store.find('cam1', self.day + 10 * 60 + 59)
+        self.assertEqual(r.image, b'frame10')
+        r = self.store.find('cam2', self.day + 99 * 60)
+        self.assertEqual(r.image, b'other99')
+
+    def test_find_missing(self):
+        self.assertEqual(self.store.find('cam1', self.day - 1), None)
+        self.assertEqual(self.store.find('cam3', self.day), None)
+
+    def test_frames(self):
+        r = list(self.store.frames('cam1', self.day + 60, self.day + 4 * 60))
+        self.assertEqual([f.image for f in r], [b'frame1', b'frame2', b'frame3'])
+
+    def test_frames_across_days(self):
+        self.store.append('cam1', self.day + 86400 + 30, b'tomorrow')
+        r = list(self.store.frames('cam1', self.day + 99 * 60, self.day + 86400 + 60))
+        self.assertEqual([f.image for f in r], [b'frame99', b'tomorrow'])
+
+    def test_frames_boundaries(self):
+        # closer to the boundaries than a fixed epsilon can tell apart
+        _end = self.day + 4 * 60
+        self.store.append('cam3', self.day + 60, b'start')
+        self.store.append('cam3', _end - 2.5e-7, b'before end')
+        self.store.append('cam3', _end, b'end')
+        r = list(self.store.frames('cam3', self.day + 60, _end))
+        self.assertEqual([f.image for f in r], [b'start', b'before end'])
+        r = list(self.store.frames('cam3', self.day + 60 + 2.5e-7, _end + 2.5e-7))
+        self.assertEqual([f.image for f in r], [b'before end', b'end'])
+
+
+class TestTimeLapseRecorder(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = FrameStore(self.directory.name)
+        self.cameras = []
+        for _i in range(2):
+            _camera = SnapshotCamera('192.168.1.%d' % (_i + 1), 'admin', '')
+            _camera.snapshots = 0
+            self.cameras.append(_camera)
+
+    def tearDown(self):
+        self.store.close()
+        self.directory.cleanup()
+
+    def test_run(self):
+        _recorder = TimeLapseRecorder(self.cameras, self.store, interval=0.01)
+        _start = time.time()
+        _recorder.run(count=3)
+        for _camera in self.cameras:
+            r = list(self.store.frames(camera_id(_camera), _start, time.time() + 1))
+            self.assertEqual([f.image for f in r],
+                             [b'snapshot1', b'snapshot2', b'snapshot3'])
+
+    def test_record_once_errors(self):
+        self.cameras[1].snapshots = None
+        _recorder = TimeLapseRecorder(self.cameras, self.store)
+        with self.assertLogs('DlinkDCSTimeLapse', 'WARNING'):
+            self.assertEqual(_recorder.record_once(), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+import json
+import os
+import tempfile
+import unittest
+
+from unittest import mock
+
+from dlinkdcs import DlinkDCSCamera
+from dlinkdcs.tracing import Tracer
+
+from tests.helpers import CameraServer
+
+
+class TestTracer(unittest.TestCase):
+    def setUp(self):
+        self.server = CameraServer({'cgiversion.cgi': {'CGIVersion': '2.1.8'},
+                                    'slow.cgi': {'CGIVersion': '2.1.8'}})
+        self.server.delays['slow.cgi'] = 0.2
+        _port = self.server.port
+        self.camera = DlinkDCSCamera('localhost', 'admin', '', _port, timeout=5)
+        self.directory = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.directory.name, 'trace.json')
+
+    def tearDown(self):
+        self.camera.close()
+        self.server.stop()
+        self.directory.cleanup()
+
+    def events(self):
+        with open(self.filename) as _file:
+            return json.load(_file)
+
+    def test_phases(self):
+        with Tracer(self.filename) as _tracer:
+            self.assertEqual(self.camera.get_cgi_version(), {'CGIVersion': '2.1.8'})
+            self.camera.get_cgi_version()
+        self.assertIsNone(DlinkDCSCamera.tracer)
+        self.assertEqual(_tracer.traced, 2)
+        _events = self.events()
+        self.assertEqual(_events[0]['args'], {'name': 'localhost_%d' % self.camera.port})
+        _commands = [_e for _e in _events if _e.get('cat') == 'command']
+        self.assertEqual([_e['name'] for _e in _commands], ['cgiversion.cgi'] * 2)
+        _phases = [_e['name'] for _e in _events if _e.get('cat') == 'phase']
+        # the second command reuses the connection
+        self.assertEqual(_phases, ['auth', 'dns', 'connect', 'ttfb', 'body', 'parse',
+                                   'auth', 'ttfb', 'body', 'parse'])
+        for _phase in _events[2:8]:
+            self.assertGreaterEqual(_phase['ts'], _commands[0]['ts'])
+            self.assertLessEqual(_phase['ts'] + _phase['dur'],
+                                 _commands[0]['ts'] + _commands[0]['dur'] + 1)
+
+    def test_adapter_restored(self):
+        self.camera.get_cgi_version()
+        _adapter = self.camera.session.adapters['http://']
+        with mock.patch.object(_adapter, 'close') as _close:
+            with Tracer(self.filename):
+                self.camera.get_cgi_version()
+                self.assertIsNot(self.camera.session.adapters['http://'], _adapter)
+            self.assertIs(self.camera.session.adapters['http://'], _adapter)
+            self.assertEqual(self.camera.get_cgi_version(), {'CGIVersion': '2.1.8'})
+        _close.assert_not_called()
+
+    def test_threshold(self):
+        with Tracer(self.filename, threshold=0.1) as _tracer:
+            self.camera.get_cgi_version()
+            self.camera.send_command('slow.cgi')
+        self.assertEqual((_tracer.traced, _tracer.sampled_out), (1, 1))
+        _commands = [_e for _e in self.events() if _e.get('cat') == 'command']
+        self.assertEqual([_e['name'] for _e in _commands], ['slow.cgi'])
+
+    def test_error(self):
+        self.camera.port = 1
+        with Tracer(self.filename, threshold=10) as _tracer:
+            with self.assertRaises(Exception):
+                self.camera.get_cgi_version()
+        self.assertEqual(_tracer.traced, 1)
+        _command = [_e for _e in self.events() if _e.get('cat') == 'command'][0]
+        self.assertIn('ConnectionError', _command['args']['error'])
+
+    def test_other_cameras(self):
+        _other = DlinkDCSCamera('localhost', 'admin', '', 1)
+        with Tracer(self.filename, cameras=[_other]) as _tracer:
+            self.camera.get_cgi_version()
+        self.assertEqual(_tracer.traced, 0)
+        self.assertEqual(self.events(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+import threading
+import unittest
+
+import requests
+
+from dlinkdcs import DlinkDCSCamera, DlinkDCSFleet
+from dlinkdcs.watch import ConfigWatcher, diff
+
+from tests.helpers import ResponseCamera, response_camera
+
+
+class ParsingCamera(ResponseCamera):
+    """Camera counting the responses it parses."""
+
+    __slots__ = ('parsed',)
+
+    def unmarshal_response(self, response):
+        self.parsed += 1
+        return DlinkDCSCamera.unmarshal_response(self, response)
+
+
+def fake_camera(host, responses):
+    _camera = response_camera(host, responses, ParsingCamera)
+    _camera.parsed = 0
+    return _camera
+
+
+class TestConfigWatcher(unittest.TestCase):
+    def setUp(self):
+        self.camera = fake_camera('192.168.1.101', {
+            'motion.cgi': 'MotionDetectionEnable=1\nMotionDetectionSensitivity=70\n',
+            'upload.cgi': 'FTPScheduleEnable=0\n',
+        })
+
+    def test_diff(self):
+        self.assertEqual(diff({'a': '1', 'b': '2', 'c': '3'},
+                              {'a': '1', 'b': '4', 'd': '5'}),
+                         {'b': '4', 'd': '5', 'c': None})
+
+    def test_poll(self):
+        _watcher = ConfigWatcher(['get_motion_detection', 'get_upload'])
+        _changes = _watcher.poll(self.camera)
+        self.assertEqual([_c.endpoint for _c in _changes],
+                         ['get_motion_detection', 'get_upload'])
+        self.assertEqual(_changes[1].changes, {'FTPScheduleEnable': '0'})
+        self.assertEqual(_watcher.poll(self.camera), [])
+        self.assertEqual(self.camera.parsed, 2)
+        self.camera.responses['motion.cgi'] = 'MotionDetectionEnable=0\n'
+        _changes = _watcher.poll(self.camera)
+        self.assertEqual(len(_changes), 1)
+        self.assertEqual(_changes[0].changes, {
+            'MotionDetectionEnable': '0', 'MotionDetectionSensitivity': None})
+        self.assertEqual(self.camera.parsed, 3)
+
+    def test_error_response(self):
+        _watcher = ConfigWatcher(['get_upload'])
+        _watcher.poll(self.camera)
+        for _status in (401, 500):
+            self.camera.responses['upload.cgi'] = _status
+            with self.assertRaises(requests.HTTPError):
+                _watcher.poll(self.camera)
+        self.camera.responses['upload.cgi'] = 'FTPScheduleEnable=0\n'
+        self.assertEqual(_watcher.poll(self.camera), [])
+
+    def test_initial(self):
+        _watcher = ConfigWatcher(['get_upload'], initial=False)
+        self.assertEqual(_watcher.poll(self.camera), [])
+        self.camera.responses['upload.cgi'] = 'FTPScheduleEnable=1\n'
+        self.assertEqual(_watcher.poll(self.camera)[0].changes,
+                         {'FTPScheduleEnable': '1'})
+
+    def test_not_a_getter(self):
+        with self.assertRaises(ValueError):
+            ConfigWatcher(['set_motion_detection'])
+
+    def test_camera_watch(self):
+        _stop = threading.Event()
+        _watch = self.camera.watch(['get_upload'], interval=0, stop=_stop)
+        self.assertEqual(next(_watch).changes, {'FTPScheduleEnable': '0'})
+        self.camera.responses['upload.cgi'] = 'FTPScheduleEnable=1\n'
+        self.assertEqual(next(_watch).changes, {'FTPScheduleEnable': '1'})
+        _stop.set()
+        self.assertEqual(list(_watch), [])
+
+    def test_fleet_watch(self):
+        _offline = fake_camera('192.168.1.102', None)
+        _fleet = DlinkDCSFleet([self.camera, _offline])
+        _stop = threading.Event()
+        _stop.set()
+        _results = {_r.camera: _r for _r in _fleet.watch(['get_upload'], stop=_stop)}
+        self.assertEqual(_results[self.camera].result[0].changes,
+                         {'FTPScheduleEnable': '0'})
+        self.assertIsInstance(_results[_offline].error, ConnectionError)
+
+
+if __name__ == '__main__':
+    unittest.main()